@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+from collections import Counter
+
+from metrics import quantile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INITIAL_LIMIT = 4  # Запросов в полете в начале работы
+DEFAULT_MIN_LIMIT = 1
+DEFAULT_TARGET_P95 = 1.0  # Целевая p95 задержки ответа, сек
+DEFAULT_MAX_ERROR_RATE = 0.05  # Допустимая доля ошибок в окне
+WINDOW_SIZE = 20  # Ответов в окне оценки
+OVERLOAD_FACTOR = 0.5  # Уменьшение лимита при перегрузке и доле ошибок выше допустимой
+LATENCY_FACTOR = 0.75  # Уменьшение лимита при превышении целевой задержки
+HISTORY_SIZE = 50  # Последних решений в сводке
+
+# Ответы, означающие перегрузку Netbox
+OVERLOAD_STATUSES = (429, 502, 503, 504)
+
+class AdaptiveLimit:
+    """Адаптивное число запросов к Netbox в полете (AIMD, как управление перегрузкой TCP).
+
+    Ответы оцениваются окнами по WINDOW_SIZE: если p95 задержки и доля
+    ошибок в пределах целей и лимит был исчерпан, лимит увеличивается на 1;
+    при превышении задержки - уменьшается в LATENCY_FACTOR раз. Ответ
+    429/502/503/504 или сетевая ошибка уменьшают лимит сразу в OVERLOAD_FACTOR
+    раз, после чего следующие WINDOW_SIZE ответов не учитываются: это ответы
+    на запросы, отправленные при старом лимите.
+
+    acquire/release ограничивают запросы потоков синхронного клиента;
+    асинхронный клиент использует только record.
+    """
+
+    def __init__(self, max_limit, initial=DEFAULT_INITIAL_LIMIT, min_limit=DEFAULT_MIN_LIMIT,
+                 target_p95=DEFAULT_TARGET_P95, max_error_rate=DEFAULT_MAX_ERROR_RATE, window=WINDOW_SIZE):
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.limit = max(self.min_limit, min(initial, max_limit))
+        self.target_p95 = target_p95
+        self.max_error_rate = max_error_rate
+        self.window_size = window
+        self.window = []
+        self.saturated = False
+        self.cooldown = 0
+        self.peak = self.limit
+        self.decisions = Counter()
+        self.history = []
+        self.in_flight = 0
+        self.started = time.monotonic()
+        self._cond = threading.Condition()
+
+    # --- Ограничение потоков ---
+
+    def acquire(self):
+        """Ожидание свободного места в лимите."""
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+            return self.in_flight
+
+    def release(self, seconds, status):
+        """Завершение запроса: учет ответа и пробуждение ожидающих потоков."""
+        with self._cond:
+            in_flight = self.in_flight
+            self.in_flight -= 1
+            self.record(seconds, status, in_flight)
+            self._cond.notify_all()
+
+    # --- Регулирование ---
+
+    def record(self, seconds, status, in_flight):
+        """Учет ответа (код или имя исключения) при in_flight запросах в полете."""
+        with self._cond:
+            if status is None:
+                # Запрос не выполнен по причине, не связанной с Netbox
+                return
+            if in_flight >= self.limit:
+                self.saturated = True
+            # Имя исключения вместо кода ответа - сетевая ошибка
+            overload = status in OVERLOAD_STATUSES or isinstance(status, str)
+            if self.cooldown:
+                self.cooldown -= 1
+                return
+            if overload:
+                self.adjust(self.limit * OVERLOAD_FACTOR, f"перегрузка ({status})")
+                self.cooldown = self.window_size
+                self.window = []
+                return
+            self.window.append((seconds, isinstance(status, int) and status >= 500))
+            if len(self.window) < self.window_size:
+                return
+            latencies = sorted(latency for latency, _ in self.window)
+            p95 = quantile(latencies, 0.95)
+            error_rate = sum(1 for _, error in self.window if error) / len(self.window)
+            if error_rate > self.max_error_rate:
+                self.adjust(self.limit * OVERLOAD_FACTOR, f"ошибки {error_rate:.0%}")
+            elif p95 > self.target_p95:
+                self.adjust(self.limit * LATENCY_FACTOR, f"p95 {p95:.2f}s")
+            elif self.saturated:
+                self.adjust(self.limit + 1, f"p95 {p95:.2f}s")
+            self.window = []
+            self.saturated = False
+
+    def adjust(self, limit, reason):
+        old = self.limit
+        self.limit = max(self.min_limit, min(self.max_limit, int(limit)))
+        if self.limit == old:
+            return
+        decision = "increase" if self.limit > old else "decrease"
+        self.decisions[decision] += 1
+        self.peak = max(self.peak, self.limit)
+        self.history.append((round(time.monotonic() - self.started, 3), old, self.limit, reason))
+        del self.history[:-HISTORY_SIZE]
+        log = logger.debug if decision == "increase" else logger.info
+        log(f"Параллельность запросов {old} -> {self.limit}: {reason}")
+
+    def summary(self):
+        """Текущий лимит и решения регулятора (для сводки и метрик)."""
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "peak": self.peak,
+                "min": self.min_limit,
+                "max": self.max_limit,
+                "increases": self.decisions["increase"],
+                "decreases": self.decisions["decrease"],
+                "history": list(self.history),
+            }
@@ -0,0 +1,439 @@
+"""Локальная замена API Netbox для бенчмарков.
+
+Хранит объекты в памяти и реализует эндпоинты, которые используют скрипты
+импорта: списки с фильтрами и постраничной загрузкой, создание/изменение/
+удаление одиночных объектов и списочные (атомарные) запросы, журнал
+изменений core/object-changes. Задержка ответа и доля ошибок 503 настраиваются.
+
+Запуск отдельно: python bench/fake_netbox.py --port 8000 --latency 5
+"""
+import argparse
+import functools
+import ipaddress
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Эндпоинт -> поля-ссылки объекта и эндпоинты, на которые они ссылаются
+ENDPOINTS = {
+    "dcim/device-roles": {},
+    "virtualization/cluster-types": {},
+    "virtualization/clusters": {"type": "virtualization/cluster-types"},
+    "virtualization/virtual-machines": {
+        "role": "dcim/device-roles", "cluster": "virtualization/clusters",
+        "tenant": "tenancy/tenants", "primary_ip4": "ipam/ip-addresses",
+    },
+    "virtualization/interfaces": {"virtual_machine": "virtualization/virtual-machines"},
+    "ipam/ip-addresses": {"vrf": "ipam/vrfs", "tenant": "tenancy/tenants"},
+    "ipam/prefixes": {"vrf": "ipam/vrfs"},
+    "ipam/vrfs": {},
+    "tenancy/tenants": {},
+    "core/object-changes": {},
+}
+
+# Тип объекта в журнале изменений Netbox по эндпоинту
+CONTENT_TYPES = {
+    "dcim/device-roles": "dcim.devicerole",
+    "virtualization/cluster-types": "virtualization.clustertype",
+    "virtualization/clusters": "virtualization.cluster",
+    "virtualization/virtual-machines": "virtualization.virtualmachine",
+    "virtualization/interfaces": "virtualization.vminterface",
+    "ipam/ip-addresses": "ipam.ipaddress",
+    "ipam/prefixes": "ipam.prefix",
+    "ipam/vrfs": "ipam.vrf",
+    "tenancy/tenants": "tenancy.tenant",
+}
+
+# Поля краткого представления объекта в ссылках
+BRIEF_FIELDS = ("id", "name", "slug", "address", "prefix")
+
+MAX_PAGE_SIZE = 1000
+
+# Поля VM в ответе GraphQL (запрос VMState из netbox_graphql)
+GRAPHQL_VM_FIELDS = ("id", "name", "description", "serial", "vcpus", "memory", "disk")
+GRAPHQL_REF_FIELDS = {"role": ("id", "name"), "cluster": ("id", "name"), "tenant": ("id", "name"),
+                      "primary_ip4": ("id", "address")}
+
+# Параметры запроса, не являющиеся фильтрами
+NON_FILTER_PARAMS = ("limit", "offset", "brief", "fields", "ordering")
+
+class ValidationError(Exception):
+    """Ошибка валидации объекта (ответ 400)."""
+
+class Store:
+    """Хранилище объектов и счетчик запросов по (метод, эндпоинт)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.objects = {endpoint: {} for endpoint in ENDPOINTS}
+        self.next_id = {endpoint: 1 for endpoint in ENDPOINTS}
+        self.counter = Counter()
+        self.bytes_sent = 0
+        # Уникальный индекс имен VM, чтобы проверка дубликатов не была O(n)
+        self.vm_names = {}
+
+    def brief(self, obj):
+        return {key: obj[key] for key in BRIEF_FIELDS if key in obj}
+
+    def resolve(self, endpoint, data):
+        """Замена ссылок {"id": ...} / {"name": ...} / ID на краткое представление объекта."""
+        refs = ENDPOINTS[endpoint]
+        obj = {}
+        for key, value in data.items():
+            if key in refs and value is not None:
+                target = refs[key]
+                if isinstance(value, int):
+                    value = {"id": value}
+                found = None
+                if "id" in value:
+                    found = self.objects[target].get(value["id"])
+                else:
+                    found = next((candidate for candidate in self.objects[target].values()
+                                  if all(candidate.get(k) == v for k, v in value.items())), None)
+                if not found:
+                    raise ValidationError({key: [f"Related object not found using the provided attributes: {value}"]})
+                obj[key] = self.brief(found)
+            elif key == "type" and isinstance(value, dict):
+                obj[key] = value.get("value")
+            else:
+                obj[key] = value
+        return obj
+
+    def validate(self, endpoint, obj):
+        if endpoint == "virtualization/virtual-machines":
+            if not obj.get("name"):
+                raise ValidationError({"name": ["This field is required."]})
+            if self.vm_names.get(obj["name"], obj["id"]) != obj["id"]:
+                raise ValidationError({"name": ["Virtual machine with this name already exists."]})
+            if obj.get("primary_ip4"):
+                ip = self.objects["ipam/ip-addresses"][obj["primary_ip4"]["id"]]
+                owner = (ip.get("assigned_object") or {}).get("virtual_machine") or {}
+                if owner.get("id") != obj["id"]:
+                    raise ValidationError({"primary_ip4": ["The specified IP address is not assigned to this VM."]})
+        if endpoint == "ipam/ip-addresses":
+            if "/" not in str(obj.get("address", "")):
+                raise ValidationError({"address": ["Please specify the mask."]})
+            if obj.get("assigned_object_id"):
+                interface = self.objects["virtualization/interfaces"].get(obj["assigned_object_id"])
+                if not interface:
+                    raise ValidationError({"assigned_object_id": ["Interface not found."]})
+                obj["assigned_object"] = {"id": interface["id"], "name": interface["name"],
+                                          "virtual_machine": interface["virtual_machine"]}
+
+    def create(self, endpoint, data, undo):
+        obj = self.resolve(endpoint, data)
+        obj["id"] = self.next_id[endpoint]
+        self.validate(endpoint, obj)
+        self.next_id[endpoint] += 1
+        self.put(endpoint, obj["id"], obj)
+        undo.append((endpoint, obj["id"], None))
+        self.log_change(endpoint, "create", obj["id"], undo)
+        return obj
+
+    def update(self, endpoint, object_id, data, undo):
+        old = self.objects[endpoint].get(object_id)
+        if old is None:
+            raise KeyError(object_id)
+        obj = {**old, **self.resolve(endpoint, data)}
+        self.validate(endpoint, obj)
+        self.put(endpoint, object_id, obj)
+        undo.append((endpoint, object_id, old))
+        self.log_change(endpoint, "update", object_id, undo)
+        return obj
+
+    def delete(self, endpoint, object_id, undo):
+        old = self.objects[endpoint][object_id]
+        self.put(endpoint, object_id, None)
+        undo.append((endpoint, object_id, old))
+        self.log_change(endpoint, "delete", object_id, undo)
+        # Как в Netbox: интерфейсы удаляются вместе с VM, ссылки на удаленный IP-адрес очищаются
+        if endpoint == "virtualization/virtual-machines":
+            for interface in list(self.objects["virtualization/interfaces"].values()):
+                if interface["virtual_machine"]["id"] == object_id:
+                    self.delete("virtualization/interfaces", interface["id"], undo)
+        elif endpoint == "virtualization/interfaces":
+            for ip in list(self.objects["ipam/ip-addresses"].values()):
+                if ip.get("assigned_object_id") == object_id:
+                    self.replace("ipam/ip-addresses", ip, {"assigned_object_type": None, "assigned_object_id": None,
+                                                           "assigned_object": None}, undo)
+        elif endpoint == "ipam/ip-addresses":
+            for vm in list(self.objects["virtualization/virtual-machines"].values()):
+                if (vm.get("primary_ip4") or {}).get("id") == object_id:
+                    self.replace("virtualization/virtual-machines", vm, {"primary_ip4": None}, undo)
+
+    def replace(self, endpoint, obj, fields, undo):
+        """Изменение полей объекта без проверки (каскадные изменения при удалении)."""
+        self.put(endpoint, obj["id"], {**obj, **fields})
+        undo.append((endpoint, obj["id"], obj))
+        self.log_change(endpoint, "update", obj["id"], undo)
+
+    def log_change(self, endpoint, action, object_id, undo):
+        """Запись в журнал изменений (core/object-changes); откатывается вместе с изменением."""
+        if endpoint not in CONTENT_TYPES:
+            return
+        change_id = self.next_id["core/object-changes"]
+        self.next_id["core/object-changes"] += 1
+        self.put("core/object-changes", change_id, {
+            "id": change_id, "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "action": {"value": action}, "changed_object_type": CONTENT_TYPES[endpoint],
+            "changed_object_id": object_id})
+        undo.append(("core/object-changes", change_id, None))
+
+    def put(self, endpoint, object_id, obj):
+        """Запись (или удаление при obj=None) объекта с обновлением индекса имен VM."""
+        old = self.objects[endpoint].pop(object_id, None)
+        if endpoint == "virtualization/virtual-machines" and old:
+            self.vm_names.pop(old["name"], None)
+        if obj is None:
+            return
+        self.objects[endpoint][object_id] = obj
+        if endpoint == "virtualization/virtual-machines":
+            self.vm_names[obj["name"]] = object_id
+
+    def rollback(self, undo):
+        """Отмена изменений списочного запроса, завершившегося ошибкой."""
+        for endpoint, object_id, old in reversed(undo):
+            self.put(endpoint, object_id, old)
+
+@functools.lru_cache(maxsize=None)
+def parse_network(value):
+    return ipaddress.ip_network(value, strict=False)
+
+@functools.lru_cache(maxsize=None)
+def parse_host(address):
+    return ipaddress.ip_interface(address).ip
+
+def matches(obj, params):
+    """Проверка объекта по фильтрам запроса (значения фильтра объединяются по ИЛИ)."""
+    for key, values in params.items():
+        if key in NON_FILTER_PARAMS:
+            continue
+        if key == "parent":
+            address = parse_host(obj.get("address", "0.0.0.0/32"))
+            if not any(address in parse_network(value) for value in values):
+                return False
+        elif key == "address":
+            if str(obj.get("address", "")).split("/")[0] not in {value.split("/")[0] for value in values}:
+                return False
+        elif key == "id":
+            if str(obj["id"]) not in values:
+                return False
+        elif key.endswith("__gt"):
+            if not obj.get(key[:-4]) > int(values[0]):
+                return False
+        elif key == "tag":
+            if not {tag.get("slug") for tag in obj.get("tags") or []} & set(values):
+                return False
+        elif key == "virtual_machine_id" and "address" in obj:
+            # IP-адреса фильтруются по VM интерфейса, которому они назначены
+            ref_id = ((obj.get("assigned_object") or {}).get("virtual_machine") or {}).get("id")
+            if str(ref_id) not in values:
+                return False
+        elif key.endswith("_id") and key != "assigned_object_id":
+            ref_id = (obj.get(key[:-3]) or {}).get("id")
+            if str(ref_id) not in values and not (ref_id is None and "null" in values):
+                return False
+        elif isinstance(obj.get(key), dict):
+            if obj[key].get("name") not in values and str(obj[key].get("id")) not in values:
+                return False
+        elif str(obj.get(key)) not in values:
+            return False
+    return True
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    store = None
+    latency = 0.0
+    error_rate = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        import socket
+        # Без задержки Nagle ответы keep-alive соединения не ждут подтверждения
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def send_json(self, status, body=None):
+        raw = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        if raw:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+        self.store.bytes_sent += len(raw)
+
+    def send_bulk(self, status, items, undo, apply):
+        """Списочный запрос: при ошибках - 400 со списком ошибок по объектам в порядке отправки, как в Netbox."""
+        results, errors = [], []
+        for item in items:
+            try:
+                results.append(apply(item))
+                errors.append({})
+            except ValidationError as e:
+                errors.append(e.args[0])
+        if any(errors):
+            self.store.rollback(undo)
+            return self.send_json(400, errors)
+        return self.send_json(status, results)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def handle_method(self, method):
+        url = urlparse(self.path)
+        if url.path == "/graphql/":
+            return self.handle_graphql(method)
+        route = re.match(r"^/api/(.+?)/(?:(\d+)/)?$", url.path)
+        # Тело читается всегда, иначе keep-alive соединение сломается при ответе с ошибкой
+        body = self.read_body() if method != "GET" else None
+        endpoint = route.group(1) if route else None
+        object_id = int(route.group(2)) if route and route.group(2) else None
+        store = self.store
+        store.counter[(method, endpoint)] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            return self.send_json(503, {"detail": "Service temporarily unavailable (injected)."})
+        if endpoint not in ENDPOINTS:
+            return self.send_json(404, {"detail": "Not found."})
+        with store.lock:
+            undo = []
+            try:
+                if method == "GET":
+                    return self.send_json(200, self.get(endpoint, object_id, url))
+                if method == "POST":
+                    if isinstance(body, list):
+                        return self.send_bulk(201, body, undo, lambda item: store.create(endpoint, item, undo))
+                    return self.send_json(201, store.create(endpoint, body, undo))
+                if method == "PATCH":
+                    if isinstance(body, list):
+                        return self.send_bulk(200, body, undo, lambda item: store.update(endpoint, item["id"], {
+                            key: value for key, value in item.items() if key != "id"}, undo))
+                    return self.send_json(200, store.update(endpoint, object_id, body, undo))
+                if method == "DELETE":
+                    for item in body if isinstance(body, list) else [{"id": object_id}]:
+                        store.delete(endpoint, item["id"], undo)
+                    return self.send_json(204)
+                return self.send_json(405, {"detail": f"Method \"{method}\" not allowed."})
+            except ValidationError as e:
+                store.rollback(undo)
+                return self.send_json(400, [e.args[0]] if isinstance(body, list) else e.args[0])
+            except KeyError:
+                store.rollback(undo)
+                return self.send_json(404, {"detail": "Not found."})
+
+    def handle_graphql(self, method):
+        """Минимальный GraphQL: только список VM с интерфейсами (ID - строки, vcpus - строка, как в Netbox)."""
+        body = self.read_body()
+        store = self.store
+        store.counter[(method, "graphql")] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            return self.send_json(503, {"detail": "Service temporarily unavailable (injected)."})
+        if method != "POST" or "virtual_machine_list" not in (body or {}).get("query", ""):
+            return self.send_json(200, {"data": None, "errors": [{"message": "Unsupported query."}]})
+        variables = body.get("variables") or {}
+        offset, limit = variables.get("offset", 0), variables.get("limit", 100)
+
+        def ref(obj, fields):
+            return {key: str(obj[key]) if key == "id" else obj.get(key) for key in fields} if obj else None
+
+        with store.lock:
+            vms = list(store.objects["virtualization/virtual-machines"].values())[offset:offset + limit]
+            interfaces = {}
+            for interface in store.objects["virtualization/interfaces"].values():
+                interfaces.setdefault(interface["virtual_machine"]["id"], []).append(interface)
+            page = []
+            for vm in vms:
+                item = {key: vm.get(key) for key in GRAPHQL_VM_FIELDS}
+                item["id"] = str(vm["id"])
+                if item["vcpus"] is not None:
+                    item["vcpus"] = f"{float(item['vcpus']):.2f}"
+                for key, fields in GRAPHQL_REF_FIELDS.items():
+                    item[key] = ref(vm.get(key), fields)
+                item["interfaces"] = [ref(interface, ("id", "name")) for interface in interfaces.get(vm["id"], [])]
+                page.append(item)
+        return self.send_json(200, {"data": {"virtual_machine_list": page}})
+
+    def get(self, endpoint, object_id, url):
+        objects = self.store.objects[endpoint]
+        if object_id:
+            return objects[object_id]
+        params = parse_qs(url.query)
+        limit = min(int(params.get("limit", ["50"])[0]) or MAX_PAGE_SIZE, MAX_PAGE_SIZE)
+        offset = int(params.get("offset", ["0"])[0])
+        found = [obj for obj in objects.values() if matches(obj, params)]
+        ordering = params.get("ordering", [""])[0]
+        if ordering in ("id", "-id"):
+            found.sort(key=lambda obj: obj["id"], reverse=ordering == "-id")
+        next_url = None
+        if offset + limit < len(found):
+            query = "&".join(f"{key}={value}" for key, values in params.items()
+                             if key not in ("limit", "offset") for value in values)
+            next_url = f"http://{self.headers['Host']}{url.path}?limit={limit}&offset={offset + limit}"
+            if query:
+                next_url += f"&{query}"
+        return {"count": len(found), "next": next_url, "previous": None,
+                "results": found[offset:offset + limit]}
+
+    def do_GET(self):
+        self.handle_method("GET")
+
+    def do_POST(self):
+        self.handle_method("POST")
+
+    def do_PATCH(self):
+        self.handle_method("PATCH")
+
+    def do_DELETE(self):
+        self.handle_method("DELETE")
+
+def start(port=0, latency=0.0, error_rate=0.0):
+    """Запуск сервера в фоновом потоке; возвращает (сервер, хранилище)."""
+    store = Store()
+    handler = type("FakeNetboxHandler", (Handler,),
+                   {"store": store, "latency": latency, "error_rate": error_rate})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, store
+
+def seed(store, roles=("APP", "DB", "WEB", "INFRA"), clusters=("KLN-PROD", "KLN-TEST", "KLN-DEV", "KLN-TECH"),
+         prefixes=("10.128.0.0/12",), vrfs=("PROD",)):
+    """Начальные справочники: типы кластеров, роли, кластеры, VRF и префиксы."""
+    with store.lock:
+        undo = []
+        store.create("virtualization/cluster-types", {"name": "VMware", "slug": "vmware"}, undo)
+        for role in roles:
+            store.create("dcim/device-roles", {"name": role, "slug": role.lower()}, undo)
+        for cluster in clusters:
+            store.create("virtualization/clusters", {"name": cluster, "type": {"id": 1}}, undo)
+        for vrf in vrfs:
+            store.create("ipam/vrfs", {"name": vrf}, undo)
+        for prefix in prefixes:
+            store.create("ipam/prefixes", {"prefix": prefix}, undo)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальная замена API Netbox для бенчмарков.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа, мс")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 503 (0-1)")
+    args = parser.parse_args()
+    server, store = start(args.port, args.latency / 1000, args.error_rate)
+    seed(store)
+    print(f"Fake Netbox: http://127.0.0.1:{server.server_port}/api/ (Ctrl+C - остановка)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(dict(store.counter))
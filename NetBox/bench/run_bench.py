@@ -0,0 +1,243 @@
+"""Бенчмарк импорта VM против локальной замены API Netbox.
+
+Для каждого сочетания скрипта и размера таблицы запускается чистый
+fake_netbox, генерируется синтетическая таблица, и import_vms_from_excel
+выполняется в отдельном процессе (passes раз подряд на одних и тех же данных:
+первый проход создает VM, следующие показывают стоимость повторной
+синхронизации). Отчет: время, запросы по эндпоинтам, запросы на VM и пиковый
+RSS процесса импорта.
+
+Состав таблицы задается распределениями synthetic.Workload; если часть VM
+должна уже существовать (--existing, --ip-reuse), перед измерением
+импортируется базовая таблица. С --predict время, запросы и память
+экстраполируются линейно по измеренным размерам, с --profile каждый проход
+профилируется по этапам (phase_profile).
+
+Пример:
+    python bench/run_bench.py --script both --rows 100 1000 10000 --latency 5 --error-rate 0.01
+    python bench/run_bench.py --rows 2000 5000 10000 --existing 0.9 --changed 0.05 --malformed 0.01 \
+        --predict 100000 --profile profiles
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import fake_netbox
+import synthetic
+
+# Скрипт -> (модуль, лист таблицы)
+SCRIPTS = {
+    "update": ("update_vms", "Prod"),
+    "import": ("import_vms", "Tech"),
+}
+
+DEFAULT_ROWS = (100, 1000, 10000)
+
+def peak_rss_mb():
+    """Пиковый RSS текущего процесса, МБ (None, если недоступно на платформе)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает КБ, macOS - байты
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def run_child(args):
+    """Процесс импорта: выполняет import_vms_from_excel и печатает JSON с результатом."""
+    module_name, _ = SCRIPTS[args.script]
+    module = __import__(module_name)
+    import metrics
+    import netbox_client
+    if args.profile:
+        from phase_profile import PhaseProfiler
+        metrics.METRICS.profiler = PhaseProfiler(args.profile)
+    netbox_client.configure(module.HEADERS, pool_size=max(netbox_client.DEFAULT_POOL_SIZE, args.workers))
+    if args.script == "update":
+        options = module.ImportOptions(workers=args.workers, batch_size=args.batch_size, stream=args.stream,
+                                       incremental=args.incremental)
+        run = lambda: module.import_vms_from_excel(args.workbook, args.sheet, options)
+    else:
+        run = lambda: module.import_vms_from_excel(args.workbook, args.sheet, workers=args.workers,
+                                                   batch_size=args.batch_size)
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        run()
+    wall = time.perf_counter() - started
+    if args.profile:
+        metrics.METRICS.profiler.write(dict(metrics.METRICS.phases))
+    print(json.dumps({"wall": wall, "peak_rss_mb": peak_rss_mb()}))
+
+def run_child_process(script, workbook, sheet_name, env, args, profile=None):
+    """Запуск процесса импорта; возвращает его измерения."""
+    command = [sys.executable, os.path.abspath(__file__), "--child", "--script", script,
+               "--workbook", workbook, "--sheet", sheet_name,
+               "--workers", str(args.workers), "--batch-size", str(args.batch_size)]
+    if args.stream:
+        command.append("--stream")
+    if args.incremental:
+        command.append("--incremental")
+    if profile:
+        command += ["--profile", profile]
+    child = subprocess.run(command, env=env, cwd=os.path.dirname(BENCH_DIR), capture_output=True, text=True)
+    if child.returncode != 0:
+        print(child.stderr, file=sys.stderr)
+        raise RuntimeError(f"Процесс импорта завершился с кодом {child.returncode}")
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+def run_case(script, rows, args, workdir):
+    """Бенчмарк одного скрипта на таблице из rows строк; список результатов по проходам."""
+    _, sheet_name = SCRIPTS[script]
+    sheet_names = tuple(sheet for _, sheet in SCRIPTS.values())
+    workload = synthetic.workload_from_args(args, rows)
+    workbook = os.path.join(workdir, f"bench_{rows}.xlsx")
+    baseline = os.path.join(workdir, f"bench_{rows}_baseline.xlsx")
+    has_baseline = workload.existing or workload.decommissioned()
+    if not os.path.exists(workbook):
+        synthetic.write_workload(workbook, workload, sheet_names)
+        if has_baseline:
+            synthetic.write_workload(baseline, workload, sheet_names, baseline=True)
+    for path in (workbook, baseline):
+        # Состояние инкрементального режима и журналы листов прошлого запуска
+        for pattern in (".*sync_state.json", ".*journal.sqlite*"):
+            for leftover in glob.glob(glob.escape(path) + pattern):
+                os.remove(leftover)
+
+    server, store = fake_netbox.start(latency=args.latency / 1000, error_rate=args.error_rate)
+    fake_netbox.seed(store, roles=workload.role_names(), clusters=workload.cluster_names())
+    env = {**os.environ, "NETBOX_URL": f"http://127.0.0.1:{server.server_port}", "NETBOX_TOKEN": "bench"}
+    results = []
+    try:
+        if has_baseline:
+            # Исходное состояние Netbox: существующие VM и VM, чьи адреса займут новые
+            run_child_process(script, baseline, sheet_name, env, args)
+        for number in range(1, args.passes + 1):
+            store.counter.clear()
+            profile = os.path.join(args.profile, f"{script}_{rows}_pass{number}") if args.profile else None
+            measured = run_child_process(script, workbook, sheet_name, env, args, profile)
+            requests_by_endpoint = Counter({f"{method} {endpoint}": count
+                                            for (method, endpoint), count in store.counter.items()})
+            total = sum(requests_by_endpoint.values())
+            results.append({
+                "script": script,
+                "rows": rows,
+                "pass": number,
+                "wall": round(measured["wall"], 3),
+                "requests": total,
+                "requests_per_vm": round(total / rows, 3),
+                "peak_rss_mb": measured["peak_rss_mb"],
+                "vms_in_netbox": len(store.objects["virtualization/virtual-machines"]),
+                "requests_by_endpoint": dict(requests_by_endpoint.most_common()),
+            })
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+def print_report(results):
+    print(f"{'Скрипт':<8} {'Строк':>7} {'Проход':>6} {'Время, с':>9} {'Запросов':>9} "
+          f"{'Зап./VM':>8} {'RSS, МБ':>8} {'VM':>7}")
+    print("-" * 72)
+    for result in results:
+        print(f"{result['script']:<8} {result['rows']:>7} {result['pass']:>6} {result['wall']:>9.2f} "
+              f"{result['requests']:>9} {result['requests_per_vm']:>8.3f} "
+              f"{result['peak_rss_mb'] if result['peak_rss_mb'] is not None else '-':>8} "
+              f"{result['vms_in_netbox']:>7}")
+        for endpoint, count in result["requests_by_endpoint"].items():
+            print(f"{'':<10}{endpoint:<45} {count:>8}")
+
+def linear_fit(points):
+    """Коэффициенты (a, b) прямой y = a + b * x по методу наименьших квадратов."""
+    count = len(points)
+    mean_x = sum(x for x, _ in points) / count
+    mean_y = sum(y for _, y in points) / count
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / spread if spread else 0.0
+    return mean_y - slope * mean_x, slope
+
+def predict(results, rows):
+    """Линейная экстраполяция времени, запросов и RSS на rows строк по скриптам и проходам."""
+    groups = {}
+    for result in results:
+        groups.setdefault((result["script"], result["pass"]), []).append(result)
+    predictions = []
+    for (script, number), group in sorted(groups.items()):
+        if len({result["rows"] for result in group}) < 2:
+            continue
+        predicted = {"script": script, "pass": number, "rows": rows}
+        for key in ("wall", "requests", "peak_rss_mb"):
+            points = [(result["rows"], result[key]) for result in group if result[key] is not None]
+            if len({x for x, _ in points}) >= 2:
+                intercept, slope = linear_fit(points)
+                predicted[key] = round(intercept + slope * rows, 1)
+                predicted[f"{key}_per_row"] = slope
+        predictions.append(predicted)
+    return predictions
+
+def print_prediction(predictions):
+    if not predictions:
+        print("Для прогноза нужны результаты хотя бы двух размеров таблицы (--rows).")
+        return
+    print(f"\nПрогноз (линейная экстраполяция): {'Строк':>8} {'Время, с':>9} {'Запросов':>9} {'RSS, МБ':>8}")
+    for predicted in predictions:
+        print(f"{predicted['script']:<8} проход {predicted['pass']:<19} {predicted['rows']:>8} "
+              f"{predicted.get('wall', '-'):>9} {predicted.get('requests', '-'):>9} "
+              f"{predicted.get('peak_rss_mb', '-'):>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк импорта VM против локальной замены API Netbox.")
+    parser.add_argument("--script", choices=("update", "import", "both"), default="update")
+    parser.add_argument("--rows", type=int, nargs="+", default=list(DEFAULT_ROWS),
+                        help="Размеры синтетических таблиц (по умолчанию 100 1000 10000)")
+    parser.add_argument("--passes", type=int, default=2, help="Количество запусков на одних данных")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа fake Netbox, мс")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 503 (0-1)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--stream", action="store_true", help="update_vms: потоковое чтение таблицы")
+    parser.add_argument("--incremental", action="store_true", help="update_vms: инкрементальный режим")
+    parser.add_argument("--predict", type=int, metavar="ROWS",
+                        help="Прогноз времени, запросов и RSS для таблицы из ROWS строк")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="Профили этапов каждого прохода (cProfile, tracemalloc) в каталоге DIR")
+    parser.add_argument("--json", help="Файл для результатов в формате JSON")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--workbook", help=argparse.SUPPRESS)
+    parser.add_argument("--sheet", help=argparse.SUPPRESS)
+    synthetic.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    scripts = ("import", "update") if args.script == "both" else (args.script,)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="netbox_bench_") as workdir:
+        for rows in args.rows:
+            for script in scripts:
+                print(f"Бенчмарк {script}: {rows} строк...", file=sys.stderr)
+                results.extend(run_case(script, rows, args, workdir))
+    print_report(results)
+    predictions = []
+    if args.predict:
+        predictions = predict(results, args.predict)
+        print_prediction(predictions)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"results": results, "predictions": predictions} if args.predict else results,
+                      f, ensure_ascii=False, indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""Синтетические таблицы VM для бенчмарков и оценки нагрузки.
+
+Таблица повторяет схему листов Prod/Tech рабочей книги (kln_address.xlsx)
+в любом масштабе. Состав задается распределениями (Workload): число ролей
+и кластеров и перекос их использования, доля строк, уже существующих в
+Netbox, и доля измененных среди них, повторное использование адресов
+выведенных из эксплуатации VM, конфликты адресов внутри таблицы и
+некорректные строки.
+
+Существующие в Netbox VM описываются базовой таблицей (baseline): ее
+импорт перед измерением приводит Netbox в исходное состояние.
+
+Пример:
+    python bench/synthetic.py 100000 big.xlsx --baseline big_base.xlsx --existing 0.9 --changed 0.05 \\
+        --ip-reuse 0.01 --ip-conflict 0.001 --malformed 0.002
+"""
+import argparse
+import bisect
+import csv
+import ipaddress
+import itertools
+import os
+import random
+from collections import Counter
+from dataclasses import dataclass
+
+import openpyxl
+
+# Столбцы листов в порядке рабочей книги
+SHEET_COLUMNS = {
+    "Prod": ("name", "role", "description", "serial", "status", "vcpus", "memory", "disk", "ip_primary",
+             "cluster"),
+    "Tech": ("serial", "name", "description", "role", "ip_primary", "status", "vcpus", "memory", "disk",
+             "cluster", "host"),
+}
+STATUS = "Активный"
+
+# Префикс, засеянный в fake_netbox; адреса делятся между листами поровну
+ADDRESS_PREFIX = ipaddress.IPv4Network("10.128.0.0/12")
+FIRST_HOST = 10  # Первые адреса блока листа не выдаются
+
+VCPUS = (2, 4, 6, 8, 16)
+MEMORY = (4096, 8192, 16384, 32768, 112000)
+DISK = (40, 80, 100, 160, 320, 100000)
+
+# Виды строк целевой таблицы
+EXISTING = "existing"  # VM уже есть в Netbox, строка не изменилась
+CHANGED = "changed"  # VM есть в Netbox, изменены ресурсы или описание
+NEW = "new"  # VM создается
+REUSED_IP = "reused_ip"  # Новая VM с адресом VM, выведенной из эксплуатации
+CONFLICT = "ip_conflict"  # Адрес уже указан в предыдущей строке таблицы
+MALFORMED = "malformed"  # Строка не проходит проверку при чтении или сопоставлении
+
+# Виды некорректных строк
+MALFORMATIONS = ("no_name", "bad_ip", "bad_number", "unknown_cluster")
+
+@dataclass
+class Workload:
+    """Распределения синтетической таблицы; доли - от числа строк rows.
+
+    changed - часть existing; ip_reuse, ip_conflict и malformed - части
+    новых строк. Роли и кластеры выбираются по закону Ципфа с показателем
+    skew (0 - равномерно): в реальных таблицах большинство VM в немногих
+    кластерах.
+    """
+    rows: int
+    roles: int = 4
+    clusters: int = 4
+    skew: float = 1.0
+    existing: float = 0.0
+    changed: float = 0.0
+    ip_reuse: float = 0.0
+    ip_conflict: float = 0.0
+    malformed: float = 0.0
+    seed: int = 0
+
+    def __post_init__(self):
+        if self.changed > self.existing:
+            raise ValueError("Доля измененных строк не может превышать долю существующих.")
+        if self.existing + self.ip_reuse + self.ip_conflict + self.malformed > 1:
+            raise ValueError("Сумма долей existing, ip_reuse, ip_conflict и malformed больше 1.")
+
+    def role_names(self):
+        return tuple(f"ROLE{number:02d}" for number in range(1, self.roles + 1))
+
+    def cluster_names(self):
+        return tuple(f"KLN-SYN{number:02d}" for number in range(1, self.clusters + 1))
+
+    def decommissioned(self):
+        """Число VM базовой таблицы, отсутствующих в целевой (их адреса переходят новым VM)."""
+        return round(self.rows * self.ip_reuse)
+
+def zipf_weights(count, skew):
+    """Накопленные веса для выбора по закону Ципфа."""
+    return list(itertools.accumulate(1 / (rank ** skew) for rank in range(1, count + 1)))
+
+def choose(rng, values, weights):
+    return values[bisect.bisect(weights, rng.random() * weights[-1])]
+
+def address_block(sheet_names, sheet_name):
+    """Первый адрес и размер блока адресов листа."""
+    size = ADDRESS_PREFIX.num_addresses // len(sheet_names)
+    return ADDRESS_PREFIX.network_address + size * sheet_names.index(sheet_name) + FIRST_HOST, size - FIRST_HOST
+
+class SheetGenerator:
+    """Строки одного листа: базовая таблица и целевая таблица.
+
+    Свойства VM с номером index определяются только им и seed, поэтому
+    базовая и целевая таблицы согласованы без хранения строк в памяти.
+    """
+
+    def __init__(self, workload, sheet_name, sheet_names=("Prod", "Tech")):
+        self.workload = workload
+        self.sheet_name = sheet_name
+        self.columns = SHEET_COLUMNS[sheet_name]
+        self.prefix = sheet_name.lower()
+        # Зерно генератора строки: seed, лист, номер VM и назначение случайной величины
+        self.base = (workload.seed * len(sheet_names) + list(sheet_names).index(sheet_name)) << 32
+        self.first_address, size = address_block(list(sheet_names), sheet_name)
+        if workload.rows + workload.decommissioned() > size:
+            raise ValueError(f"Лист {sheet_name}: в блоке {size} адресов, "
+                             f"нужно {workload.rows + workload.decommissioned()}.")
+        self.roles = workload.role_names()
+        self.role_weights = zipf_weights(len(self.roles), workload.skew)
+        self.clusters = workload.cluster_names()
+        self.cluster_weights = zipf_weights(len(self.clusters), workload.skew)
+        # Пороги вида строки по одной случайной величине
+        self.kinds = list(zip(itertools.accumulate((workload.changed, workload.existing - workload.changed,
+                                                    workload.ip_reuse, workload.ip_conflict,
+                                                    workload.malformed)),
+                              (CHANGED, EXISTING, REUSED_IP, CONFLICT, MALFORMED)))
+
+    def rng(self, index, purpose):
+        return random.Random((self.base + index) * 3 + purpose)
+
+    def address(self, index):
+        return str(self.first_address + index)
+
+    def vm(self, index):
+        """Исходное состояние VM с номером index (как в базовой таблице)."""
+        rng = self.rng(index, 0)
+        role = choose(rng, self.roles, self.role_weights)
+        return {
+            "name": f"{self.prefix}-vm{index:07d}",
+            "role": role,
+            "description": f"Синтетическая VM {index} ({role})",
+            "serial": index,
+            "status": STATUS,
+            "vcpus": rng.choice(VCPUS),
+            "memory": rng.choice(MEMORY),
+            "disk": rng.choice(DISK),
+            "ip_primary": self.address(index),
+            "cluster": choose(rng, self.clusters, self.cluster_weights),
+            "host": None,
+        }
+
+    def kind(self, index):
+        draw = self.rng(index, 1).random()
+        for threshold, kind in self.kinds:
+            if draw < threshold:
+                return kind
+        return NEW
+
+    def baseline_rows(self):
+        """Строки базовой таблицы: существующие VM и VM, адреса которых используются повторно."""
+        for index in range(self.workload.rows):
+            if self.kind(index) in (EXISTING, CHANGED):
+                yield self.vm(index)
+        for offset in range(self.workload.decommissioned()):
+            yield self.vm(self.workload.rows + offset)
+
+    def rows(self):
+        """Строки целевой таблицы; возвращает пары (вид строки, строка)."""
+        reused = self.workload.rows
+        for index in range(self.workload.rows):
+            kind = self.kind(index)
+            row = self.vm(index)
+            rng = self.rng(index, 2)
+            if kind == CHANGED:
+                row["vcpus"] = row["vcpus"] * 2
+                row["description"] += " (изменена)"
+            elif kind == REUSED_IP:
+                if reused < self.workload.rows + self.workload.decommissioned():
+                    row["ip_primary"] = self.address(reused)
+                    reused += 1
+                else:
+                    kind = NEW
+            elif kind == CONFLICT:
+                if index:
+                    row["ip_primary"] = self.address(rng.randrange(index))
+                else:
+                    kind = NEW
+            elif kind == MALFORMED:
+                malformation = rng.choice(MALFORMATIONS)
+                if malformation == "no_name":
+                    row["name"] = None
+                elif malformation == "bad_ip":
+                    row["ip_primary"] = f"10.{rng.randrange(256, 999)}.0.1"
+                elif malformation == "bad_number":
+                    row["vcpus"] = "много"
+                else:
+                    row["cluster"] = "KLN-UNKNOWN"
+                kind = f"{MALFORMED}:{malformation}"
+            yield kind, row
+
+    def table(self, baseline=False):
+        """Строки листа в порядке столбцов рабочей книги."""
+        rows = self.baseline_rows() if baseline else (row for _, row in self.rows())
+        return ([row[column] for column in self.columns] for row in rows)
+
+def write_workload(path, workload, sheet_names=("Prod", "Tech"), baseline=False):
+    """Запись таблицы в xlsx (все листы в одной книге) или CSV (файл на лист).
+
+    Для CSV и нескольких листов имя файла дополняется именем листа:
+    big.csv -> big_Prod.csv. Возвращает список записанных файлов.
+    """
+    generators = [SheetGenerator(workload, sheet_name, sheet_names) for sheet_name in sheet_names]
+    if path.lower().endswith(".csv"):
+        paths = []
+        for generator in generators:
+            stem = os.path.splitext(path)[0]
+            sheet_path = path if len(generators) == 1 else f"{stem}_{generator.sheet_name}.csv"
+            with open(sheet_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(generator.columns)
+                writer.writerows(generator.table(baseline))
+            paths.append(sheet_path)
+        return paths
+    # Режим write_only: книги на сотни тысяч строк создаются без загрузки в память
+    book = openpyxl.Workbook(write_only=True)
+    for generator in generators:
+        sheet = book.create_sheet(generator.sheet_name)
+        sheet.append(generator.columns)
+        for row in generator.table(baseline):
+            sheet.append(row)
+    book.save(path)
+    return [path]
+
+def describe(workload, sheet_name="Prod", sheet_names=("Prod", "Tech")):
+    """Число строк целевой таблицы листа по видам."""
+    return Counter(kind for kind, _ in SheetGenerator(workload, sheet_name, sheet_names).rows())
+
+def add_arguments(parser):
+    """Параметры распределений синтетической таблицы."""
+    group = parser.add_argument_group("Состав синтетической таблицы")
+    group.add_argument("--roles", type=int, default=4, help="Число ролей (по умолчанию 4)")
+    group.add_argument("--clusters", type=int, default=4, help="Число кластеров (по умолчанию 4)")
+    group.add_argument("--skew", type=float, default=1.0,
+                       help="Перекос выбора ролей и кластеров, показатель Ципфа (0 - равномерно, по умолчанию 1)")
+    group.add_argument("--existing", type=float, default=0.0, help="Доля строк, уже существующих в Netbox")
+    group.add_argument("--changed", type=float, default=0.0, help="Доля существующих строк с изменениями")
+    group.add_argument("--ip-reuse", type=float, default=0.0,
+                       help="Доля новых VM с адресом VM, выведенной из эксплуатации")
+    group.add_argument("--ip-conflict", type=float, default=0.0,
+                       help="Доля строк с адресом, уже указанным в таблице")
+    group.add_argument("--malformed", type=float, default=0.0, help="Доля некорректных строк")
+    group.add_argument("--seed", type=int, default=0)
+
+def workload_from_args(args, rows):
+    return Workload(rows, roles=args.roles, clusters=args.clusters, skew=args.skew, existing=args.existing,
+                    changed=args.changed, ip_reuse=args.ip_reuse, ip_conflict=args.ip_conflict,
+                    malformed=args.malformed, seed=args.seed)
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация синтетической таблицы VM со схемой листов Prod/Tech.")
+    parser.add_argument("rows", type=int, help="Строк на листе")
+    parser.add_argument("output", help="Файл таблицы: *.xlsx или *.csv")
+    parser.add_argument("--baseline", help="Файл базовой таблицы: VM, которые должны существовать в Netbox")
+    parser.add_argument("--sheets", nargs="+", default=["Prod", "Tech"], choices=tuple(SHEET_COLUMNS))
+    add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        workload = workload_from_args(args, args.rows)
+        written = write_workload(args.output, workload, args.sheets)
+        if args.baseline:
+            written += write_workload(args.baseline, workload, args.sheets, baseline=True)
+    except ValueError as e:
+        parser.error(str(e))
+    for path in written:
+        print(f"Записан файл {path}")
+    for sheet_name in args.sheets:
+        counts = describe(workload, sheet_name, args.sheets)
+        print(f"{sheet_name}: " + ", ".join(f"{kind} {count}" for kind, count in sorted(counts.items())))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import json
+import threading
+from collections import Counter
+
+# Типы объектов в порядке вывода отчета
+OBJECT_KINDS = ("role", "cluster", "ip_address", "vm", "interface")
+
+def display(value):
+    """Значение поля для отчета: ссылка на объект выводится по имени, адресу или ID."""
+    if isinstance(value, dict):
+        for key in ("name", "address", "prefix", "id"):
+            if value.get(key) is not None:
+                return value[key]
+    return value
+
+class ChangeSet:
+    """Набор изменений, которые выполнил бы импорт (режим --plan).
+
+    Каждое изменение - словарь: тип объекта, действие (create, update, assign,
+    delete, noop, skip), имя объекта, строка таблицы и подробности, для update -
+    изменения полей {поле: {"old": ..., "new": ...}}.
+    """
+
+    def __init__(self):
+        self.changes = []
+        self._lock = threading.Lock()
+
+    def add(self, kind, action, name, row=None, **details):
+        change = {"object": kind, "action": action, "name": name, "row": row, **details}
+        with self._lock:
+            self.changes.append(change)
+        return change
+
+    def planned(self, kind, name, **details):
+        """Объект справочника, который был бы создан; возвращает его заготовку без ID."""
+        self.add(kind, "create", name, **details)
+        return {"name": name, **details}
+
+    def counts(self):
+        return Counter((change["object"], change["action"]) for change in self.changes)
+
+    def summary(self):
+        counts = self.counts()
+        parts = []
+        for kind in OBJECT_KINDS:
+            actions = {action: count for (obj, action), count in counts.items() if obj == kind}
+            if actions:
+                parts.append(f"{kind}: " + ", ".join(f"{action} {count}" for action, count in sorted(actions.items())))
+        return "; ".join(parts) or "изменений нет"
+
+    def print_report(self, show_noop=False):
+        """Вывод плана: по одной строке на изменение, поля update - с old -> new."""
+        print(f"\n{'='*60}")
+        print("ПЛАН ИЗМЕНЕНИЙ (записи в Netbox не выполнялись):")
+        print(f"{'='*60}")
+        order = {kind: index for index, kind in enumerate(OBJECT_KINDS)}
+        for change in sorted(self.changes, key=lambda change: (order.get(change["object"], len(order)),
+                                                               change["row"] or 0)):
+            if change["action"] == "noop" and not show_noop:
+                continue
+            row = f"строка {change['row']}: " if change["row"] else ""
+            details = ", ".join(f"{key}={display(value)}" for key, value in change.items()
+                                if key not in ("object", "action", "name", "row", "fields") and value is not None)
+            print(f"{change['action']:<7} {change['object']:<11} {row}{change['name']}"
+                  + (f" ({details})" if details else ""))
+            for field, values in change.get("fields", {}).items():
+                print(f"{'':<20}{field}: {display(values['old'])!r} -> {display(values['new'])!r}")
+        print(f"\nИтого: {self.summary()}")
+        print(f"{'='*60}")
+
+    def write_json(self, path):
+        data = {
+            "summary": {f"{kind}.{action}": count for (kind, action), count in sorted(self.counts().items())},
+            "changes": self.changes,
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1, default=str)
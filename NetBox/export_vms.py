@@ -0,0 +1,178 @@
+import argparse
+import csv
+import importlib.util
+import logging
+import os
+
+import openpyxl
+import requests
+
+import metrics
+import netbox_client
+import update_vms
+
+logger = logging.getLogger(__name__)
+
+# Столбцы выгрузки в порядке листов kln_address.xlsx (таблица загружается обратно update_vms)
+EXPORT_COLUMNS = ("name", "role", "description", "serial", "status", "cluster", "vcpus", "memory", "disk",
+                  "ip_primary", "ip_primary_description", "tenant_name", "vrf_name")
+
+# Поля, запрашиваемые у Netbox
+EXPORT_VM_FIELDS = ("id", "name", "role", "description", "serial", "status", "cluster",
+                    "vcpus", "memory", "disk", "tenant", "primary_ip4")
+EXPORT_IP_FIELDS = ("id", "address", "vrf", "description")
+
+def name_of(value):
+    """Имя объекта из ссылки (или значение выбора, например статуса)."""
+    if isinstance(value, dict):
+        return value.get("name", value.get("value"))
+    return value
+
+def load_primary_ips(vms):
+    """Основные IP-адреса страницы VM: {ID: IP}; загружаются по ID, а не все IP-адреса Netbox."""
+    ids = [vm["primary_ip4"]["id"] for vm in vms if vm.get("primary_ip4")]
+    if not ids:
+        return {}
+    ips = netbox_client.list_all_by(f"{update_vms.NETBOX_API_URL}/ipam/ip-addresses/", "id", ids,
+                                    {"fields": ",".join(EXPORT_IP_FIELDS)})
+    if ips is None:
+        raise requests.exceptions.RequestException("не удалось загрузить основные IP-адреса VM")
+    return {ip["id"]: ip for ip in ips}
+
+def vm_row(vm, ips):
+    """Строка выгрузки для VM; основной IP берется из индекса ips."""
+    primary = vm.get("primary_ip4") or {}
+    ip = ips.get(primary.get("id"), primary) if primary else {}
+    vcpus = vm.get("vcpus")
+    return (
+        vm["name"],
+        name_of(vm.get("role")),
+        vm.get("description") or None,
+        vm.get("serial") or None,
+        name_of(vm.get("status")),
+        name_of(vm.get("cluster")),
+        int(vcpus) if vcpus is not None and float(vcpus).is_integer() else vcpus,
+        vm.get("memory"),
+        vm.get("disk"),
+        ip.get("address"),
+        ip.get("description") or None,
+        name_of(vm.get("tenant")),
+        name_of(ip.get("vrf")),
+    )
+
+# --- Запись блоками ---
+
+class XlsxWriter:
+    """Запись xlsx в режиме write_only: строки не накапливаются в памяти."""
+
+    def __init__(self, path, sheet_name):
+        self.path = path
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.worksheet = self.workbook.create_sheet(sheet_name)
+        self.worksheet.append(EXPORT_COLUMNS)
+
+    def write(self, rows):
+        for row in rows:
+            self.worksheet.append(row)
+
+    def close(self):
+        self.workbook.save(self.path)
+
+class CsvWriter:
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+class ParquetWriter:
+    """Запись Parquet по одной группе строк на блок."""
+
+    def __init__(self, path):
+        if not importlib.util.find_spec("pyarrow"):
+            raise ValueError("Для записи Parquet необходим пакет pyarrow (pip install pyarrow).")
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        types = {"vcpus": pa.float64(), "memory": pa.int64(), "disk": pa.int64()}
+        self.schema = pa.schema([(column, types.get(column, pa.string())) for column in EXPORT_COLUMNS])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        columns = list(zip(*rows)) if rows else [[] for _ in EXPORT_COLUMNS]
+        self.writer.write_table(self.pa.Table.from_arrays(
+            [self.pa.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+def open_writer(path, sheet_name):
+    """Запись по расширению файла: .xlsx, .csv, .parquet/.pq."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return CsvWriter(path)
+    if extension in (".parquet", ".pq"):
+        return ParquetWriter(path)
+    if extension == ".xlsx":
+        return XlsxWriter(path, sheet_name)
+    raise ValueError(f"Неподдерживаемый формат выгрузки '{extension}': используйте .xlsx, .csv или .parquet.")
+
+# --- Основная функция выгрузки ---
+
+def export_vms(path, sheet_name="Prod", page_limit=None, workers=None, cluster=None, tenant=None):
+    """Выгрузка VM Netbox в таблицу в формате листа импорта; возвращает число VM.
+
+    Страницы VM загружаются параллельно и записываются по мере загрузки; для
+    каждой страницы догружаются только основные IP-адреса ее VM.
+    """
+    params = {"fields": ",".join(EXPORT_VM_FIELDS), "ordering": "id"}
+    if cluster:
+        params["cluster"] = cluster
+    if tenant:
+        params["tenant"] = tenant
+    url = f"{update_vms.NETBOX_API_URL}/virtualization/virtual-machines/"
+    writer = open_writer(path, sheet_name)
+    count = 0
+    try:
+        with metrics.phase("export"):
+            for page in netbox_client.iter_pages(url, params, page_limit, workers):
+                ips = load_primary_ips(page)
+                writer.write([vm_row(vm, ips) for vm in page])
+                count += len(page)
+                logger.debug(f"Выгружено VM: {count}")
+    finally:
+        writer.close()
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Выгрузка VM из Netbox в xlsx, CSV или Parquet в формате листа импорта.")
+    parser.add_argument("output", help="Файл выгрузки: .xlsx, .csv или .parquet")
+    parser.add_argument("--sheet", default="Prod", help="Имя листа xlsx (по умолчанию Prod)")
+    parser.add_argument("--cluster", help="Выгрузить только VM кластера (имя)")
+    parser.add_argument("--tenant", help="Выгрузить только VM арендатора (slug)")
+    netbox_client.add_arguments(parser)
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure_logging(args)
+    netbox_client.configure_from_args(update_vms.HEADERS, args)
+
+    try:
+        if update_vms.NETBOX_TOKEN == "api_token":
+            print("Ошибка: Пожалуйста, задайте NETBOX_TOKEN.")
+        else:
+            try:
+                exported = export_vms(args.output, args.sheet, cluster=args.cluster, tenant=args.tenant)
+            except (ValueError, requests.exceptions.RequestException) as e:
+                print(f"Ошибка выгрузки: {e}")
+            else:
+                print(f"Выгружено VM: {exported} в файл '{args.output}'.")
+                metrics.finish(args)
+    finally:
+        netbox_client.close_client()
@@ -1,12 +1,19 @@
 import pandas as pd
-import requests
-import json
 import os
+import argparse
+import logging
+
+import metrics
+import netbox_client
+from netbox_bulk import BulkWriter, DEFAULT_BATCH_SIZE
+from sheet_reader import read_vm_records
+
+logger = logging.getLogger(__name__)
 
 # --- Конфигурация ---
-NETBOX_URL = "https://netbox.axioma-ipc.ru"
+NETBOX_URL = os.environ.get("NETBOX_URL", "https://netbox.axioma-ipc.ru")
 # API токен Netbox
-NETBOX_TOKEN = f"{token}"
+NETBOX_TOKEN = os.environ.get("NETBOX_TOKEN", "api_token")
 # Путь к Excel файлу
 EXCEL_FILE_PATH = "kln_address.xlsx"
 # Название листа с данными
@@ -18,137 +25,102 @@ HEADERS = {
     "Content-Type": "application/json",
     "Accept": "application/json",
 }
-
-# --- Функция для создания виртуальной машины в Netbox ---
-def create_virtual_machine(vm_data):
-    """
-    Отправляет запрос на создание виртуальной машины в Netbox.
-    :param vm_data: Словарь с данными виртуальной машины.
-    :return: True, если успешно, False в противном случае.
-    """
-    url = f"{NETBOX_URL}/api/virtualization/virtual-machines/"
-
-# debug:
-
-    print(f"--- Отправка запроса ---")
-    print(f"URL: {url}")
-    print(f"Метод: POST") # проверкаPOST
-    print(f"Заголовки: {HEADERS}")
-    print(f"Тело запроса (JSON): {json.dumps(vm_data, indent=2)}") # Печатаем красиво форматированный JSON
-    print(f"--- Начало выполнения запроса ---")
-    
-    try:
-        response = requests.post(url, headers=HEADERS, data=json.dumps(vm_data))
-        response.raise_for_status()  # Вызовет исключение для неудовлетворительных ответов (4xx или 5xx)
-
-        print(f"Успешно создана VM: {vm_data.get('name')}")
-        return True
-    
-    except requests.exceptions.HTTPError as errh:
-        print(f"Ошибка HTTP: {errh}")
-        try:
-            error_details = response.json()
-            print("Детали ошибки:")
-            print(json.dumps(error_details, indent=2, ensure_ascii=False))
-        except json.JSONDecodeError:
-            print("Не удалось декодировать ответ как JSON.")
-            print(f"Тело ответа: {response.text}")
-    except requests.exceptions.ConnectionError as errc:
-        print(f"Ошибка подключения: {errc}")
-    except requests.exceptions.Timeout as errt:
-        print(f"Ошибка таймаута: {errt}")
-    except requests.exceptions.RequestException as err:
-        print(f"Неожиданная ошибка запроса: {err}")
-    except requests.exceptions.RequestException as e:
-        print(f"Ошибка при создании VM '{vm_data.get('name')}': {e}")
-        if response:
-            try:
-                error_details = response.json()
-                print(f"Детали ошибки API: {error_details}")
-            except json.JSONDecodeError:
-                print(f"Не удалось декодировать ответ API: {response.text}")
-        return False
+netbox_client.configure(HEADERS)
 
 # --- Основная логика скрипта ---
-def import_vms_from_excel(excel_path, sheet_name):
+def import_vms_from_excel(excel_path, sheet_name, workers=1, batch_size=DEFAULT_BATCH_SIZE):
     """
     Читает данные из Excel и импортирует виртуальные машины в Netbox.
     """
+    # Проверяется наличие необходимых столбцов и заполненность обязательных полей
+    required_columns = ['name', 'role', 'description', 'serial']
     try:
-        df = pd.read_excel(excel_path, sheet_name=sheet_name)
-        print(f"Успешно прочитан файл: {excel_path}, лист: {sheet_name}")
+        with metrics.phase("read"):
+            sheet = read_vm_records(excel_path, sheet_name, required=("name", "role", "status"),
+                                    required_columns=required_columns)
+        logger.info(f"Успешно прочитан файл: {excel_path}, лист: {sheet_name}")
     except FileNotFoundError:
-        print(f"Ошибка: Файл '{excel_path}' не найден.")
+        logger.error(f"Ошибка: Файл '{excel_path}' не найден.")
         return
     except ValueError as ve:
-        print(f"Ошибка: Лист '{sheet_name}' не найден в файле '{excel_path}'.")
-        print(f"Доступные листы: {pd.ExcelFile(excel_path).sheet_names}")
+        logger.error(f"Ошибка при чтении файла '{excel_path}', лист '{sheet_name}': {ve}")
+        if excel_path.endswith((".xlsx", ".xlsm", ".xls")):
+            logger.error(f"Доступные листы: {pd.ExcelFile(excel_path).sheet_names}")
         return
     except Exception as e:
-        print(f"Неожиданная ошибка при чтении Excel файла: {e}")
+        logger.error(f"Неожиданная ошибка при чтении Excel файла: {e}")
         return
 
-    # Проверка наличия необходимых столбцов
-    required_columns = ['name', 'role', 'description', 'serial']
-    if not all(col in df.columns for col in required_columns):
-        missing_cols = [col for col in required_columns if col not in df.columns]
-        print(f"Ошибка: Отсутствуют обязательные столбцы в Excel файле: {', '.join(missing_cols)}")
-        print(f"Найденные столбцы: {df.columns.tolist()}")
-        return
+    for reject in sheet.rejects.itertuples(index=False):
+        logger.warning(f"Пропуск строки {reject.row}: {reject.reason}.")
 
-    for index, row in df.iterrows():
-        vm_name = row['name']
-        vm_role_name = row['role']
-        vm_description = row['description']
-        vm_serial = row['serial']
-        vm_status = row['status']
-        vm_ip_primary = row['ip_primary']
-        vm_vcpus = row['vcpus']
-        vm_memory = row['memory']
-        vm_disk = row['disk']
-
-        # Проверка на пустые значения в обязательных полях
-        if pd.isna(vm_name) or pd.isna(vm_role_name) or pd.isna(vm_status):
-            print(f"Пропуск строки {index + 2}: Отсутствует 'name' или 'role' или 'status'.")
-            continue
+    # VM создаются списочными запросами по batch_size объектов
+    writer = BulkWriter(f"{NETBOX_URL}/api/virtualization/virtual-machines/", "POST", batch_size, workers)
+    with metrics.phase("apply"):
+        create_vms(writer, sheet.records)
+    for row_number, vm in sorted(writer.results.items()):
+        logger.debug(f"Успешно создана VM: {vm.get('name')} (строка {row_number})")
+    for row_number, details in sorted(writer.errors.items()):
+        logger.error(f"Строка {row_number}: VM не создана: {details}")
+    print(f"Лист '{sheet_name}': строк {sheet.total}, создано VM {len(writer.results)}, "
+          f"ошибок Netbox {len(writer.errors)}, пропущено строк {len(sheet.rejects)}")
 
+def create_vms(writer, records):
+    """Пакетное создание VM по строкам таблицы."""
+    for record in records:
         # Формирование данных для API
         # Важно: 'role' в API Netbox ожидает ID роли, но мы можем указать ее имя
         # Netbox найдет ID по имени, если роль существует.
         vm_payload = {
-            "name": str(vm_name),
+            "name": record.name,
             #"site": {"id": 2},
             "cluster": {"id": 4},
-            "role": {"name": str(vm_role_name)},
-            "description": str(vm_description) if not pd.isna(vm_description) else "",
-            "serial": str(vm_serial) if not pd.isna(vm_serial) else "",
+            "role": {"name": record.role},
+            "description": record.description or "",
+            "serial": record.serial or "",
             #"platform": {"id": 1},
             # "primary_ip4": {
-            #     "address": str(vm_ip_primary)  if not pd.isna(vm_ip_primary) else "",
+            #     "address": record.ip_primary or "",
             #     "description": ""
             # },
-            "vcpus": vm_vcpus if not pd.isna(vm_vcpus) else "",
-            "memory": vm_memory if not pd.isna(vm_memory) else "",
-            "disk": vm_disk if not pd.isna(vm_disk) else "",            
-            #"status": {"label": str(vm_status) if not pd.isna(vm_status) else ""},
+            "vcpus": record.vcpus if record.vcpus is not None else "",
+            "memory": record.memory if record.memory is not None else "",
+            "disk": record.disk if record.disk is not None else "",
+            #"status": {"label": record.status},
             
             # "tenant": {"name": "YourTenantName"},
             # "config_template": {"name": "YourConfigTemplateName"},
             # ...
         }
 
-        print(f"Попытка импорта VM: {vm_name}...")
-        create_virtual_machine(vm_payload)
+        logger.debug(f"Попытка импорта VM: {record.name}...")
+        writer.add(record.row, vm_payload)
+    writer.flush()
 
 # --- Запуск импорта ---
 if __name__ == "__main__":
-    # Проверка наличия файла и токена
-    if NETBOX_URL == "http://netbox-instance.com":
-        print("Ошибка: Пожалуйста, обновите NETBOX_URL в скрипте.")
-    elif NETBOX_TOKEN == "api_token":
-        print("Ошибка: Пожалуйста, обновите NETBOX_TOKEN в скрипте.")
-    elif not os.path.exists(EXCEL_FILE_PATH):
-        print(f"Ошибка: Excel файл '{EXCEL_FILE_PATH}' не найден.")
-    else:
-        import_vms_from_excel(EXCEL_FILE_PATH, SHEET_NAME)
-        print("\nИмпорт завершен.")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Импорт VM в Netbox из Excel файла.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Количество пакетных запросов, выполняемых параллельно (по умолчанию 1)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Количество VM в одном пакетном запросе (по умолчанию {DEFAULT_BATCH_SIZE})")
+    netbox_client.add_arguments(parser)
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure_logging(args)
+    netbox_client.configure_from_args(HEADERS, args)
+
+    try:
+        # Проверка наличия файла и токена
+        if NETBOX_URL == "http://netbox-instance.com":
+            print("Ошибка: Пожалуйста, обновите NETBOX_URL в скрипте.")
+        elif NETBOX_TOKEN == "api_token":
+            print("Ошибка: Пожалуйста, обновите NETBOX_TOKEN в скрипте.")
+        elif not os.path.exists(EXCEL_FILE_PATH):
+            print(f"Ошибка: Excel файл '{EXCEL_FILE_PATH}' не найден.")
+        else:
+            import_vms_from_excel(EXCEL_FILE_PATH, SHEET_NAME, workers=args.workers, batch_size=args.batch_size)
+            metrics.finish(args)
+            print("\nИмпорт завершен.")
+    finally:
+        netbox_client.close_client()
\ No newline at end of file
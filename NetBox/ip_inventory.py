@@ -0,0 +1,94 @@
+import ipaddress
+
+import netbox_client
+
+# Поля IP-адреса, необходимые для сверки
+IP_FIELDS = ("id", "address", "vrf", "assigned_object_type", "assigned_object_id", "assigned_object")
+
+VM_INTERFACE_TYPE = "virtualization.vminterface"
+
+def host(address):
+    """Адрес без маски: "10.0.0.5/24" -> "10.0.0.5"."""
+    return str(ipaddress.ip_interface(address).ip)
+
+class IPInventory:
+    """IP-адреса Netbox, проиндексированные по (ID VRF, адрес без маски).
+
+    Адреса загружаются списочными запросами по содержащим их префиксам
+    (parent), каждый префикс - один раз за запуск; адреса вне известных
+    префиксов загружаются по значению. Пока адрес не загружен, он ищется
+    через lookup. complete - загружены все IP-адреса Netbox (например, из
+    зеркала netbox_mirror), запросы не нужны.
+    """
+
+    def __init__(self, api_url, prefixes, lookup=None):
+        self.url = f"{api_url}/ipam/ip-addresses/"
+        self.prefixes = prefixes
+        self.lookup = lookup
+        self.by_key = {}
+        self.loaded_parents = set()
+        self.loaded_addresses = set()
+        self.complete = False
+
+    @staticmethod
+    def key(address, vrf_id):
+        return vrf_id, host(address)
+
+    def load(self, addresses):
+        """Загрузка IP-адресов в префиксах, содержащих addresses; False при ошибке."""
+        if self.complete:
+            return True
+        parents = set()
+        loose = set()
+        for address in addresses:
+            prefix = self.prefixes.resolve(address, any_vrf=True)
+            if prefix:
+                if prefix["prefix"] not in self.loaded_parents:
+                    parents.add(prefix["prefix"])
+            elif host(address) not in self.loaded_addresses:
+                loose.add(host(address))
+        params = {"fields": ",".join(IP_FIELDS)}
+        ok = True
+        for key, values, loaded in (("parent", parents, self.loaded_parents),
+                                    ("address", loose, self.loaded_addresses)):
+            if not values:
+                continue
+            ips = netbox_client.list_all_by(self.url, key, sorted(values), params)
+            if ips is None:
+                ok = False
+                continue
+            for ip in ips:
+                self.add(ip)
+            loaded.update(values)
+        return ok
+
+    def add(self, ip):
+        """Добавление созданного или изменённого IP-адреса в индекс."""
+        vrf_id = (ip.get("vrf") or {}).get("id")
+        self.by_key[self.key(ip["address"], vrf_id)] = ip
+
+    def is_loaded(self, address):
+        if self.complete:
+            return True
+        prefix = self.prefixes.resolve(address, any_vrf=True)
+        if prefix:
+            return prefix["prefix"] in self.loaded_parents
+        return host(address) in self.loaded_addresses
+
+    def get(self, address, vrf_id=None):
+        """IP-адрес из индекса; None, если его нет в Netbox."""
+        key = self.key(address, vrf_id)
+        if key in self.by_key:
+            return self.by_key[key]
+        if not self.is_loaded(address) and self.lookup:
+            ip = self.lookup(host(address), vrf_id)
+            if ip:
+                self.add(ip)
+            return ip
+        return None
+
+def assigned_vm(ip):
+    """VM, интерфейсу которой назначен IP: {"id": ..., "name": ...}; None, если не назначен VM."""
+    if ip.get("assigned_object_type") != VM_INTERFACE_TYPE:
+        return None
+    return (ip.get("assigned_object") or {}).get("virtual_machine")
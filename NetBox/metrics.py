@@ -0,0 +1,222 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Процентили задержки в отчете
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Формат журнала скриптов: время, уровень, модуль, сообщение
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+def endpoint_of(url):
+    """Эндпоинт без префикса /api/ и ID объекта: virtualization/virtual-machines/{id}."""
+    path = urlparse(url).path
+    path = re.sub(r"^.*?/api/", "", path).strip("/")
+    return re.sub(r"/\d+(?=/|$)", "/{id}", path)
+
+def quantile(sorted_values, q):
+    """Процентиль по отсортированным значениям (ближайший ранг)."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+class Metrics:
+    """Метрики запросов к Netbox по (метод, эндпоинт) и длительности этапов импорта.
+
+    Каждая попытка запроса (включая повторы) учитывается отдельно. Этапы могут
+    быть вложенными: время вложенного этапа не входит во время внешнего.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.sources = {}
+        # phase_profile.PhaseProfiler в режиме профилирования (--profile)
+        self.profiler = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latencies = defaultdict(list)
+            self.statuses = defaultdict(Counter)
+            self.bytes_sent = Counter()
+            self.bytes_received = Counter()
+            self.phases = Counter()
+            self.started = time.perf_counter()
+
+    def record_request(self, method, url, status, seconds, sent=0, received=0):
+        """Учет одной попытки запроса; status - код ответа или имя исключения."""
+        key = (method.upper(), endpoint_of(url))
+        if self.profiler:
+            self.profiler.record_request(seconds)
+        with self._lock:
+            self.latencies[key].append(seconds)
+            self.statuses[key][str(status)] += 1
+            self.bytes_sent[key] += sent
+            self.bytes_received[key] += received
+
+    def register(self, name, source):
+        """Дополнительный раздел метрик: source() возвращает словарь значений (например, состояние регулятора)."""
+        self.sources[name] = source
+
+    @contextmanager
+    def phase(self, name):
+        """Измерение этапа; вложенный этап приостанавливает время внешнего."""
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        now = time.perf_counter()
+        if stack:
+            self._charge(stack[-1], now)
+        stack.append([name, now])
+        if self.profiler:
+            self.profiler.enter(name)
+        try:
+            yield
+        finally:
+            if self.profiler:
+                self.profiler.exit(name)
+            now = time.perf_counter()
+            self._charge(stack.pop(), now)
+            if stack:
+                stack[-1][1] = now
+
+    def _charge(self, frame, now):
+        with self._lock:
+            self.phases[frame[0]] += now - frame[1]
+        frame[1] = now
+
+    def snapshot(self):
+        """Метрики в виде словаря (для JSON)."""
+        with self._lock:
+            endpoints = []
+            for (method, endpoint), latencies in sorted(self.latencies.items()):
+                ordered = sorted(latencies)
+                endpoints.append({
+                    "method": method,
+                    "endpoint": endpoint,
+                    "count": len(ordered),
+                    "seconds_total": round(sum(ordered), 6),
+                    **{f"p{int(q * 100)}": round(quantile(ordered, q), 6) for q in QUANTILES},
+                    "bytes_sent": self.bytes_sent[(method, endpoint)],
+                    "bytes_received": self.bytes_received[(method, endpoint)],
+                    "statuses": dict(self.statuses[(method, endpoint)]),
+                })
+            return {
+                "wall_seconds": round(time.perf_counter() - self.started, 6),
+                "requests_total": sum(item["count"] for item in endpoints),
+                "phases": {name: round(seconds, 6) for name, seconds in self.phases.items()},
+                "endpoints": endpoints,
+                **{name: source() for name, source in self.sources.items()},
+            }
+
+    def to_prometheus(self, prefix="netbox_sync"):
+        """Метрики в текстовом формате Prometheus (для textfile collector)."""
+        data = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_requests_total Requests to NetBox API by method, endpoint and status.",
+            f"# TYPE {prefix}_requests_total counter",
+        ]
+        for item in data["endpoints"]:
+            for status, count in sorted(item["statuses"].items()):
+                lines.append(f'{prefix}_requests_total{{method="{item["method"]}",'
+                             f'endpoint="{item["endpoint"]}",status="{status}"}} {count}')
+        lines += [
+            f"# HELP {prefix}_request_duration_seconds NetBox API request latency.",
+            f"# TYPE {prefix}_request_duration_seconds summary",
+        ]
+        for item in data["endpoints"]:
+            labels = f'method="{item["method"]}",endpoint="{item["endpoint"]}"'
+            for q in QUANTILES:
+                lines.append(f'{prefix}_request_duration_seconds{{{labels},quantile="{q}"}} '
+                             f'{item[f"p{int(q * 100)}"]}')
+            lines.append(f"{prefix}_request_duration_seconds_sum{{{labels}}} {item['seconds_total']}")
+            lines.append(f"{prefix}_request_duration_seconds_count{{{labels}}} {item['count']}")
+        lines += [
+            f"# HELP {prefix}_request_bytes_total Bytes sent to and received from NetBox API.",
+            f"# TYPE {prefix}_request_bytes_total counter",
+        ]
+        for item in data["endpoints"]:
+            labels = f'method="{item["method"]}",endpoint="{item["endpoint"]}"'
+            lines.append(f'{prefix}_request_bytes_total{{{labels},direction="sent"}} {item["bytes_sent"]}')
+            lines.append(f'{prefix}_request_bytes_total{{{labels},direction="received"}} {item["bytes_received"]}')
+        lines += [
+            f"# HELP {prefix}_phase_seconds Time spent in each import phase.",
+            f"# TYPE {prefix}_phase_seconds gauge",
+        ]
+        for name, seconds in sorted(data["phases"].items()):
+            lines.append(f'{prefix}_phase_seconds{{phase="{name}"}} {seconds}')
+        lines.append(f"{prefix}_wall_seconds {data['wall_seconds']}")
+        for name in self.sources:
+            for key, value in data[name].items():
+                if isinstance(value, (int, float)):
+                    lines.append(f"{prefix}_{name}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Атомарная запись метрик: *.prom - формат Prometheus, иначе JSON."""
+        if path.endswith(".prom"):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.snapshot(), ensure_ascii=False, indent=1)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def log_summary(self, top=10):
+        """Вывод в журнал самых медленных эндпоинтов и длительности этапов."""
+        data = self.snapshot()
+        phases = ", ".join(f"{name}={seconds:.2f}s" for name, seconds in data["phases"].items())
+        logger.info("run wall=%.2fs requests=%d phases: %s",
+                    data["wall_seconds"], data["requests_total"], phases or "-")
+        for item in sorted(data["endpoints"], key=lambda item: item["seconds_total"], reverse=True)[:top]:
+            logger.info("endpoint method=%s endpoint=%s count=%d total=%.2fs p50=%.3fs p95=%.3fs p99=%.3fs "
+                        "sent=%d received=%d statuses=%s",
+                        item["method"], item["endpoint"], item["count"], item["seconds_total"],
+                        item["p50"], item["p95"], item["p99"], item["bytes_sent"],
+                        item["bytes_received"], item["statuses"])
+        for name in self.sources:
+            logger.info("%s %s", name, " ".join(f"{key}={value}" for key, value in data[name].items()
+                                                if not isinstance(value, (list, dict))))
+
+# Общие метрики процесса
+METRICS = Metrics()
+phase = METRICS.phase
+
+def add_arguments(parser):
+    """Добавление параметров журнала и метрик в парсер командной строки."""
+    group = parser.add_argument_group("Журнал и метрики")
+    group.add_argument("--log-level", default="INFO",
+                       choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+                       help="Уровень журнала (по умолчанию INFO; DEBUG - каждый объект и каждый запрос)")
+    group.add_argument("--metrics-file",
+                       help="Файл метрик по окончании работы: *.prom - формат Prometheus, иначе JSON")
+    group.add_argument("--profile", metavar="DIR",
+                       help="Профилирование этапов (cProfile, tracemalloc) с отчетами в каталоге DIR; "
+                            "работа заметно замедляется")
+
+def configure_logging(args):
+    """Настройка журнала; с --profile включается профилирование этапов."""
+    logging.basicConfig(level=args.log_level, format=LOG_FORMAT)
+    if getattr(args, "profile", None):
+        from phase_profile import PhaseProfiler
+        METRICS.profiler = PhaseProfiler(args.profile)
+
+def finish(args):
+    """Сводка метрик в журнал и запись файла метрик, если он задан."""
+    METRICS.log_summary()
+    if args.metrics_file:
+        METRICS.write(args.metrics_file)
+        logger.info("metrics written path=%s", args.metrics_file)
+    if METRICS.profiler:
+        METRICS.profiler.write(dict(METRICS.phases))
@@ -0,0 +1,352 @@
+import asyncio
+import contextlib
+import logging
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import netbox_client
+from metrics import METRICS
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE = 0  # Запросов в секунду (0 - без ограничения)
+
+class TokenBucket:
+    """Ограничение частоты запросов: rate токенов в секунду, не более burst подряд."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def to_requests_response(response):
+    """Ответ httpx в виде requests.Response: остальной код работает с ним как с ответом синхронного клиента."""
+    result = requests.Response()
+    result.status_code = response.status_code
+    result._content = response.content
+    result.headers = CaseInsensitiveDict(response.headers)
+    result.url = str(response.url)
+    result.encoding = response.encoding
+    result.reason = response.reason_phrase
+    return result
+
+def to_requests_error(error):
+    """Ошибка запроса httpx в виде исключения requests (как у синхронного клиента)."""
+    if isinstance(error, httpx.TooManyRedirects):
+        return requests.exceptions.TooManyRedirects(str(error))
+    if isinstance(error, httpx.DecodingError):
+        return requests.exceptions.ContentDecodingError(str(error))
+    if isinstance(error, httpx.ReadTimeout):
+        return requests.exceptions.ReadTimeout(str(error))
+    if isinstance(error, httpx.ConnectTimeout):
+        return requests.exceptions.ConnectTimeout(str(error))
+    if isinstance(error, httpx.TimeoutException):
+        return requests.exceptions.Timeout(str(error))
+    return requests.exceptions.ConnectionError(str(error))
+
+class AdaptiveGate:
+    """Ограничение запросов корутин адаптивным лимитом (adaptive_limit.AdaptiveLimit)."""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.limiter.limit)
+            self.in_flight += 1
+
+    async def release(self, seconds, status):
+        async with self.condition:
+            self.limiter.record(seconds, status, self.in_flight)
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+class AsyncNetBoxClient:
+    """Асинхронный HTTP-клиент Netbox (httpx) для каналов с большой задержкой.
+
+    Число одновременных запросов ограничено семафором (с limiter - адаптивным
+    лимитом), частота - token bucket. Повторы, таймауты и учет метрик - как у
+    синхронного NetBoxClient; ответы и исключения приводятся к типам requests.
+    """
+
+    def __init__(self, headers, concurrency=netbox_client.DEFAULT_ASYNC_CONCURRENCY,
+                 rate=DEFAULT_RATE, burst=None,
+                 connect_timeout=netbox_client.DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=netbox_client.DEFAULT_READ_TIMEOUT,
+                 max_retries=netbox_client.DEFAULT_MAX_RETRIES,
+                 backoff_factor=netbox_client.DEFAULT_BACKOFF_FACTOR,
+                 backoff_max=netbox_client.DEFAULT_BACKOFF_MAX, limiter=None):
+        if httpx is None:
+            raise RuntimeError("Для асинхронного клиента необходим пакет httpx (pip install httpx).")
+        self.concurrency = concurrency
+        self.session = httpx.AsyncClient(
+            headers=headers,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency))
+        self.limiter = limiter
+        self.gate = AdaptiveGate(limiter) if limiter else None
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+
+    # Расчет задержек повтора общий с синхронным клиентом
+    backoff_delay = netbox_client.NetBoxClient.backoff_delay
+    retry_after = netbox_client.NetBoxClient.retry_after
+
+    async def request(self, method, url, **kwargs):
+        """Выполняет запрос с повторами как NetBoxClient.request; возвращает requests.Response."""
+        if isinstance(kwargs.get("data"), (str, bytes)):
+            kwargs["content"] = kwargs.pop("data")
+        attempt = 0
+        while True:
+            if self.bucket:
+                await self.bucket.acquire()
+            async with self.slot() as outcome:
+                started = time.perf_counter()
+                try:
+                    response = await self.session.request(method, url, **kwargs)
+                    outcome["status"] = response.status_code
+                except httpx.RequestError as e:
+                    METRICS.record_request(method, url, type(e).__name__, time.perf_counter() - started)
+                    # Повторяются только сетевые ошибки; ошибки декодирования и перенаправлений - нет
+                    if not isinstance(e, httpx.TransportError):
+                        raise to_requests_error(e) from e
+                    outcome["status"] = type(e).__name__
+                    # POST и PATCH повторяются, только если соединение не было установлено
+                    not_sent = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                    if attempt >= self.max_retries or not (
+                            method.upper() in netbox_client.IDEMPOTENT_METHODS or not_sent):
+                        raise to_requests_error(e) from e
+                    delay = self.backoff_delay(attempt)
+                    logger.warning("Сетевая ошибка при запросе %s %s: %s. Повтор через %.1f с...",
+                                   method, url, e, delay)
+                    response = None
+            if response is not None:
+                elapsed = time.perf_counter() - started
+                sent = len(response.request.content or b"")
+                METRICS.record_request(method, url, response.status_code, elapsed, sent, len(response.content))
+                logger.debug("request method=%s url=%s status=%d seconds=%.3f sent=%d received=%d",
+                             method, response.url, response.status_code, elapsed, sent, len(response.content))
+                result = to_requests_response(response)
+                if not netbox_client.should_retry(method, response.status_code) or attempt >= self.max_retries:
+                    return result
+                delay = self.retry_after(result)
+                if delay is None:
+                    delay = self.backoff_delay(attempt)
+                logger.warning("Netbox вернул %d на %s %s. Повтор через %.1f с...",
+                               response.status_code, method, url, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Место для запроса: семафор или адаптивный лимит (ему передаются задержка и код ответа)."""
+        if not self.gate:
+            async with self.semaphore:
+                yield {}
+            return
+        await self.gate.acquire()
+        outcome = {"status": None}
+        started = time.perf_counter()
+        try:
+            yield outcome
+        finally:
+            await self.gate.release(time.perf_counter() - started, outcome["status"])
+
+    async def list_all(self, url, params=None, page_limit=netbox_client.LIST_PAGE_LIMIT):
+        """Получение всех объектов списка; страницы после первой запрашиваются одновременно. None при ошибке."""
+        query = {**(params or {}), "limit": page_limit, "offset": 0}
+        try:
+            first = await self.fetch_page(url, query)
+            # Сервер может урезать limit своим MAX_PAGE_SIZE: шаг - фактический размер страницы
+            step = len(first.get("results", []))
+            pages = []
+            if first.get("next") and step:
+                pages = await asyncio.gather(*(self.fetch_page(url, {**query, "offset": offset})
+                                               for offset in range(step, first["count"], step)))
+        except requests.exceptions.RequestException as e:
+            logger.error("Ошибка при загрузке списка %s: %s", url, e)
+            return None
+        return [obj for page in (first, *pages) for obj in page.get("results", [])]
+
+    async def fetch_page(self, url, params):
+        response = await self.request("GET", url, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def list_all_by(self, url, key, values, params=None,
+                          chunk_size=netbox_client.FILTER_VALUES_PER_REQUEST):
+        """Получение объектов по многозначному фильтру; группы значений запрашиваются одновременно."""
+        values = list(dict.fromkeys(values))
+        chunks = await asyncio.gather(*(
+            self.list_all(url, {**(params or {}), key: values[i:i + chunk_size]})
+            for i in range(0, len(values), chunk_size)))
+        if any(chunk is None for chunk in chunks):
+            return None
+        return [obj for chunk in chunks for obj in chunk]
+
+    async def aclose(self):
+        await self.session.aclose()
+
+class AsyncNetBoxAPI:
+    """Операции Netbox в виде корутин (аналоги функций update_vms).
+
+    Ошибки запросов записываются в лог, операция возвращает None, как
+    update_vms.netbox_api_request.
+
+    Пример:
+        api = netbox_client.get_client().api(NETBOX_API_URL)
+        vms = netbox_client.get_client().run_all([api.get_virtual_machine_by_name(name) for name in names])
+    """
+
+    def __init__(self, client, api_url):
+        self.client = client
+        self.api_url = api_url
+
+    async def request(self, method, url, **kwargs):
+        """Выполняет запрос к API Netbox; JSON ответа или None при ошибке."""
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Ошибка при запросе к Netbox API: {e}")
+            if getattr(e, "response", None) is not None:
+                logger.error(f"Тело ответа: {e.response.text}")
+            return None
+
+    async def first(self, endpoint, params):
+        """Первый объект списка по фильтру или None."""
+        response = await self.request("GET", f"{self.api_url}/{endpoint}/", params=params)
+        if response and response.get("count", 0) > 0:
+            return response["results"][0]
+        return None
+
+    async def get_virtual_machine_by_name(self, name):
+        return await self.first("virtualization/virtual-machines", {"name": name})
+
+    async def create_virtual_machine(self, payload):
+        return await self.request("POST", f"{self.api_url}/virtualization/virtual-machines/", json=payload)
+
+    async def update_virtual_machine(self, vm_id, payload):
+        return await self.request("PATCH", f"{self.api_url}/virtualization/virtual-machines/{vm_id}/",
+                                  json=payload)
+
+    async def get_ip_by_address(self, address, vrf_id=None):
+        return await self.first("ipam/ip-addresses", {"address": address, "vrf_id": vrf_id or "null"})
+
+    async def create_ip_address(self, payload):
+        return await self.request("POST", f"{self.api_url}/ipam/ip-addresses/", json=payload)
+
+    async def get_vm_interfaces(self, vm_id):
+        interfaces = await self.client.list_all(f"{self.api_url}/virtualization/interfaces/",
+                                                {"virtual_machine_id": vm_id})
+        return interfaces or []
+
+    async def create_vm_interface(self, vm_id, interface_name="eth0"):
+        payload = {
+            "virtual_machine": {"id": vm_id},
+            "name": interface_name,
+            "type": {"value": "virtual"},
+        }
+        return await self.request("POST", f"{self.api_url}/virtualization/interfaces/", json=payload)
+
+    async def assign_ip_to_interface(self, interface_id, ip_address_id):
+        payload = {
+            "assigned_object_type": "virtualization.vminterface",
+            "assigned_object_id": interface_id,
+        }
+        return await self.request("PATCH", f"{self.api_url}/ipam/ip-addresses/{ip_address_id}/", json=payload)
+
+    async def create_device_role(self, payload):
+        return await self.request("POST", f"{self.api_url}/dcim/device-roles/", json=payload)
+
+    async def create_cluster(self, payload):
+        return await self.request("POST", f"{self.api_url}/virtualization/clusters/", json=payload)
+
+class AsyncBridge:
+    """Синхронный интерфейс асинхронного клиента для существующего кода импорта.
+
+    Цикл событий работает в отдельном потоке; запросы из любых потоков
+    выполняются в нем, поэтому ограничения параллельности и частоты общие
+    для всего процесса. Списочные загрузки по многозначному фильтру
+    выполняются одновременно по всем группам значений, а операции
+    AsyncNetBoxAPI (api) - одновременно через run_all.
+    """
+
+    def __init__(self, headers, **options):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="netbox-async", daemon=True)
+        self.thread.start()
+        self.client = self.run(self._create(headers, options))
+
+    @staticmethod
+    async def _create(headers, options):
+        # Семафор и клиент создаются внутри цикла событий, в котором будут использоваться
+        return AsyncNetBoxClient(headers, **options)
+
+    @property
+    def concurrency(self):
+        return self.client.concurrency
+
+    @property
+    def limiter(self):
+        return self.client.limiter
+
+    def run(self, coroutine):
+        """Выполнение корутины в цикле событий клиента с ожиданием результата."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def api(self, api_url):
+        """Операции Netbox этого клиента в виде корутин."""
+        return AsyncNetBoxAPI(self.client, api_url)
+
+    def run_all(self, coroutines):
+        """Одновременное выполнение корутин в цикле событий клиента; результаты в порядке корутин."""
+        async def gather():
+            return await asyncio.gather(*coroutines)
+        return self.run(gather())
+
+    def request(self, method, url, **kwargs):
+        kwargs.pop("timeout", None)
+        return self.run(self.client.request(method, url, **kwargs))
+
+    def list_all(self, url, params=None, page_limit=netbox_client.LIST_PAGE_LIMIT):
+        return self.run(self.client.list_all(url, params, page_limit))
+
+    def list_all_by(self, url, key, values, params=None, chunk_size=netbox_client.FILTER_VALUES_PER_REQUEST):
+        return self.run(self.client.list_all_by(url, key, values, params, chunk_size))
+
+    def close(self):
+        self.run(self.client.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+def configure(headers, **options):
+    """Асинхронный клиент как общий клиент Netbox (netbox_client.get_client())."""
+    return netbox_client.set_client(AsyncBridge(headers, **options))
@@ -0,0 +1,127 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import netbox_client
+from metrics import endpoint_of
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 200  # Количество объектов в одном списочном запросе
+
+class BulkWriter:
+    """Пакетная запись объектов Netbox списочными POST/PATCH/DELETE запросами.
+
+    Объекты добавляются с ключом (обычно номером строки таблицы), результаты
+    и ошибки возвращаются по тем же ключам. Netbox выполняет списочный запрос
+    в одной транзакции и при ошибке валидации возвращает список ошибок по
+    объектам в порядке отправки: ошибочные объекты отбрасываются, остальные
+    отправляются повторно. Если ответ не позволяет найти ошибочные объекты,
+    пакет делится пополам.
+
+    Если задан журнал (SyncJournal), каждый пакет фиксируется в нем до
+    отправки и отмечается выполненным или ошибочным после ответа.
+    """
+
+    def __init__(self, url, method="POST", batch_size=DEFAULT_BATCH_SIZE, workers=1, journal=None):
+        self.url = url
+        self.method = method
+        self.batch_size = batch_size
+        self.workers = workers
+        self.journal = journal
+        self.endpoint = endpoint_of(url)
+        self.pending = []
+        self.results = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, ref, payload):
+        """Добавление объекта; при последовательной отправке полный пакет отправляется сразу."""
+        with self._lock:
+            self.pending.append((ref, payload))
+            # При параллельной отправке пакеты копятся до flush и отправляются одновременно
+            if len(self.pending) < self.batch_size or self.concurrency() > 1:
+                return
+            batch, self.pending = self.pending, []
+        self._send(batch)
+
+    def flush(self):
+        """Отправка всех накопленных объектов пакетами по batch_size."""
+        with self._lock:
+            pending, self.pending = self.pending, []
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        workers = self.concurrency()
+        if workers > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(self._send, batches))
+        else:
+            for batch in batches:
+                self._send(batch)
+        return self.results
+
+    def concurrency(self):
+        """Число пакетов, отправляемых одновременно.
+
+        Асинхронный клиент и адаптивный лимит (--adaptive) сами ограничивают
+        число запросов в полете, поэтому с ними все пакеты отправляются сразу.
+        """
+        return max(self.workers, getattr(netbox_client.get_client(), "concurrency", 1))
+
+    def _send(self, batch):
+        """Отправка пакета; при ошибке валидации ошибочные объекты отбрасываются, остальные отправляются снова."""
+        if self.journal:
+            self.journal.begin(self.endpoint, self.method, batch)
+        try:
+            response = netbox_client.get_client().request(
+                self.method, self.url, json=[payload for _, payload in batch])
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Ошибка при пакетном запросе {self.method} {self.url}: {e}")
+            self._fail(batch, str(e))
+            return
+        if response.ok:
+            # Netbox возвращает объекты в порядке отправки; DELETE возвращает пустой ответ
+            objects = response.json() if response.content else [payload for _, payload in batch]
+            with self._lock:
+                for (ref, _), obj in zip(batch, objects):
+                    self.results[ref] = obj
+            if self.journal:
+                self.journal.done(self.endpoint, self.method,
+                                  [(ref, obj.get("id")) for (ref, _), obj in zip(batch, objects)])
+            return
+        try:
+            details = response.json()
+        except ValueError:
+            details = response.text
+        if response.status_code == 400 and len(batch) > 1:
+            if isinstance(details, list) and len(details) == len(batch) and any(details):
+                # Ошибки по объектам: пустой элемент - объект корректен
+                valid = []
+                for item, error in zip(batch, details):
+                    if error:
+                        logger.error(f"Netbox отклонил объект {item[0]}: {error}")
+                        self._fail([item], error)
+                    else:
+                        valid.append(item)
+                if valid:
+                    self._send(valid)
+                return
+            middle = len(batch) // 2
+            self._send(batch[:middle])
+            self._send(batch[middle:])
+            return
+        if isinstance(details, list) and len(details) == 1:
+            details = details[0]
+        if len(batch) == 1:
+            logger.error(f"Netbox отклонил объект {batch[0][0]}: {details}")
+        else:
+            logger.error(f"Ошибка при пакетном запросе {self.method} {self.url} ({response.status_code}): {details}")
+        self._fail(batch, details)
+
+    def _fail(self, batch, details):
+        with self._lock:
+            for ref, _ in batch:
+                self.errors[ref] = details
+        if self.journal:
+            self.journal.failed(self.endpoint, self.method, [ref for ref, _ in batch], details)
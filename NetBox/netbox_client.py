@@ -0,0 +1,318 @@
+import logging
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from adaptive_limit import DEFAULT_MAX_ERROR_RATE, DEFAULT_MIN_LIMIT, DEFAULT_TARGET_P95, AdaptiveLimit
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# --- Настройки HTTP-клиента по умолчанию ---
+DEFAULT_POOL_SIZE = 10  # Максимум keep-alive соединений к Netbox
+DEFAULT_CONNECT_TIMEOUT = 5  # Таймаут установки соединения, сек
+DEFAULT_READ_TIMEOUT = 60  # Таймаут ожидания ответа, сек
+DEFAULT_MAX_RETRIES = 5  # Количество повторов после первой попытки
+DEFAULT_BACKOFF_FACTOR = 0.5  # Базовая задержка экспоненциального backoff, сек
+DEFAULT_BACKOFF_MAX = 30  # Максимальная задержка между повторами, сек
+LIST_PAGE_LIMIT = 1000  # Размер страницы при массовой загрузке списков
+MAX_PAGE_SIZE = 1000  # Наибольший limit (MAX_PAGE_SIZE Netbox по умолчанию; больший сервер все равно урежет)
+FILTER_VALUES_PER_REQUEST = 100  # Значений многозначного фильтра в одном запросе (ограничение длины URL)
+DEFAULT_PAGE_WORKERS = 4  # Страниц списка, загружаемых одновременно
+DEFAULT_ASYNC_CONCURRENCY = 64  # Запросов одновременно в полете у асинхронного клиента
+
+# Коды ответа, при которых запрос повторяется
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+# Коды ответа, при которых запрос точно не выполнен: их можно повторять для любого метода
+NOT_PROCESSED_STATUS_CODES = (429, 503)
+# Методы, которые безопасно повторять после 502/504 или обрыва соединения (сервер мог уже выполнить запрос)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+def should_retry(method, status_code):
+    """Повтор по коду ответа; POST и PATCH повторяются только при 429/503, иначе возможны дубликаты."""
+    if status_code not in RETRY_STATUS_CODES:
+        return False
+    return method.upper() in IDEMPOTENT_METHODS or status_code in NOT_PROCESSED_STATUS_CODES
+
+def request_not_sent(error):
+    """Сетевая ошибка requests до отправки запроса: соединение не установлено (таймаут или отказ).
+
+    Разрыв соединения и таймаут чтения возможны после того, как сервер уже
+    выполнил запрос.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    # Отказ соединения requests оборачивает в ConnectionError(MaxRetryError(reason=NewConnectionError))
+    reason = error.args[0] if error.args else None
+    return isinstance(getattr(reason, "reason", reason), NewConnectionError)
+
+class NetBoxClient:
+    """HTTP-клиент Netbox: пул keep-alive соединений, таймауты и повтор запросов.
+
+    С limiter (adaptive_limit.AdaptiveLimit) число запросов в полете из всех
+    потоков ограничивается адаптивным лимитом.
+    """
+
+    def __init__(self, headers, pool_size=DEFAULT_POOL_SIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR,
+                 backoff_max=DEFAULT_BACKOFF_MAX, limiter=None):
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        # Один адаптер на схему: соединения переиспользуются между запросами и потоками
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.limiter = limiter
+
+    @property
+    def concurrency(self):
+        """Запросов одновременно: с адаптивным лимитом - его максимум, иначе 1 (определяют потоки)."""
+        return self.limiter.max_limit if self.limiter else 1
+
+    def request(self, method, url, **kwargs):
+        """Выполняет запрос с повтором при 429/503 и ошибках соединения.
+
+        502/504 и остальные сетевые ошибки (обрыв соединения, таймаут чтения)
+        повторяются только для идемпотентных методов: POST и PATCH сервер мог
+        уже выполнить.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            if self.limiter:
+                self.limiter.acquire()
+            status = None
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+                status = response.status_code
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                status = type(e).__name__
+                METRICS.record_request(method, url, status, time.perf_counter() - started)
+                if attempt >= self.max_retries or not (method.upper() in IDEMPOTENT_METHODS or request_not_sent(e)):
+                    raise
+                delay = self.backoff_delay(attempt)
+                logger.warning("Сетевая ошибка при запросе %s %s: %s. Повтор через %.1f с...", method, url, e, delay)
+            else:
+                elapsed = time.perf_counter() - started
+                sent = len(response.request.body or b"")
+                METRICS.record_request(method, url, response.status_code, elapsed, sent, len(response.content))
+                logger.debug("request method=%s url=%s status=%d seconds=%.3f sent=%d received=%d",
+                             method, response.url, response.status_code, elapsed, sent, len(response.content))
+                if not should_retry(method, response.status_code) or attempt >= self.max_retries:
+                    return response
+                delay = self.retry_after(response)
+                if delay is None:
+                    delay = self.backoff_delay(attempt)
+                logger.warning("Netbox вернул %d на %s %s. Повтор через %.1f с...",
+                               response.status_code, method, url, delay)
+            finally:
+                if self.limiter:
+                    self.limiter.release(time.perf_counter() - started, status)
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self):
+        self.session.close()
+
+    def backoff_delay(self, attempt):
+        """Экспоненциальная задержка с полным jitter."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * 2 ** attempt))
+
+    def retry_after(self, response):
+        """Задержка из заголовка Retry-After (в секундах или HTTP-дата)."""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(delay, 0), self.backoff_max)
+
+# --- Общий клиент для скриптов ---
+
+_client = None
+# Размер страницы и число страниц списка, загружаемых одновременно (--page-size, --page-workers)
+_page_limit = LIST_PAGE_LIMIT
+_page_workers = DEFAULT_PAGE_WORKERS
+
+def configure(headers, **options):
+    """Создание общего клиента Netbox с заданными параметрами."""
+    return set_client(NetBoxClient(headers, **options))
+
+def set_client(client):
+    """Замена общего клиента Netbox (например, асинхронным netbox_async.AsyncBridge)."""
+    global _client
+    _client = client
+    return client
+
+def close_client():
+    """Закрытие общего клиента: соединения пула, у асинхронного клиента - также цикл событий и его поток."""
+    if _client is not None:
+        _client.close()
+
+def get_client():
+    """Получение общего клиента Netbox."""
+    if _client is None:
+        raise RuntimeError("Клиент Netbox не настроен: вызовите netbox_client.configure().")
+    return _client
+
+def configure_paging(page_limit=LIST_PAGE_LIMIT, workers=DEFAULT_PAGE_WORKERS):
+    """Размер страницы и параллельность постраничной загрузки списков по умолчанию."""
+    global _page_limit, _page_workers
+    _page_limit = page_limit
+    _page_workers = workers
+
+def page_size(page_limit=None):
+    """Размер страницы запроса: по умолчанию - настроенный, не больше MAX_PAGE_SIZE."""
+    return max(1, min(page_limit or _page_limit, MAX_PAGE_SIZE))
+
+def list_all(url, params=None, page_limit=None):
+    """Получение всех объектов списка с параллельной постраничной загрузкой; None при ошибке."""
+    client = get_client()
+    if hasattr(client, "list_all"):
+        # Асинхронный клиент (netbox_async) загружает списки сам
+        return client.list_all(url, params, page_size(page_limit))
+    try:
+        return list(iter_all(url, params, page_limit=page_limit))
+    except requests.exceptions.RequestException as e:
+        logger.error("Ошибка при загрузке списка %s: %s", url, e)
+        return None
+
+def list_all_by(url, key, values, params=None, chunk_size=FILTER_VALUES_PER_REQUEST):
+    """Получение объектов по многозначному фильтру key=v1&key=v2...; None при ошибке.
+
+    Значения отправляются группами по chunk_size, чтобы не превысить длину URL;
+    группы загружаются одновременно.
+    """
+    client = get_client()
+    if hasattr(client, "list_all_by"):
+        return client.list_all_by(url, key, values, params, chunk_size)
+    values = list(dict.fromkeys(values))
+    chunks = [{**(params or {}), key: values[i:i + chunk_size]} for i in range(0, len(values), chunk_size)]
+    if len(chunks) <= 1:
+        return list_all(url, chunks[0]) if chunks else []
+    with ThreadPoolExecutor(max_workers=min(_page_workers, len(chunks))) as executor:
+        results = list(executor.map(lambda query: list_all(url, query), chunks))
+    if any(chunk is None for chunk in results):
+        return None
+    return [obj for chunk in results for obj in chunk]
+
+def fetch_page(url, params):
+    """Одна страница списка (JSON ответа); ошибка - исключение requests."""
+    response = get_client().request("GET", url, params=params)
+    response.raise_for_status()
+    return response.json()
+
+def iter_pages(url, params=None, page_limit=None, workers=None):
+    """Постраничная загрузка списка с параллельными запросами страниц; страницы выдаются по порядку.
+
+    Первая страница дает общее количество объектов, остальные запрашиваются по
+    offset одновременно, не более workers страниц впереди потребителя, поэтому
+    в памяти находится ограниченное число страниц. Ошибка - исключение requests.
+    """
+    workers = workers or _page_workers
+    query = {**(params or {}), "limit": page_size(page_limit), "offset": 0}
+    first = fetch_page(url, query)
+    yield first.get("results", [])
+    # Сервер может урезать limit своим MAX_PAGE_SIZE: шаг - фактический размер страницы
+    step = len(first.get("results", []))
+    if not first.get("next") or not step:
+        return
+    offsets = iter(range(step, first["count"], step))
+    if workers <= 1:
+        for offset in offsets:
+            yield fetch_page(url, {**query, "offset": offset}).get("results", [])
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        window = deque()
+        for offset in offsets:
+            window.append(executor.submit(fetch_page, url, {**query, "offset": offset}))
+            if len(window) >= workers:
+                break
+        while window:
+            page = window.popleft().result()
+            offset = next(offsets, None)
+            if offset is not None:
+                window.append(executor.submit(fetch_page, url, {**query, "offset": offset}))
+            yield page.get("results", [])
+
+def iter_all(url, params=None, fields=None, page_limit=None, workers=None):
+    """Объекты списка по одному, со страницами, загружаемыми параллельно (iter_pages).
+
+    fields - поля объекта в ответе (параметр fields Netbox), чтобы не
+    передавать вложенные объекты и неиспользуемые поля.
+    Пример: for ip in iter_all(url, {"vrf_id": 5}, fields=("id", "address")): ...
+    """
+    query = dict(params or {})
+    if fields:
+        query["fields"] = ",".join(fields)
+    for page in iter_pages(url, query, page_limit, workers):
+        yield from page
+
+def add_arguments(parser):
+    """Добавление параметров HTTP-клиента в парсер командной строки."""
+    group = parser.add_argument_group("HTTP-клиент Netbox")
+    group.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE,
+                       help=f"Размер пула keep-alive соединений (по умолчанию {DEFAULT_POOL_SIZE})")
+    group.add_argument("--connect-timeout", type=float, default=DEFAULT_CONNECT_TIMEOUT,
+                       help=f"Таймаут соединения, сек (по умолчанию {DEFAULT_CONNECT_TIMEOUT})")
+    group.add_argument("--read-timeout", type=float, default=DEFAULT_READ_TIMEOUT,
+                       help=f"Таймаут чтения ответа, сек (по умолчанию {DEFAULT_READ_TIMEOUT})")
+    group.add_argument("--retries", type=int, default=DEFAULT_MAX_RETRIES,
+                       help=f"Количество повторов при 429/502/503/504 (по умолчанию {DEFAULT_MAX_RETRIES})")
+    group.add_argument("--page-size", type=int, default=LIST_PAGE_LIMIT,
+                       help=f"Объектов на странице списка, не больше {MAX_PAGE_SIZE} (по умолчанию {LIST_PAGE_LIMIT})")
+    group.add_argument("--page-workers", type=int, default=DEFAULT_PAGE_WORKERS,
+                       help=f"Страниц списка, загружаемых одновременно (по умолчанию {DEFAULT_PAGE_WORKERS})")
+    group.add_argument("--async", dest="async_client", action="store_true",
+                       help="Асинхронный клиент (httpx): много запросов одновременно для каналов с большой задержкой")
+    group.add_argument("--concurrency", type=int, default=DEFAULT_ASYNC_CONCURRENCY,
+                       help=f"Асинхронный клиент: запросов одновременно; с --adaptive - наибольший лимит "
+                            f"(по умолчанию {DEFAULT_ASYNC_CONCURRENCY})")
+    group.add_argument("--rate", type=float, default=0,
+                       help="Асинхронный клиент: не более запросов в секунду (по умолчанию без ограничения)")
+    group.add_argument("--burst", type=int,
+                       help="Асинхронный клиент: запросов подряд сверх --rate (по умолчанию равно --rate)")
+    group.add_argument("--adaptive", action="store_true",
+                       help="Подбирать число запросов одновременно по задержке и ошибкам Netbox (AIMD)")
+    group.add_argument("--target-p95", type=float, default=DEFAULT_TARGET_P95,
+                       help=f"С --adaptive: целевая p95 задержки ответа, сек (по умолчанию {DEFAULT_TARGET_P95})")
+    group.add_argument("--max-error-rate", type=float, default=DEFAULT_MAX_ERROR_RATE,
+                       help=f"С --adaptive: допустимая доля ответов 5xx (по умолчанию {DEFAULT_MAX_ERROR_RATE})")
+    group.add_argument("--min-concurrency", type=int, default=DEFAULT_MIN_LIMIT,
+                       help=f"С --adaptive: наименьший лимит запросов одновременно (по умолчанию {DEFAULT_MIN_LIMIT})")
+
+def configure_from_args(headers, args):
+    """Создание общего клиента по параметрам командной строки."""
+    configure_paging(args.page_size, args.page_workers)
+    limiter = None
+    if args.adaptive:
+        limiter = AdaptiveLimit(args.concurrency, min_limit=args.min_concurrency, target_p95=args.target_p95,
+                                max_error_rate=args.max_error_rate)
+        METRICS.register("concurrency", limiter.summary)
+    if getattr(args, "async_client", False):
+        import netbox_async
+        return netbox_async.configure(headers, concurrency=args.concurrency, rate=args.rate, burst=args.burst,
+                                      connect_timeout=args.connect_timeout, read_timeout=args.read_timeout,
+                                      max_retries=args.retries, limiter=limiter)
+    # Пул не меньше числа потоков, иначе потоки будут ждать свободного соединения
+    pool_size = max(args.pool_size, getattr(args, "workers", 1) * getattr(args, "parallel", 1), args.page_workers,
+                    args.concurrency if limiter else 1)
+    return configure(headers, pool_size=pool_size, connect_timeout=args.connect_timeout,
+                     read_timeout=args.read_timeout, max_retries=args.retries, limiter=limiter)
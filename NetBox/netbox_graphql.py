@@ -0,0 +1,110 @@
+import logging
+
+import requests
+
+import netbox_client
+from vm_sync import VMSnapshot
+
+logger = logging.getLogger(__name__)
+
+GRAPHQL_PAGE_LIMIT = 2000  # VM в одной странице запроса GraphQL
+
+# Только поля, которые сравниваются с таблицей (VM_FIELDS), и интерфейсы для назначения IP
+VM_STATE_QUERY = """
+query VMState($offset: Int!, $limit: Int!) {
+  virtual_machine_list(pagination: {offset: $offset, limit: $limit}) {
+    id name description serial vcpus memory disk
+    role { id name }
+    cluster { id name }
+    tenant { id name }
+    primary_ip4 { id address }
+    interfaces { id name }
+  }
+}
+"""
+
+def graphql_url(api_url):
+    """Адрес GraphQL Netbox по адресу REST API (.../api -> .../graphql/)."""
+    base = api_url[:-len("/api")] if api_url.rstrip("/").endswith("/api") else api_url
+    return f"{base.rstrip('/')}/graphql/"
+
+def graphql_query(api_url, query, variables=None):
+    """Выполнение запроса GraphQL; data ответа или None при ошибке."""
+    try:
+        response = netbox_client.get_client().request(
+            "POST", graphql_url(api_url), json={"query": query, "variables": variables or {}})
+        response.raise_for_status()
+        body = response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.error(f"Ошибка запроса GraphQL: {e}")
+        return None
+    if body.get("errors"):
+        logger.error(f"Ошибка запроса GraphQL: {body['errors']}")
+        return None
+    return body.get("data")
+
+def normalize_ids(value):
+    """ID в GraphQL - строки; приведение к int, как в REST API."""
+    if isinstance(value, dict):
+        return {key: int(item) if key == "id" and item is not None else normalize_ids(item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [normalize_ids(item) for item in value]
+    return value
+
+def normalize_vm(vm):
+    """VM из GraphQL в виде объекта REST API (поля VM_FIELDS)."""
+    vm = normalize_ids(vm)
+    # vcpus - Decimal, GraphQL возвращает его строкой
+    if vm.get("vcpus") is not None:
+        vm["vcpus"] = float(vm["vcpus"])
+    return vm
+
+class GraphQLVMSnapshot(VMSnapshot):
+    """Снимок VM, загружаемый постранично через GraphQL вместе с интерфейсами VM.
+
+    Запрашиваются только сравниваемые поля, а интерфейсы всех VM сразу
+    попадают в interfaces (InterfaceCache), поэтому отдельная загрузка
+    интерфейсов через REST не нужна. Снимок по кластеру/арендатору/тегу и
+    ошибка GraphQL - загрузка через REST. Запись всегда выполняется через REST.
+    """
+
+    def __init__(self, api_url, lookup=None, interfaces=None, page_limit=GRAPHQL_PAGE_LIMIT, lookup_many=None):
+        super().__init__(api_url, lookup, lookup_many)
+        self.api_url = api_url
+        self.interfaces = interfaces
+        self.page_limit = page_limit
+
+    def load(self, cluster_id=None, tenant_id=None, tag=None):
+        if cluster_id or tenant_id or tag:
+            return super().load(cluster_id, tenant_id, tag)
+        vms = []
+        offset = 0
+        while True:
+            data = graphql_query(self.api_url, VM_STATE_QUERY, {"offset": offset, "limit": self.page_limit})
+            if data is None:
+                logger.warning("Не удалось загрузить снимок VM через GraphQL, загрузка через REST API.")
+                return super().load()
+            page = data.get("virtual_machine_list") or []
+            vms.extend(normalize_vm(vm) for vm in page)
+            if len(page) < self.page_limit:
+                break
+            offset += self.page_limit
+        self.loaded_names = {vm["name"] for vm in vms}
+        for vm in vms:
+            interfaces = vm.pop("interfaces", None) or []
+            self.by_name[vm["name"]] = vm
+            if self.interfaces is not None:
+                self.interfaces.add_vm(vm["id"])
+                for interface in interfaces:
+                    self.interfaces.add({**interface, "virtual_machine": {"id": vm["id"]}})
+        self.scoped = False
+        self.loaded = True
+        logger.info(f"Загружен снимок VM через GraphQL: {len(self.by_name)}")
+        return True
+
+def make_snapshot(api_url, lookup, interfaces, read_backend="rest", lookup_many=None):
+    """Снимок VM для выбранного способа чтения: rest или graphql."""
+    if read_backend == "graphql":
+        return GraphQLVMSnapshot(api_url, lookup, interfaces, lookup_many=lookup_many)
+    return VMSnapshot(api_url, lookup, lookup_many)
@@ -0,0 +1,299 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+import requests
+
+import netbox_client
+from ip_inventory import IP_FIELDS
+from prefix_index import PREFIX_FIELDS
+from vm_interfaces import INTERFACE_FIELDS
+from vm_sync import VM_FIELDS, VMSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Объекты зеркала: вид -> (endpoint, тип объекта в журнале изменений, поля или None - все поля)
+MIRROR_KINDS = {
+    "role": ("dcim/device-roles", "dcim.devicerole", None),
+    "cluster": ("virtualization/clusters", "virtualization.cluster", None),
+    "cluster_type": ("virtualization/cluster-types", "virtualization.clustertype", None),
+    "vrf": ("ipam/vrfs", "ipam.vrf", None),
+    "tenant": ("tenancy/tenants", "tenancy.tenant", None),
+    "vm": ("virtualization/virtual-machines", "virtualization.virtualmachine", VM_FIELDS),
+    "interface": ("virtualization/interfaces", "virtualization.vminterface", INTERFACE_FIELDS),
+    "ip_address": ("ipam/ip-addresses", "ipam.ipaddress", IP_FIELDS),
+    "prefix": ("ipam/prefixes", "ipam.prefix", PREFIX_FIELDS),
+}
+
+# Справочники ReferenceCache (update_vms.REFERENCE_ENDPOINTS)
+REFERENCE_KINDS = ("role", "cluster", "cluster_type", "vrf", "tenant")
+
+# Журнал изменений: Netbox 4.x, затем 3.x
+CHANGELOG_ENDPOINTS = ("core/object-changes", "extras/object-changes")
+
+# Если изменилось больше этой доли объектов вида, вид загружается заново целиком
+FULL_RELOAD_SHARE = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    kind TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    name TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+CREATE INDEX IF NOT EXISTS objects_name ON objects (kind, name);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def default_mirror_path(api_url):
+    """Файл зеркала по адресу Netbox: отдельный для каждого сервера."""
+    host = api_url.split("://", 1)[-1].split("/", 1)[0].replace(":", "_")
+    return f"netbox_mirror_{host}.sqlite"
+
+class NetBoxMirror:
+    """Локальное зеркало объектов Netbox в SQLite, обновляемое по журналу изменений.
+
+    Первый запуск загружает все объекты MIRROR_KINDS; следующие читают только
+    записи журнала изменений после сохраненной точки синхронизации и заново
+    запрашивают измененные объекты по ID (удаленные удаляются из зеркала).
+    Если записи журнала после точки синхронизации уже удалены Netbox (истек
+    срок хранения журнала), зеркало загружается заново целиком.
+    """
+
+    def __init__(self, path, api_url):
+        self.path = path
+        self.api_url = api_url
+        self.changelog_url = None
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def url(self, kind):
+        return f"{self.api_url}/{MIRROR_KINDS[kind][0]}/"
+
+    # --- Точка синхронизации ---
+
+    def meta(self, key):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    @property
+    def last_change_id(self):
+        value = self.meta("last_change_id")
+        return int(value) if value is not None else None
+
+    def find_changelog(self):
+        """Адрес журнала изменений (зависит от версии Netbox)."""
+        if self.changelog_url:
+            return self.changelog_url
+        for endpoint in CHANGELOG_ENDPOINTS:
+            url = f"{self.api_url}/{endpoint}/"
+            response = netbox_client.get_client().request("GET", url, params={"limit": 1})
+            if response.status_code != 404:
+                response.raise_for_status()
+                self.changelog_url = url
+                return url
+        raise requests.exceptions.HTTPError("Журнал изменений Netbox не найден.")
+
+    def latest_change_id(self):
+        """ID последней записи журнала; 0, если журнал пуст."""
+        results = netbox_client.fetch_page(self.find_changelog(),
+                                           {"ordering": "-id", "limit": 1, "fields": "id"}).get("results")
+        return results[0]["id"] if results else 0
+
+    def window_expired(self, last):
+        """Записи журнала после last могли быть удалены: по журналу зеркало не восстановить.
+
+        Netbox удаляет старые записи журнала первыми, поэтому, пока запись
+        точки синхронизации на месте, все более поздние записи тоже на месте.
+        """
+        if last == 0:
+            # Журнал был пуст при загрузке зеркала: все его записи сделаны после загрузки (id__gt=0)
+            return False
+        return not netbox_client.fetch_page(self.find_changelog(), {"id": last, "fields": "id"}).get("count")
+
+    # --- Обновление ---
+
+    def refresh(self):
+        """Обновление зеркала: по журналу изменений или целиком; False при ошибке."""
+        try:
+            last = self.last_change_id
+            if last is None:
+                logger.info("Зеркало Netbox пусто, загрузка всех объектов...")
+                self.full_load()
+            elif self.window_expired(last):
+                logger.warning("Запись журнала изменений последней синхронизации зеркала не найдена "
+                               "(истек срок хранения журнала), загрузка всех объектов...")
+                self.full_load()
+            else:
+                self.apply_changes(last)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error(f"Ошибка обновления зеркала Netbox: {e}")
+            return False
+        return True
+
+    def full_load(self):
+        """Загрузка всех объектов; точка синхронизации - последняя запись журнала до загрузки."""
+        # Изменения во время загрузки повторно применятся при следующем обновлении
+        mark = self.latest_change_id()
+        for kind in MIRROR_KINDS:
+            self.reload_kind(kind)
+        self.set_meta("last_change_id", mark)
+        self.set_meta("synced", time.time())
+        logger.info("Зеркало Netbox загружено: " + ", ".join(
+            f"{kind}={count}" for kind, count in self.counts().items()))
+
+    def reload_kind(self, kind):
+        fields = MIRROR_KINDS[kind][2]
+        objects = list(netbox_client.iter_all(self.url(kind), fields=fields))
+        with self._lock:
+            self.db.execute("BEGIN")
+            self.db.execute("DELETE FROM objects WHERE kind = ?", (kind,))
+            self.store(kind, objects)
+            self.db.execute("COMMIT")
+
+    def apply_changes(self, last):
+        """Применение записей журнала изменений после last."""
+        kinds = {content_type: kind for kind, (_, content_type, _) in MIRROR_KINDS.items()}
+        # Фильтр по типу объекта в Netbox однозначный: записи других типов отбрасываются здесь
+        changes = list(netbox_client.iter_all(
+            self.find_changelog(), {"id__gt": last, "ordering": "id"},
+            fields=("id", "action", "changed_object_type", "changed_object_id")))
+        if not changes:
+            logger.info("Зеркало Netbox актуально: изменений нет.")
+            self.set_meta("synced", time.time())
+            return
+        changed = {kind: set() for kind in MIRROR_KINDS}
+        for change in changes:
+            kind = kinds.get(change["changed_object_type"])
+            if kind:
+                changed[kind].add(change["changed_object_id"])
+        # primary_ip4 VM содержит адрес IP: изменение IP-адреса меняет и VM
+        if changed["ip_address"]:
+            changed["vm"].update(self.vms_with_primary_ip(changed["ip_address"]))
+
+        counts = self.counts()
+        for kind, ids in changed.items():
+            if not ids:
+                continue
+            if len(ids) > counts.get(kind, 0) * FULL_RELOAD_SHARE:
+                self.reload_kind(kind)
+                continue
+            fields = MIRROR_KINDS[kind][2]
+            objects = netbox_client.list_all_by(self.url(kind), "id", sorted(ids),
+                                                {"fields": ",".join(fields)} if fields else None)
+            if objects is None:
+                raise requests.exceptions.RequestException(f"не удалось загрузить измененные объекты '{kind}'")
+            with self._lock:
+                self.db.execute("BEGIN")
+                # Объекты, которых больше нет в Netbox, удалены
+                self.db.executemany("DELETE FROM objects WHERE kind = ? AND id = ?", [(kind, i) for i in ids])
+                self.store(kind, objects)
+                self.db.execute("COMMIT")
+        self.set_meta("last_change_id", changes[-1]["id"])
+        self.set_meta("synced", time.time())
+        logger.info(f"Зеркало Netbox обновлено по журналу: записей {len(changes)}, объектов " + ", ".join(
+            f"{kind}={len(ids)}" for kind, ids in changed.items() if ids))
+
+    def store(self, kind, objects):
+        self.db.executemany(
+            "INSERT OR REPLACE INTO objects (kind, id, name, data) VALUES (?, ?, ?, ?)",
+            [(kind, obj["id"], obj.get("name") or obj.get("address") or obj.get("prefix"), json.dumps(obj))
+             for obj in objects])
+
+    def vms_with_primary_ip(self, ip_ids):
+        ids = list(ip_ids)
+        found = set()
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            found.update(row[0] for row in self.db.execute(
+                f"SELECT id FROM objects WHERE kind = 'vm' AND json_extract(data, '$.primary_ip4.id') "
+                f"IN ({','.join('?' * len(chunk))})", chunk))
+        return found
+
+    # --- Чтение ---
+
+    def counts(self):
+        return dict(self.db.execute("SELECT kind, COUNT(*) FROM objects GROUP BY kind").fetchall())
+
+    def objects(self, kind):
+        """Все объекты вида."""
+        return [json.loads(data) for (data,) in self.db.execute(
+            "SELECT data FROM objects WHERE kind = ? ORDER BY id", (kind,))]
+
+    def find(self, kind, name):
+        """Объект по имени (адресу для IP, префиксу для префикса) или None."""
+        row = self.db.execute("SELECT data FROM objects WHERE kind = ? AND name = ?", (kind, str(name))).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def snapshot(self):
+        """Снимок VM из зеркала."""
+        return MirrorVMSnapshot(self)
+
+    def warm(self, cache, prefixes, inventory, interfaces):
+        """Заполнение кэшей импорта из зеркала: справочники, префиксы, IP-адреса и интерфейсы всех VM."""
+        for kind in REFERENCE_KINDS:
+            for obj in self.objects(kind):
+                cache.add(kind, obj)
+            cache.loaded.add(kind)
+        for prefix in self.objects("prefix"):
+            prefixes.add(prefix)
+        prefixes.loaded = True
+        for ip in self.objects("ip_address"):
+            inventory.add(ip)
+        inventory.complete = True
+        for (vm_id,) in self.db.execute("SELECT id FROM objects WHERE kind = 'vm'"):
+            interfaces.add_vm(vm_id)
+        for interface in self.objects("interface"):
+            interfaces.add(interface)
+
+    def close(self):
+        self.db.close()
+
+def open_mirror(path, api_url):
+    """Открытие и обновление зеркала; None, если обновить его не удалось (работа напрямую с API)."""
+    mirror = NetBoxMirror(path or default_mirror_path(api_url), api_url)
+    if not mirror.refresh():
+        logger.warning("Зеркало Netbox не обновлено, данные будут загружены через API.")
+        mirror.close()
+        return None
+    return mirror
+
+class MirrorVMSnapshot(VMSnapshot):
+    """Снимок VM из локального зеркала: загрузка без запросов к Netbox.
+
+    Снимок по кластеру/арендатору отбирается в зеркале, VM вне области ищутся
+    в зеркале по имени; снимок по тегу загружается через REST (теги в зеркале
+    не хранятся).
+    """
+
+    def __init__(self, mirror):
+        super().__init__(mirror.api_url, lambda name: mirror.find("vm", name))
+        self.mirror = mirror
+
+    def load(self, cluster_id=None, tenant_id=None, tag=None):
+        if tag:
+            return super().load(cluster_id, tenant_id, tag)
+        self.loaded_names = set()
+        for vm in self.mirror.objects("vm"):
+            if cluster_id and (vm.get("cluster") or {}).get("id") != cluster_id:
+                continue
+            if tenant_id and (vm.get("tenant") or {}).get("id") != tenant_id:
+                continue
+            self.by_name[vm["name"]] = vm
+            self.loaded_names.add(vm["name"])
+        self.scoped = bool(cluster_id or tenant_id)
+        self.loaded = True
+        logger.info(f"Загружен снимок VM из зеркала: {len(self.by_name)}")
+        return True
@@ -0,0 +1,135 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+TOP_FUNCTIONS = 30  # Функций в текстовом отчете этапа
+TOP_ALLOCATIONS = 15  # Строк кода с наибольшим объемом памяти в отчете этапа
+TRACEMALLOC_FRAMES = 1  # Глубина стека выделения памяти
+
+MB = 1024 * 1024
+
+class PhaseProfiler:
+    """Профилирование этапов импорта (metrics.phase): cProfile и tracemalloc.
+
+    По каждому этапу (read - разбор таблицы, prefetch - загрузка справочников
+    и снимков, plan - сопоставление и сравнение строк, apply - запись в
+    Netbox) собираются процессорное время, время и число запросов к Netbox,
+    пик и прирост памяти Python и профиль вызовов. Вложенные этапы
+    учитываются отдельно от внешнего, как в metrics.Metrics.
+
+    cProfile видит только основной поток: с --workers больше 1 функции
+    рабочих потоков в профиль не попадают, а время запросов, процессорное
+    время и память учитываются для всех потоков.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.profiles = {}
+        self.phases = defaultdict(lambda: {"calls": 0, "cpu_seconds": 0.0, "http_seconds": 0.0, "requests": 0,
+                                           "memory_peak": 0, "memory_growth": 0})
+        self.allocations = {}
+        self.stack = []
+        self.current = None
+        self.peak = 0
+        self._lock = threading.Lock()
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    def enter(self, name):
+        if threading.current_thread() is not threading.main_thread():
+            return
+        now = time.process_time()
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        if self.stack:
+            self.pause(self.stack[-1], now, peak)
+        tracemalloc.reset_peak()
+        self.profiles.setdefault(name, cProfile.Profile()).enable()
+        # [этап, начало процессорного времени, память в начале, пик памяти над началом]
+        self.stack.append([name, now, current, 0])
+        self.current = name
+
+    def exit(self, name):
+        if threading.current_thread() is not threading.main_thread():
+            return
+        frame = self.stack.pop()
+        now = time.process_time()
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        self.pause(frame, now, peak)
+        self.current = self.stack[-1][0] if self.stack else None
+        stats = self.phases[name]
+        stats["calls"] += 1
+        stats["memory_growth"] += current - frame[2]
+        if frame[3] > stats["memory_peak"] or name not in self.allocations:
+            # Снимок при наибольшем пике этапа: что занимает память в конце этапа
+            stats["memory_peak"] = max(stats["memory_peak"], frame[3])
+            self.allocations[name] = tracemalloc.take_snapshot().statistics("lineno")[:TOP_ALLOCATIONS]
+        if self.stack:
+            outer = self.stack[-1]
+            outer[1] = now
+            outer[3] = max(outer[3], peak - outer[2])
+            tracemalloc.reset_peak()
+            self.profiles[outer[0]].enable()
+
+    def pause(self, frame, now, peak):
+        """Учет процессорного времени и пика памяти этапа frame; его профиль приостанавливается."""
+        self.profiles[frame[0]].disable()
+        with self._lock:
+            self.phases[frame[0]]["cpu_seconds"] += now - frame[1]
+        frame[1] = now
+        frame[3] = max(frame[3], peak - frame[2])
+
+    def record_request(self, seconds):
+        """Время запроса к Netbox относится к текущему этапу основного потока."""
+        name = self.current
+        if name is None:
+            return
+        with self._lock:
+            stats = self.phases[name]
+            stats["http_seconds"] += seconds
+            stats["requests"] += 1
+
+    def summary(self, wall):
+        """Этапы со временем из wall ({этап: сек}, metrics.Metrics.phases) - для JSON."""
+        with self._lock:
+            return {name: {"wall_seconds": round(wall.get(name, 0.0), 6),
+                           "cpu_seconds": round(stats["cpu_seconds"], 6),
+                           "http_seconds": round(stats["http_seconds"], 6),
+                           "requests": stats["requests"],
+                           "calls": stats["calls"],
+                           "memory_peak_mb": round(stats["memory_peak"] / MB, 3),
+                           "memory_growth_mb": round(stats["memory_growth"] / MB, 3)}
+                    for name, stats in self.phases.items()}
+
+    def write(self, wall):
+        """Запись профилей этапов в каталог: *.prof (pstats), *.txt и profile.json."""
+        os.makedirs(self.directory, exist_ok=True)
+        summary = self.summary(wall)
+        for name, profile in self.profiles.items():
+            profile.create_stats()
+            profile.dump_stats(os.path.join(self.directory, f"{name}.prof"))
+            with open(os.path.join(self.directory, f"{name}.txt"), "w", encoding="utf-8") as f:
+                stats = summary.get(name, {})
+                f.write(f"Этап {name}: " + ", ".join(f"{key}={value}" for key, value in stats.items()) + "\n\n")
+                pstats.Stats(profile, stream=f).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+                f.write("Память в конце этапа (наибольший пик), по строкам кода:\n")
+                for statistic in self.allocations.get(name, []):
+                    f.write(f"{statistic}\n")
+        with open(os.path.join(self.directory, "profile.json"), "w", encoding="utf-8") as f:
+            peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            json.dump({"phases": summary, "memory_peak_mb": round(peak / MB, 3)},
+                      f, ensure_ascii=False, indent=1)
+        for name, stats in summary.items():
+            logger.info("profile phase=%s calls=%d wall=%.2fs cpu=%.2fs http=%.2fs requests=%d "
+                        "memory_peak=%.1fMB memory_growth=%.1fMB", name, stats["calls"], stats["wall_seconds"],
+                        stats["cpu_seconds"], stats["http_seconds"], stats["requests"], stats["memory_peak_mb"],
+                        stats["memory_growth_mb"])
+        logger.info("profile written path=%s", self.directory)
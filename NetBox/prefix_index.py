@@ -0,0 +1,106 @@
+import ipaddress
+import logging
+
+import netbox_client
+
+logger = logging.getLogger(__name__)
+
+# Поля префикса, необходимые для поиска
+PREFIX_FIELDS = ("id", "prefix", "vrf")
+
+class PrefixTrie:
+    """Двоичное префиксное дерево по целочисленному адресу: поиск самого длинного префикса за O(бит адреса)."""
+
+    def __init__(self, max_bits):
+        self.max_bits = max_bits
+        # Узел: [потомок по биту 0, потомок по биту 1, значение]
+        self.root = [None, None, None]
+        self.size = 0
+
+    def insert(self, network_int, prefix_len, value):
+        node = self.root
+        for shift in range(self.max_bits - 1, self.max_bits - 1 - prefix_len, -1):
+            bit = (network_int >> shift) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        if node[2] is None:
+            self.size += 1
+        node[2] = value
+
+    def longest_match(self, address_int):
+        """Самый длинный префикс, содержащий адрес: (длина, значение) или None."""
+        node = self.root
+        best = (0, node[2]) if node[2] is not None else None
+        for depth, shift in enumerate(range(self.max_bits - 1, -1, -1), start=1):
+            node = node[(address_int >> shift) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                best = (depth, node[2])
+        return best
+
+class PrefixIndex:
+    """Локальный индекс префиксов Netbox по VRF для определения маски и VRF IP-адреса."""
+
+    def __init__(self, api_url):
+        self.url = f"{api_url}/ipam/prefixes/"
+        # (ID VRF или None для глобальной таблицы, версия IP) -> PrefixTrie
+        self.tries = {}
+        self.loaded = False
+
+    def load(self, vrf_ids=None):
+        """Загрузка всех префиксов (или префиксов указанных VRF) одним списочным запросом."""
+        params = {"fields": ",".join(PREFIX_FIELDS)}
+        if vrf_ids:
+            params["vrf_id"] = list(vrf_ids)
+        prefixes = netbox_client.list_all(self.url, params)
+        if prefixes is None:
+            return False
+        for prefix in prefixes:
+            self.add(prefix)
+        self.loaded = True
+        logger.info(f"Загружены префиксы: {sum(trie.size for trie in self.tries.values())}")
+        return True
+
+    def add(self, prefix):
+        network = ipaddress.ip_network(prefix["prefix"], strict=False)
+        vrf_id = (prefix.get("vrf") or {}).get("id")
+        key = (vrf_id, network.version)
+        if key not in self.tries:
+            self.tries[key] = PrefixTrie(network.max_prefixlen)
+        self.tries[key].insert(int(network.network_address), network.prefixlen, prefix)
+
+    def resolve(self, address, vrf_id=None, any_vrf=False):
+        """Самый специфичный префикс, содержащий адрес; None, если не найден.
+
+        Поиск ведется в таблице указанного VRF (None - глобальная таблица); с
+        any_vrf=True - во всех VRF, если адрес не найден в указанной таблице.
+        """
+        ip = ipaddress.ip_interface(address).ip
+        match = self._match((vrf_id, ip.version), ip)
+        if match is None and any_vrf:
+            matches = [self._match(key, ip) for key in self.tries if key[1] == ip.version]
+            matches = [found for found in matches if found is not None]
+            match = max(matches, key=lambda found: found[0]) if matches else None
+        return match[1] if match else None
+
+    def _match(self, key, ip):
+        trie = self.tries.get(key)
+        return trie.longest_match(int(ip)) if trie else None
+
+    def interface_address(self, address, vrf_id=None):
+        """Адрес с маской содержащего префикса и ID VRF: ("10.0.0.5/25", vrf_id).
+
+        Маска, явно указанная в таблице, сохраняется. Если префикс не найден и
+        маска не указана - (None, vrf_id).
+        """
+        prefix = self.resolve(address, vrf_id, any_vrf=vrf_id is None)
+        if prefix and vrf_id is None:
+            vrf_id = (prefix.get("vrf") or {}).get("id")
+        if "/" in address:
+            return address, vrf_id
+        if not prefix:
+            return None, vrf_id
+        prefix_len = ipaddress.ip_network(prefix["prefix"], strict=False).prefixlen
+        return f"{address}/{prefix_len}", vrf_id
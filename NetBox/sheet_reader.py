@@ -0,0 +1,198 @@
+import importlib.util
+import ipaddress
+import os
+from typing import NamedTuple
+
+import openpyxl
+import pandas as pd
+
+# Столбцы таблицы VM и их типы; остальные столбцы не читаются
+TEXT_COLUMNS = ("name", "role", "description", "serial", "status", "cluster",
+                "ip_primary_description", "tenant_name", "vrf_name")
+INT_COLUMNS = ("vcpus", "memory", "disk", "site_id", "platform_id")
+IP_COLUMNS = ("ip_primary",)
+ALL_COLUMNS = TEXT_COLUMNS + INT_COLUMNS + IP_COLUMNS
+
+# Обязательные поля строки по умолчанию
+REQUIRED_FIELDS = ("name", "role")
+
+# IPv4-адрес с необязательной маской; окончательная проверка через ipaddress
+IPV4_PATTERN = r"\d{1,3}(?:\.\d{1,3}){3}(?:/\d{1,2})?"
+
+# Количество строк в одном блоке при потоковом чтении
+STREAM_CHUNK_ROWS = 2000
+
+# calamine читает xlsx в разы быстрее openpyxl, если установлен python-calamine
+EXCEL_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else "openpyxl"
+
+class VMRecord(NamedTuple):
+    """Нормализованная строка таблицы VM (пустые значения - None)."""
+    row: int
+    name: str
+    role: str
+    description: str
+    serial: str
+    status: str
+    cluster: str
+    ip_primary_description: str
+    tenant_name: str
+    vrf_name: str
+    vcpus: int
+    memory: int
+    disk: int
+    site_id: int
+    platform_id: int
+    ip_primary: str
+
+    def values(self):
+        """Значения полей без номера строки (для хеширования)."""
+        values = self._asdict()
+        del values["row"]
+        return values
+
+class SheetData(NamedTuple):
+    """Результат чтения таблицы: корректные строки и отчет об отклоненных."""
+    records: list
+    rejects: pd.DataFrame
+    total: int
+
+def load_frame(path, sheet_name=None, columns=ALL_COLUMNS):
+    """Чтение только нужных столбцов из xlsx, CSV или Parquet."""
+    text_dtypes = {column: "string" for column in TEXT_COLUMNS + IP_COLUMNS}
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return pd.read_csv(path, usecols=lambda column: column in columns, dtype=text_dtypes)
+    if extension in (".parquet", ".pq"):
+        if not importlib.util.find_spec("pyarrow"):
+            raise ValueError("Для чтения Parquet необходим пакет pyarrow (pip install pyarrow).")
+        import pyarrow.parquet as pq
+        available = pq.ParquetFile(path).schema.names
+        return pd.read_parquet(path, columns=[column for column in available if column in columns])
+    return pd.read_excel(path, sheet_name=sheet_name, engine=EXCEL_ENGINE,
+                         usecols=lambda column: column in columns, dtype=text_dtypes)
+
+def normalize_frame(df, required=REQUIRED_FIELDS, first_row=2):
+    """Постолбцовая нормализация и проверка; возвращает SheetData."""
+    total = len(df)
+    df = df.reset_index(drop=True)
+    for column in ALL_COLUMNS:
+        if column not in df.columns:
+            df[column] = pd.NA
+    reasons = pd.Series(pd.NA, index=df.index, dtype="string")
+
+    def reject(mask, reason):
+        # Для строки сохраняется первая найденная причина
+        reasons[mask & reasons.isna()] = reason
+
+    for column in TEXT_COLUMNS + IP_COLUMNS:
+        values = df[column].astype("string").str.strip()
+        df[column] = values.mask(values == "")
+
+    missing = pd.Series(False, index=df.index)
+    for column in required:
+        missing |= df[column].isna()
+    reject(missing, f"Отсутствуют обязательные поля {' или '.join(required)}")
+
+    for column in INT_COLUMNS:
+        raw = df[column]
+        numbers = pd.to_numeric(raw, errors="coerce")
+        bad = (raw.notna() & numbers.isna()) | (numbers.notna() & (numbers % 1 != 0))
+        reject(bad, f"Некорректное целое значение в столбце {column}")
+        df[column] = numbers.where(~bad).astype("Int64")
+
+    for column in IP_COLUMNS:
+        values = df[column]
+        matched = values.str.fullmatch(IPV4_PATTERN).fillna(False).astype(bool)
+        # Формат проверен регулярным выражением, диапазоны октетов и маски - ipaddress по уникальным значениям
+        valid = {value: is_valid_interface(value) for value in values[matched].unique()}
+        valid_mask = matched & values.map(valid).fillna(False).astype(bool)
+        reject(values.notna() & ~valid_mask, f"Некорректный IP-адрес в столбце {column}")
+
+    rejected = reasons.notna()
+    rejects = pd.DataFrame({
+        "row": df.index[rejected] + first_row,
+        "name": df.loc[rejected, "name"],
+        "role": df.loc[rejected, "role"],
+        "reason": reasons[rejected],
+    }).reset_index(drop=True)
+
+    good = df.loc[~rejected, list(VMRecord._fields[1:])].astype(object)
+    good = good.where(good.notna(), None)
+    rows = (good.index + first_row).tolist()
+    records = [VMRecord(row, *values) for row, values in zip(rows, good.itertuples(index=False, name=None))]
+    return SheetData(records, rejects, total)
+
+def is_valid_interface(value):
+    try:
+        ipaddress.IPv4Interface(value)
+        return True
+    except ValueError:
+        return False
+
+def read_vm_records(path, sheet_name=None, required=REQUIRED_FIELDS, required_columns=()):
+    """Чтение и проверка таблицы VM.
+
+    Отсутствие обязательных столбцов или неподдерживаемый формат - ValueError.
+    """
+    df = load_frame(path, sheet_name)
+    missing_columns = [column for column in required_columns if column not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Отсутствуют обязательные столбцы: {', '.join(missing_columns)}. "
+                         f"Найденные столбцы: {df.columns.tolist()}")
+    return normalize_frame(df, required)
+
+def iter_vm_records(path, sheet_name=None, chunk_size=STREAM_CHUNK_ROWS, required=REQUIRED_FIELDS):
+    """Потоковое чтение таблицы VM блоками по chunk_size строк.
+
+    Каждый блок проверяется так же, как в read_vm_records, и возвращается как
+    SheetData; в памяти одновременно находится только один блок.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        text_dtypes = {column: "string" for column in TEXT_COLUMNS + IP_COLUMNS}
+        first_row = 2
+        for df in pd.read_csv(path, usecols=lambda column: column in ALL_COLUMNS,
+                              dtype=text_dtypes, chunksize=chunk_size):
+            yield normalize_frame(df, required, first_row)
+            first_row += len(df)
+        return
+    if extension in (".parquet", ".pq"):
+        if not importlib.util.find_spec("pyarrow"):
+            raise ValueError("Для чтения Parquet необходим пакет pyarrow (pip install pyarrow).")
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+        columns = [column for column in parquet_file.schema.names if column in ALL_COLUMNS]
+        first_row = 2
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            df = batch.to_pandas()
+            yield normalize_frame(df, required, first_row)
+            first_row += len(df)
+        return
+    yield from iter_excel_records(path, sheet_name, chunk_size, required)
+
+def iter_excel_records(path, sheet_name, chunk_size, required):
+    """Потоковое чтение листа xlsx через openpyxl в режиме read_only."""
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        if sheet_name and sheet_name not in workbook.sheetnames:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        worksheet = workbook[sheet_name] if sheet_name else workbook.active
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        # Позиции нужных столбцов в строке листа
+        positions = [(position, column) for position, column in enumerate(header) if column in ALL_COLUMNS]
+        columns = [column for _, column in positions]
+        first_row = 2
+        chunk = []
+        for values in rows:
+            chunk.append([values[position] if position < len(values) else None for position, _ in positions])
+            if len(chunk) >= chunk_size:
+                yield normalize_frame(pd.DataFrame(chunk, columns=columns, dtype=object), required, first_row)
+                first_row += len(chunk)
+                chunk = []
+        if chunk:
+            yield normalize_frame(pd.DataFrame(chunk, columns=columns, dtype=object), required, first_row)
+    finally:
+        workbook.close()
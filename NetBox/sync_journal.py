@@ -0,0 +1,169 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Статусы операций и запусков
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+RUNNING = "running"
+COMPLETED = "completed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started REAL NOT NULL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS operations (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    endpoint TEXT NOT NULL,
+    method TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    payload TEXT,
+    status TEXT NOT NULL,
+    netbox_id INTEGER,
+    error TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (run_id, endpoint, method, ref)
+);
+CREATE TABLE IF NOT EXISTS rows (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    name TEXT NOT NULL,
+    row INTEGER,
+    hash TEXT,
+    vm_id INTEGER,
+    ip_id INTEGER,
+    PRIMARY KEY (run_id, name)
+);
+"""
+
+def default_journal_path(excel_path, sheet_name=None):
+    """Файл журнала листа рядом с таблицей: листы, синхронизируемые параллельно, не делят один файл."""
+    if sheet_name:
+        return f"{excel_path}.{sheet_name}.journal.sqlite"
+    return f"{excel_path}.journal.sqlite"
+
+class SyncJournal:
+    """Журнал операций синхронизации (SQLite, write-ahead).
+
+    Каждый пакет записей фиксируется в журнале как pending до отправки в
+    Netbox и отмечается done (с ID объекта) или failed после ответа. Строки
+    таблицы, все операции которых выполнены, записываются в rows. При
+    возобновлении прерванного запуска (--resume) эти строки пропускаются, а
+    операции pending и failed повторяются (unfinished_operations).
+
+    Журнал хранит только незавершенные запуски: успешно завершенный запуск
+    удаляется из него, новый запуск заменяет прежние запуски того же листа.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.run_id = None
+
+    def start(self, source, sheet, resume=False):
+        """Начало запуска или возобновление последнего незавершенного; возвращает True при возобновлении."""
+        with self._lock:
+            if resume:
+                found = self.db.execute(
+                    "SELECT id FROM runs WHERE source = ? AND sheet = ? AND status = ? ORDER BY id DESC LIMIT 1",
+                    (source, sheet, RUNNING)).fetchone()
+                if found:
+                    self.run_id = found[0]
+                    return True
+            # Прежние незавершенные запуски листа больше не возобновить
+            self.delete_runs("SELECT id FROM runs WHERE source = ? AND sheet = ?", (source, sheet))
+            self.run_id = self.db.execute(
+                "INSERT INTO runs (source, sheet, status, started) VALUES (?, ?, ?, ?)",
+                (source, sheet, RUNNING, time.time())).lastrowid
+            return False
+
+    def finish(self, status=COMPLETED):
+        """Завершение запуска; успешно завершенный запуск удаляется из журнала."""
+        with self._lock:
+            if status == COMPLETED:
+                self.delete_runs("SELECT ?", (self.run_id,))
+                return
+            self.db.execute("UPDATE runs SET status = ?, finished = ? WHERE id = ?",
+                            (status, time.time(), self.run_id))
+
+    def delete_runs(self, query, params):
+        """Удаление запусков (ID - результат query) вместе с их операциями и строками."""
+        with self.db:
+            self.db.execute("BEGIN")
+            for table, column in (("operations", "run_id"), ("rows", "run_id"), ("runs", "id")):
+                self.db.execute(f"DELETE FROM {table} WHERE {column} IN ({query})", params)
+
+    def completed_rows(self):
+        """Строки, завершенные в текущем запуске: {имя VM: (хеш строки, ID VM, ID IP)}."""
+        with self._lock:
+            return {name: (digest, vm_id, ip_id) for name, digest, vm_id, ip_id in self.db.execute(
+                "SELECT name, hash, vm_id, ip_id FROM rows WHERE run_id = ?", (self.run_id,))}
+
+    def unfinished_operations(self):
+        """Операции pending и failed текущего запуска в порядке выполнения: [(эндпоинт, метод, ref, payload)]."""
+        with self._lock:
+            return [(endpoint, method, ref, json.loads(payload)) for endpoint, method, ref, payload in self.db.execute(
+                "SELECT endpoint, method, ref, payload FROM operations WHERE run_id = ? AND status IN (?, ?) "
+                "ORDER BY updated, rowid", (self.run_id, PENDING, FAILED))]
+
+    def operation_counts(self):
+        """Количество операций текущего запуска по статусу."""
+        with self._lock:
+            return dict(self.db.execute(
+                "SELECT status, COUNT(*) FROM operations WHERE run_id = ? GROUP BY status", (self.run_id,)))
+
+    def begin(self, endpoint, method, batch):
+        """Фиксация пакета [(ref, payload)] как pending до отправки запроса."""
+        now = time.time()
+        with self._lock, self.db:
+            self.db.execute("BEGIN")
+            self.db.executemany(
+                "INSERT OR REPLACE INTO operations (run_id, endpoint, method, ref, payload, status, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(self.run_id, endpoint, method, str(ref), json.dumps(payload, ensure_ascii=False, default=str),
+                  PENDING, now) for ref, payload in batch])
+
+    def done(self, endpoint, method, results):
+        """Отметка успешно выполненных операций: [(ref, ID объекта)]."""
+        now = time.time()
+        with self._lock, self.db:
+            self.db.execute("BEGIN")
+            self.db.executemany(
+                "UPDATE operations SET status = ?, netbox_id = ?, error = NULL, updated = ? "
+                "WHERE run_id = ? AND endpoint = ? AND method = ? AND ref = ?",
+                [(DONE, netbox_id, now, self.run_id, endpoint, method, str(ref)) for ref, netbox_id in results])
+
+    def failed(self, endpoint, method, refs, error):
+        now = time.time()
+        with self._lock, self.db:
+            self.db.execute("BEGIN")
+            self.db.executemany(
+                "UPDATE operations SET status = ?, error = ?, updated = ? "
+                "WHERE run_id = ? AND endpoint = ? AND method = ? AND ref = ?",
+                [(FAILED, json.dumps(error, ensure_ascii=False, default=str), now, self.run_id, endpoint, method,
+                  str(ref)) for ref in refs])
+
+    def complete_rows(self, rows):
+        """Запись завершенных строк: [(имя VM, номер строки, хеш, ID VM, ID IP)]."""
+        with self._lock, self.db:
+            self.db.execute("BEGIN")
+            self.db.executemany(
+                "INSERT OR REPLACE INTO rows (run_id, name, row, hash, vm_id, ip_id) VALUES (?, ?, ?, ?, ?, ?)",
+                [(self.run_id, *row) for row in rows])
+
+    def close(self):
+        with self._lock:
+            self.db.close()
@@ -0,0 +1,265 @@
+import argparse
+import fnmatch
+import glob
+import json
+import logging
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import openpyxl
+
+import metrics
+import netbox_client
+import update_vms
+from netbox_mirror import open_mirror
+from ip_inventory import IPInventory
+from netbox_bulk import DEFAULT_BATCH_SIZE
+from sheet_reader import STREAM_CHUNK_ROWS, iter_vm_records, read_vm_records
+
+logger = logging.getLogger(__name__)
+
+# Количество листов, синхронизируемых одновременно
+DEFAULT_PARALLEL_SHEETS = 4
+
+# Расширения таблиц с одним набором строк (без листов)
+FLAT_EXTENSIONS = (".csv", ".parquet", ".pq")
+
+class SheetJob(NamedTuple):
+    """Лист таблицы для синхронизации; sheet - None для CSV и Parquet."""
+    path: str
+    sheet: str
+
+    @property
+    def label(self):
+        return f"{self.path}:{self.sheet}" if self.sheet else self.path
+
+def workbook_sheets(path, patterns):
+    """Листы файла, имена которых подходят под шаблоны (порядок листов в файле)."""
+    if os.path.splitext(path)[1].lower() in FLAT_EXTENSIONS:
+        return [None]
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        names = workbook.sheetnames
+    finally:
+        workbook.close()
+    return [name for name in names if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)]
+
+def expand_sources(sources):
+    """Список листов по источникам [(шаблон пути, шаблоны листов)]; повторы отбрасываются."""
+    jobs = []
+    for path_pattern, sheet_patterns in sources:
+        paths = sorted(glob.glob(path_pattern)) if glob.has_magic(path_pattern) else [path_pattern]
+        if not paths:
+            logger.warning(f"Нет файлов, подходящих под шаблон '{path_pattern}'.")
+        for path in paths:
+            if not os.path.exists(path):
+                logger.error(f"Файл '{path}' не найден.")
+                continue
+            sheets = workbook_sheets(path, sheet_patterns)
+            if not sheets:
+                logger.warning(f"В файле '{path}' нет листов, подходящих под {', '.join(sheet_patterns)}.")
+            for sheet in sheets:
+                job = SheetJob(path, sheet)
+                if job not in jobs:
+                    jobs.append(job)
+    return jobs
+
+def read_manifest(path):
+    """Источники из JSON-манифеста: [{"path": "dc/*.xlsx", "sheets": ["Prod", "Tech*"]}, ...].
+
+    Без "sheets" берутся все листы файла.
+    """
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    return [(entry["path"], entry.get("sheets") or ["*"]) for entry in entries]
+
+def ip_key(address, vrf_name, shared):
+    """Ключ IP-адреса (ID VRF, адрес), как при сверке листа: VRF по имени, иначе по содержащему префиксу."""
+    vrf = shared.cache.get("vrf", vrf_name) if vrf_name else None
+    try:
+        _, vrf_id = shared.prefixes.interface_address(address, vrf["id"] if vrf else None)
+        return IPInventory.key(address, vrf_id)
+    except ValueError:
+        # Адрес вне известных префиксов: строка будет пропущена при сверке IP-адресов листа
+        return None
+
+def scan_records(records, shared):
+    """Имена VM и основные IP-адреса строк: [(имя VM, (ID VRF, адрес) или None)]."""
+    return [(record.name, ip_key(record.ip_primary, record.vrf_name, shared) if record.ip_primary else None)
+            for record in records]
+
+def read_sheet(job, shared, stream=False, chunk_size=STREAM_CHUNK_ROWS):
+    """Чтение листа для поиска повторов; возвращает (SheetData или None, [(имя VM, ключ IP)]).
+
+    Прочитанный лист передается импорту, и повторно он не читается. В
+    потоковом режиме лист целиком в памяти не хранится: для поиска повторов
+    он читается блоками (SheetData не возвращается), импорт читает его заново.
+    При ошибке чтения возвращается (None, []): ошибку сообщит импорт листа.
+    """
+    try:
+        if stream:
+            entries = []
+            for chunk in iter_vm_records(job.path, job.sheet, chunk_size):
+                entries += scan_records(chunk.records, shared)
+            return None, entries
+        sheet = read_vm_records(job.path, job.sheet)
+    except Exception as e:
+        logger.debug(f"Лист {job.label}: ошибка чтения при поиске повторов: {e}")
+        return None, []
+    return sheet, scan_records(sheet.records, shared)
+
+def find_duplicates(scanned):
+    """Поиск VM, указанных на нескольких листах, и IP-адресов, указанных для разных VM на разных листах.
+
+    scanned - {SheetJob: [(имя VM, ключ IP)]} (read_sheet). Возвращает
+    {SheetJob: {имя VM: причина}}: такие строки пропускаются на всех листах,
+    чтобы листы не перезаписывали одну VM разными значениями.
+    """
+    name_sheets = defaultdict(list)
+    ip_owners = defaultdict(set)
+    for job, entries in scanned.items():
+        for name, key in entries:
+            if job not in name_sheets[name]:
+                name_sheets[name].append(job)
+            if key:
+                ip_owners[key].add((name, job))
+
+    exclude = {job: {} for job in scanned}
+    for name, sheets in name_sheets.items():
+        if len(sheets) > 1:
+            labels = ", ".join(sheet.label for sheet in sheets)
+            for job in sheets:
+                exclude[job][name] = f"VM указана на нескольких листах: {labels}"
+    for (_, address), owners in ip_owners.items():
+        if len({name for name, _ in owners}) > 1 and len({job for _, job in owners}) > 1:
+            names = ", ".join(sorted({name for name, _ in owners}))
+            for name, job in owners:
+                exclude[job].setdefault(name, f"Конфликт IP: '{address}' указан на разных листах для VM {names}")
+    return exclude
+
+def sync_sheets(jobs, options=None, parallel=DEFAULT_PARALLEL_SHEETS, mirror=None):
+    """Синхронизация нескольких листов параллельно с общими кэшами; возвращает {SheetJob: ImportStats}.
+
+    options (update_vms.ImportOptions) - параметры импорта каждого листа; журнал
+    операций у каждого листа свой. С mirror (netbox_mirror.NetBoxMirror) общие
+    кэши заполняются из локального зеркала.
+    """
+    options = options or update_vms.ImportOptions()
+    shared = update_vms.SharedCaches(options.read_backend, mirror)
+    shared.load()
+
+    # Каждый лист читается один раз: прочитанные строки используются и для поиска повторов, и для импорта
+    with metrics.phase("read"):
+        sheets, scanned = {}, {}
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            for job, (sheet, entries) in zip(jobs, executor.map(
+                    lambda job: read_sheet(job, shared, options.stream, options.chunk_size), jobs)):
+                sheets[job], scanned[job] = sheet, entries
+        exclude = find_duplicates(scanned)
+    duplicates = sum(len(names) for names in exclude.values())
+    if duplicates:
+        logger.warning(f"Строк с VM или IP-адресами, повторяющимися на разных листах: {duplicates}; "
+                       f"они будут пропущены.")
+
+    def run(job):
+        logger.info(f"Синхронизация листа {job.label}...")
+        return update_vms.import_vms_from_excel(job.path, job.sheet, options, shared=shared, exclude=exclude[job],
+                                                sheet_data=sheets.pop(job))
+
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        futures = {job: executor.submit(run, job) for job in jobs}
+    results = {}
+    for job, future in futures.items():
+        try:
+            results[job] = future.result()
+        except Exception as e:
+            logger.error(f"Лист {job.label}: ошибка синхронизации: {e}")
+            results[job] = None
+    return results
+
+def print_total(results):
+    """Итог по всем листам."""
+    print(f"\n{'='*60}")
+    print("ИТОГ ПО ЛИСТАМ:")
+    print(f"{'='*60}")
+    print(f"{'Лист':<40} {'Всего':>7} {'Успешно':>8} {'Пропущено':>10}")
+    totals = [0, 0, 0]
+    for job, stats in results.items():
+        if stats is None:
+            print(f"{job.label[:39]:<40} {'ошибка чтения или синхронизации':>27}")
+            continue
+        values = (stats.total_records, stats.processed_count, stats.skipped_count)
+        totals = [total + value for total, value in zip(totals, values)]
+        print(f"{job.label[:39]:<40} {values[0]:>7} {values[1]:>8} {values[2]:>10}")
+    print("-" * 68)
+    print(f"{'Всего':<40} {totals[0]:>7} {totals[1]:>8} {totals[2]:>10}")
+    print(f"{'='*60}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Синхронизация VM в Netbox из нескольких файлов и листов за один запуск.")
+    parser.add_argument("sources", nargs="*",
+                        help="Файлы таблиц (xlsx, CSV, Parquet); допускаются шаблоны, например 'dc/*.xlsx'")
+    parser.add_argument("--sheets", nargs="+", default=["*"],
+                        help="Шаблоны имен листов для файлов из командной строки (по умолчанию все листы)")
+    parser.add_argument("--manifest",
+                        help='JSON-манифест: [{"path": "dc/*.xlsx", "sheets": ["Prod", "Tech*"]}, ...]')
+    parser.add_argument("--parallel", type=int, default=DEFAULT_PARALLEL_SHEETS,
+                        help=f"Количество листов, обрабатываемых одновременно (по умолчанию {DEFAULT_PARALLEL_SHEETS})")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Количество строк листа, обрабатываемых параллельно (по умолчанию 1)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Количество объектов в одном пакетном запросе (по умолчанию {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Обрабатывать только строки, изменившиеся с прошлой успешной синхронизации")
+    parser.add_argument("--full", action="store_true",
+                        help="В инкрементальном режиме обработать все строки и перезаписать состояние")
+    parser.add_argument("--stream", action="store_true",
+                        help="Читать таблицы потоково блоками строк")
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_ROWS,
+                        help=f"Количество строк в блоке потокового чтения (по умолчанию {STREAM_CHUNK_ROWS})")
+    parser.add_argument("--resume", action="store_true",
+                        help="Продолжить прерванные запуски листов по журналам операций")
+    parser.add_argument("--no-journal", action="store_true", help="Не вести журнал операций")
+    parser.add_argument("--read-backend", choices=("rest", "graphql"), default="rest",
+                        help="Чтение снимка VM и интерфейсов: REST API или один постраничный запрос GraphQL")
+    parser.add_argument("--mirror", nargs="?", const="", metavar="SQLITE_FILE",
+                        help="Читать объекты Netbox из локального зеркала, обновляемого по журналу изменений "
+                             "(по умолчанию файл netbox_mirror_<сервер>.sqlite)")
+    netbox_client.add_arguments(parser)
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure_logging(args)
+    netbox_client.configure_from_args(update_vms.HEADERS, args)
+
+    try:
+        sources = [(source, args.sheets) for source in args.sources]
+        if args.manifest:
+            sources += read_manifest(args.manifest)
+        if update_vms.NETBOX_TOKEN == "api_token":
+            print("Ошибка: Пожалуйста, задайте NETBOX_TOKEN.")
+        elif not sources:
+            parser.error("укажите файлы таблиц или --manifest")
+        else:
+            jobs = expand_sources(sources)
+            if not jobs:
+                print("Ошибка: не найдено ни одного листа для синхронизации.")
+            else:
+                mirror = None
+                if args.mirror is not None:
+                    with metrics.phase("prefetch"):
+                        mirror = open_mirror(args.mirror, update_vms.NETBOX_API_URL)
+                results = sync_sheets(jobs, update_vms.ImportOptions.from_args(args), parallel=args.parallel,
+                                      mirror=mirror)
+                if mirror:
+                    mirror.close()
+                for job, stats in results.items():
+                    if stats:
+                        update_vms.print_import_summary(job.label, stats)
+                print_total(results)
+                metrics.finish(args)
+                print("\nСинхронизация завершена.")
+    finally:
+        netbox_client.close_client()
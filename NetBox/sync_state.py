@@ -0,0 +1,86 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 2
+
+def normalize_value(value):
+    """Приведение значения ячейки к стабильному виду для хеширования."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    if isinstance(value, float) and value.is_integer():
+        # 6 и 6.0 из разных версий таблицы считаются одним значением
+        return int(value)
+    if hasattr(value, "item"):
+        # Скаляры numpy/pandas
+        return normalize_value(value.item())
+    return value
+
+def row_hash(values):
+    """Стабильный хеш нормализованного содержимого строки."""
+    normalized = {str(key): normalize_value(value) for key, value in values.items()}
+    data = json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+def default_state_path(excel_path):
+    """Файл состояния рядом с таблицей."""
+    return f"{excel_path}.sync_state.json"
+
+class SyncState:
+    """Локальное состояние инкрементального импорта: хеши строк и ID объектов Netbox.
+
+    Строки индексируются по имени VM, поэтому перестановка строк в таблице не
+    считается изменением.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {"version": STATE_VERSION, "sheets": {}}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == STATE_VERSION:
+                    self.data = data
+                else:
+                    logger.warning(f"Файл состояния '{path}' другой версии, будет выполнена полная синхронизация.")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Не удалось прочитать файл состояния '{path}': {e}. Будет выполнена полная синхронизация.")
+
+    def rows(self, sheet_name):
+        """Сохраненные строки листа: {имя VM: {"hash": ..., "vm_id": ..., "ip_id": ...}}."""
+        return self.data["sheets"].setdefault(sheet_name, {})
+
+    def diff(self, sheet_name, hashes):
+        """Сравнение текущих хешей строк с сохраненными: (новые/изменённые, удалённые)."""
+        saved = self.rows(sheet_name)
+        changed = {name for name, digest in hashes.items()
+                   if saved.get(name, {}).get("hash") != digest}
+        deleted = set(saved) - set(hashes)
+        return changed, deleted
+
+    def record(self, sheet_name, name, digest, **ids):
+        """Запоминание успешно синхронизированной строки."""
+        with self._lock:
+            self.rows(sheet_name)[name] = {"hash": digest, **ids}
+
+    def forget(self, sheet_name, name):
+        with self._lock:
+            self.rows(sheet_name).pop(name, None)
+
+    def save(self):
+        """Атомарная запись файла состояния."""
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
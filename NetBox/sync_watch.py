@@ -0,0 +1,109 @@
+import importlib.util
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEBOUNCE = 2.0  # Сек без изменений файла, после которых сохранение считается законченным
+DEFAULT_POLL_INTERVAL = 1.0  # Период проверки времени изменения файлов, сек
+DEFAULT_CACHE_TTL = 900  # Срок жизни кэшей Netbox в режиме наблюдения, сек
+
+def signature(path):
+    """Время изменения и размер файла; None, если файла нет (например, во время сохранения)."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class FileWatcher:
+    """Наблюдение за изменением файлов таблиц.
+
+    События файловой системы берутся из inotify (пакет inotify_simple, Linux),
+    без него - периодическая проверка времени изменения и размера файлов.
+    Наблюдаются каталоги файлов: Excel и LibreOffice сохраняют таблицу через
+    временный файл и переименование. Серия быстрых сохранений объединяется:
+    изменение выдается, когда файл не менялся debounce секунд.
+    """
+
+    def __init__(self, paths, debounce=DEFAULT_DEBOUNCE, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.signatures = {path: signature(path) for path in self.paths}
+        self.inotify = None
+        if importlib.util.find_spec("inotify_simple"):
+            from inotify_simple import INotify, flags
+            self.inotify = INotify()
+            mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE
+            for directory in {os.path.dirname(path) for path in self.paths}:
+                self.inotify.add_watch(directory, mask)
+            self.names = {os.path.basename(path) for path in self.paths}
+        logger.info(f"Наблюдение за файлами ({'inotify' if self.inotify else 'проверка времени изменения'}): "
+                    + ", ".join(self.paths))
+
+    def wait_event(self, timeout):
+        """Ожидание события файловой системы не дольше timeout; True, если файл мог измениться."""
+        if self.inotify:
+            events = self.inotify.read(timeout=int(timeout * 1000))
+            return any(event.name in self.names for event in events)
+        time.sleep(timeout)
+        return True
+
+    def changed(self):
+        """Файлы, изменившиеся с последней выдачи (удаленные файлы не считаются)."""
+        current = {path: signature(path) for path in self.paths}
+        return [path for path, value in current.items() if value is not None and value != self.signatures[path]]
+
+    def wait(self):
+        """Ожидание изменения файлов и окончания серии сохранений; возвращает измененные файлы."""
+        while True:
+            # Время изменения проверяется и с inotify: событие могло быть пропущено
+            self.wait_event(self.poll_interval)
+            changed = self.changed()
+            if not changed:
+                continue
+            logger.debug(f"Изменены файлы: {', '.join(changed)}; ожидание окончания сохранения...")
+            current = {path: signature(path) for path in self.paths}
+            while True:
+                if self.inotify:
+                    event = self.wait_event(self.debounce)
+                else:
+                    # Без inotify решает только сравнение времени изменения и размера
+                    time.sleep(self.debounce)
+                    event = False
+                latest = {path: signature(path) for path in self.paths}
+                if not event and latest == current:
+                    break
+                current = latest
+            self.signatures.update(current)
+            return [path for path in changed if current[path] is not None]
+
+    def close(self):
+        if self.inotify:
+            self.inotify.close()
+
+def watch(paths, sync, debounce=DEFAULT_DEBOUNCE, poll_interval=DEFAULT_POLL_INTERVAL, initial=True):
+    """Вызов sync(измененные файлы) после каждого сохранения файлов paths до Ctrl+C.
+
+    С initial сначала выполняется синхронизация всех файлов; наблюдение
+    начинается до нее, чтобы не пропустить сохранения во время синхронизации.
+    """
+    watcher = FileWatcher(paths, debounce, poll_interval)
+    changed = list(watcher.paths) if initial else []
+    try:
+        while True:
+            if changed:
+                try:
+                    sync(changed)
+                except Exception as e:
+                    # Ошибка одной синхронизации не останавливает наблюдение
+                    logger.error(f"Ошибка синхронизации: {e}")
+            changed = watcher.wait()
+            if changed:
+                logger.info(f"Файлы изменены: {', '.join(changed)}")
+    except KeyboardInterrupt:
+        logger.info("Наблюдение остановлено.")
+    finally:
+        watcher.close()
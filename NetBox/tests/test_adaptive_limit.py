@@ -0,0 +1,54 @@
+from adaptive_limit import AdaptiveLimit
+
+def feed(limit, count, seconds=0.01, status=200, in_flight=None):
+    for _ in range(count):
+        limit.record(seconds, status, limit.limit if in_flight is None else in_flight)
+
+def test_saturated_fast_window_increases_limit():
+    limit = AdaptiveLimit(max_limit=10, initial=4, window=5)
+    feed(limit, 5)
+    assert limit.limit == 5
+    assert limit.summary()["increases"] == 1
+
+def test_unsaturated_window_keeps_limit():
+    limit = AdaptiveLimit(max_limit=10, initial=4, window=5)
+    feed(limit, 5, in_flight=1)
+    assert limit.limit == 4
+
+def test_increase_stops_at_max_limit():
+    limit = AdaptiveLimit(max_limit=5, initial=4, window=5)
+    feed(limit, 20)
+    assert limit.limit == 5
+    assert limit.peak == 5
+
+def test_overload_status_halves_limit_and_ignores_next_window():
+    limit = AdaptiveLimit(max_limit=16, initial=8, window=5)
+    feed(limit, 1, status=503)
+    assert limit.limit == 4
+    # Ответы на запросы, отправленные при старом лимите, не учитываются
+    feed(limit, 5, status=503)
+    assert limit.limit == 4
+    assert limit.summary()["decreases"] == 1
+
+def test_network_error_counts_as_overload():
+    limit = AdaptiveLimit(max_limit=16, initial=8, window=5)
+    feed(limit, 1, status="ConnectTimeout")
+    assert limit.limit == 4
+
+def test_slow_window_decreases_limit():
+    limit = AdaptiveLimit(max_limit=16, initial=8, window=5, target_p95=0.5)
+    feed(limit, 5, seconds=2.0)
+    assert limit.limit == 6
+
+def test_error_rate_decreases_limit_but_not_below_min():
+    limit = AdaptiveLimit(max_limit=16, initial=2, min_limit=2, window=4, max_error_rate=0.1)
+    feed(limit, 2)
+    feed(limit, 2, status=500)
+    assert limit.limit == 2
+    assert limit.summary()["decreases"] == 0
+
+def test_ignored_status_is_not_recorded():
+    limit = AdaptiveLimit(max_limit=10, initial=4, window=1)
+    feed(limit, 3, status=None)
+    assert limit.limit == 4
+    assert limit.window == []
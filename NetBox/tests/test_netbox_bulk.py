@@ -0,0 +1,87 @@
+import json
+
+import pytest
+import requests
+
+import netbox_client
+from netbox_bulk import BulkWriter
+
+URL = "http://netbox.test/api/ipam/ip-addresses/"
+
+def response(status_code, body):
+    result = requests.Response()
+    result.status_code = status_code
+    result._content = json.dumps(body).encode("utf-8")
+    return result
+
+class FakeClient:
+    """Клиент Netbox в памяти: объекты с "bad" отклоняются, как ошибка валидации Netbox.
+
+    per_object=True - ответ 400 содержит список ошибок по объектам в порядке
+    отправки, иначе - одну общую ошибку.
+    """
+
+    def __init__(self, per_object=True):
+        self.per_object = per_object
+        self.batches = []
+
+    def request(self, method, url, json=None, **kwargs):
+        self.batches.append([payload["address"] for payload in json])
+        errors = [{"address": ["rejected"]} if payload.get("bad") else {} for payload in json]
+        if any(errors):
+            return response(400, errors if self.per_object else {"detail": "validation error"})
+        return response(201, [{"id": number, **payload} for number, payload in enumerate(json, start=1)])
+
+@pytest.fixture
+def client(monkeypatch):
+    def install(per_object=True):
+        fake = FakeClient(per_object)
+        monkeypatch.setattr(netbox_client, "get_client", lambda: fake)
+        return fake
+    return install
+
+def add_all(writer, bad=()):
+    for number in range(1, 9):
+        writer.add(number, {"address": f"10.0.0.{number}/24", "bad": number in bad})
+
+def test_error_list_drops_rejected_objects_and_resends_the_rest(client):
+    fake = client(per_object=True)
+    writer = BulkWriter(URL, batch_size=8)
+    add_all(writer, bad={2, 7})
+    results = writer.flush()
+    assert sorted(writer.errors) == [2, 7]
+    assert writer.errors[2] == {"address": ["rejected"]}
+    assert sorted(results) == [1, 3, 4, 5, 6, 8]
+    # Один повтор пакета без отклоненных объектов, без деления пополам
+    assert len(fake.batches) == 2
+    assert len(fake.batches[1]) == 6
+
+def test_opaque_error_bisects_down_to_rejected_object(client):
+    fake = client(per_object=False)
+    writer = BulkWriter(URL, batch_size=8)
+    add_all(writer, bad={3})
+    results = writer.flush()
+    assert list(writer.errors) == [3]
+    assert sorted(results) == [1, 2, 4, 5, 6, 7, 8]
+    assert ["10.0.0.3/24"] in fake.batches
+    assert len(fake.batches) < 8
+
+def test_results_follow_refs_across_batches(client):
+    fake = client()
+    writer = BulkWriter(URL, batch_size=3)
+    add_all(writer)
+    results = writer.flush()
+    assert [len(batch) for batch in fake.batches] == [3, 3, 2]
+    assert results[5]["address"] == "10.0.0.5/24"
+    assert not writer.errors
+
+def test_request_error_fails_whole_batch(monkeypatch):
+    class BrokenClient:
+        def request(self, method, url, **kwargs):
+            raise requests.exceptions.ConnectionError("refused")
+
+    monkeypatch.setattr(netbox_client, "get_client", lambda: BrokenClient())
+    writer = BulkWriter(URL, batch_size=8)
+    add_all(writer)
+    assert writer.flush() == {}
+    assert sorted(writer.errors) == list(range(1, 9))
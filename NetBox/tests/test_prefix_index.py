@@ -0,0 +1,34 @@
+import ipaddress
+
+from prefix_index import PrefixTrie
+
+def ip_int(address):
+    return int(ipaddress.ip_address(address))
+
+def make_trie(*prefixes):
+    trie = PrefixTrie(32)
+    for prefix in prefixes:
+        network = ipaddress.ip_network(prefix)
+        trie.insert(int(network.network_address), network.prefixlen, prefix)
+    return trie
+
+def test_longest_match_prefers_most_specific_prefix():
+    trie = make_trie("10.0.0.0/8", "10.128.0.0/12", "10.128.5.0/24")
+    assert trie.longest_match(ip_int("10.128.5.7")) == (24, "10.128.5.0/24")
+    assert trie.longest_match(ip_int("10.129.0.1")) == (12, "10.128.0.0/12")
+    assert trie.longest_match(ip_int("10.1.2.3")) == (8, "10.0.0.0/8")
+
+def test_longest_match_without_containing_prefix():
+    trie = make_trie("10.0.0.0/8")
+    assert trie.longest_match(ip_int("192.168.1.1")) is None
+
+def test_default_route_and_host_prefix():
+    trie = make_trie("0.0.0.0/0", "10.1.1.1/32")
+    assert trie.longest_match(ip_int("10.1.1.1")) == (32, "10.1.1.1/32")
+    assert trie.longest_match(ip_int("10.1.1.2")) == (0, "0.0.0.0/0")
+
+def test_reinsert_replaces_value_without_growing():
+    trie = make_trie("10.0.0.0/8")
+    trie.insert(ip_int("10.0.0.0"), 8, "replaced")
+    assert trie.size == 1
+    assert trie.longest_match(ip_int("10.2.3.4")) == (8, "replaced")
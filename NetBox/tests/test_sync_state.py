@@ -0,0 +1,61 @@
+import update_vms
+from sheet_reader import VMRecord
+from sync_state import SyncState, row_hash
+
+def record(row, name, **values):
+    fields = dict.fromkeys(VMRecord._fields[2:])
+    fields.update(values)
+    return VMRecord(row, name, **fields)
+
+def test_row_hash_ignores_formatting_noise():
+    assert row_hash({"name": "vm1", "vcpus": 6}) == row_hash({"name": " vm1 ", "vcpus": 6.0})
+    assert row_hash({"name": "vm1", "description": ""}) == row_hash({"name": "vm1", "description": None})
+    assert row_hash({"name": "vm1", "vcpus": 6}) != row_hash({"name": "vm1", "vcpus": 8})
+
+def test_diff_reports_changed_and_deleted_rows(tmp_path):
+    state = SyncState(str(tmp_path / "state.json"))
+    state.record("Prod", "vm1", row_hash({"name": "vm1", "memory": 4096}))
+    state.record("Prod", "vm2", row_hash({"name": "vm2"}))
+    changed, deleted = state.diff("Prod", {
+        "vm1": row_hash({"name": "vm1", "memory": 8192}),
+        "vm3": row_hash({"name": "vm3"}),
+    })
+    assert changed == {"vm1", "vm3"}
+    assert deleted == {"vm2"}
+
+def test_state_survives_save_and_reload(tmp_path):
+    path = str(tmp_path / "state.json")
+    state = SyncState(path)
+    digest = row_hash({"name": "vm1"})
+    state.record("Prod", "vm1", digest, vm_id=7, ip_id=None)
+    state.save()
+    assert SyncState(path).diff("Prod", {"vm1": digest}) == (set(), set())
+
+def test_incremental_import_skips_unchanged_rows(tmp_path):
+    state = SyncState(str(tmp_path / "state.json"))
+    records = [record(2, "vm1", role="APP", memory=4096), record(3, "vm2", role="DB"), record(4, "vm3", role="WEB")]
+    hashes = {item.row: row_hash(item.values()) for item in records}
+    for item in records:
+        state.record("Prod", item.name, hashes[item.row])
+
+    # В таблице изменилась одна строка и добавилась новая
+    edited = [records[0]._replace(memory=8192), records[1], records[2], record(5, "vm4", role="APP")]
+    hashes = {item.row: row_hash(item.values()) for item in edited}
+    stats = update_vms.ImportStats(len(edited))
+    selected = update_vms.select_records(edited, "Prod", stats, state, {}, False, hashes)
+    assert [item.name for item in selected] == ["vm1", "vm4"]
+    assert stats.unchanged_count == 2
+
+    stats = update_vms.ImportStats(len(edited))
+    selected = update_vms.select_records(edited, "Prod", stats, state, {}, True, hashes)
+    assert len(selected) == 4
+    assert stats.unchanged_count == 0
+
+def test_resume_skips_rows_completed_in_interrupted_run():
+    records = [record(2, "vm1", role="APP"), record(3, "vm2", role="DB")]
+    hashes = {item.row: row_hash(item.values()) for item in records}
+    completed = {"vm1": (hashes[2], 11, None), "vm2": ("stale", 12, None)}
+    stats = update_vms.ImportStats(len(records))
+    selected = update_vms.select_records(records, "Prod", stats, None, completed, False, hashes)
+    assert [item.name for item in selected] == ["vm2"]
+    assert stats.resumed_count == 1
@@ -0,0 +1,67 @@
+import pytest
+
+import netbox_client
+import vm_prune
+from change_set import ChangeSet
+from vm_sync import VMSnapshot
+
+API_URL = "http://netbox.test/api"
+
+def scoped_snapshot(count):
+    snapshot = VMSnapshot(API_URL)
+    vms = [{"id": number, "name": f"vm{number}"} for number in range(1, count + 1)]
+    snapshot.by_name = {vm["name"]: vm for vm in vms}
+    snapshot.loaded_names = set(snapshot.by_name)
+    snapshot.loaded = snapshot.scoped = True
+    return snapshot
+
+@pytest.fixture
+def ips(monkeypatch):
+    """IP-адреса VM-сирот без запросов к Netbox: по одному адресу на VM."""
+    requested = []
+
+    def list_all_by(url, key, values, params=None):
+        requested.append(list(values))
+        return [{"id": 100 + vm_id, "address": f"10.0.0.{vm_id}/24",
+                 "assigned_object": {"virtual_machine": {"id": vm_id}}} for vm_id in values]
+
+    monkeypatch.setattr(netbox_client, "list_all_by", list_all_by)
+    return requested
+
+def test_find_orphans_uses_only_vms_loaded_by_scope():
+    snapshot = scoped_snapshot(4)
+    # VM, найденная по имени вне области, и VM, которой нет в Netbox
+    snapshot.by_name["outside"] = {"id": 99, "name": "outside"}
+    snapshot.by_name["missing"] = None
+    orphans = vm_prune.find_orphans(snapshot, {"vm1", "vm3"})
+    assert [vm["name"] for vm in orphans] == ["vm2", "vm4"]
+
+def test_find_orphans_none_when_table_covers_scope():
+    snapshot = scoped_snapshot(3)
+    assert vm_prune.find_orphans(snapshot, {"vm1", "vm2", "vm3", "new"}) == []
+
+def test_prune_refused_above_max_percent(ips):
+    snapshot = scoped_snapshot(10)
+    names = {f"vm{number}" for number in range(1, 9)}
+    changes = ChangeSet()
+    assert vm_prune.prune_orphans(API_URL, snapshot, names, max_percent=10.0, changes=changes) is None
+    assert ips == []
+    assert changes.changes == []
+
+def test_prune_planned_at_max_percent(ips):
+    snapshot = scoped_snapshot(10)
+    names = {f"vm{number}" for number in range(2, 11)}
+    changes = ChangeSet()
+    assert vm_prune.prune_orphans(API_URL, snapshot, names, max_percent=10.0, changes=changes) == 1
+    assert ips == [[1]]
+    assert [(change["object"], change["action"], change["name"]) for change in changes.changes] == [
+        ("ip_address", "delete", "10.0.0.1/24"),
+        ("vm", "delete", "vm1"),
+    ]
+    # В режиме плана снимок не меняется
+    assert "vm1" in snapshot.loaded_names
+
+def test_prune_nothing_to_delete(ips):
+    snapshot = scoped_snapshot(3)
+    assert vm_prune.prune_orphans(API_URL, snapshot, {"vm1", "vm2", "vm3"}) == 0
+    assert ips == []
@@ -0,0 +1,42 @@
+import math
+
+from vm_sync import diff_vm, values_equal
+
+def test_reference_compared_by_id():
+    assert values_equal({"id": 3}, {"id": 3, "name": "APP"})
+    assert not values_equal({"id": 3}, {"id": 4, "name": "APP"})
+    assert not values_equal({"id": 3}, None)
+
+def test_reference_without_id_compared_by_name():
+    assert values_equal({"name": "KLN-PROD"}, {"id": 1, "name": "KLN-PROD"})
+    assert not values_equal({"name": "KLN-PROD"}, {"id": 1, "name": "KLN-TEST"})
+
+def test_empty_values_are_equal():
+    for new in (None, "", math.nan):
+        for old in (None, ""):
+            assert values_equal(new, old)
+    assert not values_equal("", "description")
+    assert not values_equal(4, None)
+
+def test_numbers_compared_as_float():
+    # vcpus в Netbox дробное
+    assert values_equal(6, 6.0)
+    assert not values_equal(6, 6.5)
+
+def test_strings_compared_exactly():
+    assert values_equal("web", "web")
+    assert not values_equal("web", "Web")
+
+def test_diff_vm_reports_only_changed_vm_fields():
+    existing = {"id": 10, "name": "vm1", "role": {"id": 1, "name": "APP"}, "vcpus": 4.0, "memory": 4096,
+                "description": "", "primary_ip4": {"id": 5}}
+    payload = {"name": "vm1", "role": {"id": 2}, "vcpus": 4, "memory": 8192, "description": None,
+               "site": 2, "status": "active"}
+    assert diff_vm(payload, existing) == {
+        "role": ({"id": 1, "name": "APP"}, {"id": 2}),
+        "memory": (4096, 8192),
+    }
+
+def test_diff_vm_without_changes():
+    existing = {"name": "vm1", "vcpus": 2.0, "serial": "SN1"}
+    assert diff_vm({"name": "vm1", "vcpus": 2, "serial": "SN1"}, existing) == {}
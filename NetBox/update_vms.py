@@ -1,12 +1,38 @@
 import pandas as pd
 import requests
 import os
+import argparse
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+
+import metrics
+import netbox_client
+from netbox_bulk import BulkWriter, DEFAULT_BATCH_SIZE
+from vm_sync import NOOP, UPDATE, SyncPlan
+from sync_state import SyncState, default_state_path, row_hash
+from sheet_reader import STREAM_CHUNK_ROWS, iter_vm_records, read_vm_records
+from prefix_index import PrefixIndex
+from ip_inventory import IPInventory, assigned_vm, host
+from vm_interfaces import DEFAULT_INTERFACE_NAME, InterfaceCache
+from change_set import ChangeSet
+from netbox_graphql import make_snapshot
+from netbox_mirror import open_mirror
+from vm_prune import DEFAULT_PRUNE_MAX_PERCENT, prune_orphans
+from sync_journal import COMPLETED, SyncJournal, default_journal_path
+from sync_watch import DEFAULT_CACHE_TTL, DEFAULT_DEBOUNCE, DEFAULT_POLL_INTERVAL, watch
+
+logger = logging.getLogger(__name__)
 
 # --- Конфигурация. Config ---
-NETBOX_URL = "https://netbox.axioma-ipc.ru"
-NETBOX_TOKEN = f"{token}"  # API токен Netbox (admin - API Token and create Permission)
+NETBOX_URL = os.environ.get("NETBOX_URL", "https://netbox.axioma-ipc.ru")
+NETBOX_TOKEN = os.environ.get("NETBOX_TOKEN", "api_token")  # API токен Netbox (admin - API Token and create Permission)
 EXCEL_FILE_PATH = "kln_address.xlsx"  # Excel with VM attributes
 SHEET_NAME = "Prod"  # Название листа в Excel файле
+LAZY_SNAPSHOT_ROWS = 50  # До стольких изменённых строк VM ищутся по имени без загрузки полного снимка
 
 # --- Настройки API Netbox ---
 NETBOX_API_URL = f"{NETBOX_URL}/api"
@@ -15,23 +41,24 @@ HEADERS = {
     "Content-Type": "application/json",
     "Accept": "application/json",
 }
+netbox_client.configure(HEADERS)
 
 # --- Функции для работы с Netbox API ---
 
 def netbox_api_request(method, url, **kwargs):
     """Выполняет запрос к API Netbox."""
     try:
-        response = requests.request(method, url, headers=HEADERS, **kwargs)
+        response = netbox_client.get_client().request(method, url, **kwargs)
         response.raise_for_status()  # Вызов исключения для кодов ошибок (4xx или 5xx)
         return response.json()
     except requests.exceptions.RequestException as e:
-        print(f"Ошибка при запросе к Netbox API: {e}")
+        logger.error(f"Ошибка при запросе к Netbox API: {e}")
         if hasattr(e, 'response') and e.response is not None:
             try:
                 error_details = e.response.json()
-                print(f"Детали ошибки: {error_details}")
+                logger.error(f"Детали ошибки: {error_details}")
             except:
-                print(f"Тело ответа: {e.response.text}")
+                logger.error(f"Тело ответа: {e.response.text}")
         return None
 
 def get_virtual_machine_by_name(name):
@@ -44,59 +71,22 @@ def get_virtual_machine_by_name(name):
             return response["results"][0]
         return None
     except Exception as e:
-        print(f"Ошибка при получении VM '{name}': {e}")
-        return None
-
-def update_virtual_machine(vm_id, payload):
-    """Обновление существующей VM."""
-    url = f"{NETBOX_API_URL}/virtualization/virtual-machines/{vm_id}/"
-    print(f"Обновление VM (ID: {vm_id})...")
-    return netbox_api_request("PATCH", url, json=payload)
-
-def create_virtual_machine(payload):
-    """Создание новой VM."""
-    url = f"{NETBOX_API_URL}/virtualization/virtual-machines/"
-    print(f"Создание VM '{payload.get('name')}'...")
-    return netbox_api_request("POST", url, json=payload)
-
-def get_ip_by_address(address):
-    """Получение IP-адреса по его значению."""
-    url = f"{NETBOX_API_URL}/ipam/ip-addresses/"
-    params = {"address": address}
-    try:
-        response = netbox_api_request("GET", url, params=params)
-        if response and response.get("count", 0) > 0:
-            return response["results"][0]
-        return None
-    except Exception as e:
-        print(f"Ошибка при получении IP-адреса '{address}': {e}")
+        logger.error(f"Ошибка при получении VM '{name}': {e}")
         return None
 
-def create_ip_address(payload):
-    """Создание нового IP-адреса."""
+def get_ip_by_address(address, vrf_id=None):
+    """Получение IP-адреса по его значению в VRF (None - глобальная таблица)."""
     url = f"{NETBOX_API_URL}/ipam/ip-addresses/"
-    print(f"Создание IP-адреса '{payload.get('address')}'...")
-    return netbox_api_request("POST", url, json=payload)
-
-def get_subnet_by_network_and_prefix(network, prefix_length):
-    """Получает подсеть по сети и длине префикса."""
-    url = f"{NETBOX_API_URL}/ipam/subnets/"
-    params = {"contains": network, "prefix_length": prefix_length}
+    params = {"address": address, "vrf_id": vrf_id or "null"}
     try:
         response = netbox_api_request("GET", url, params=params)
         if response and response.get("count", 0) > 0:
             return response["results"][0]
         return None
     except Exception as e:
-        print(f"Ошибка при получении подсети '{network}/{prefix_length}': {e}")
+        logger.error(f"Ошибка при получении IP-адреса '{address}': {e}")
         return None
 
-def create_subnet(payload):
-    """Создание новой подсети."""
-    url = f"{NETBOX_API_URL}/ipam/subnets/"
-    print(f"Создание подсети '{payload.get('prefix')}'...")
-    return netbox_api_request("POST", url, json=payload)
-
 def get_vrf_by_name(name):
     """Получает VRF по имени."""
     url = f"{NETBOX_API_URL}/ipam/vrfs/"
@@ -107,41 +97,9 @@ def get_vrf_by_name(name):
             return response["results"][0]
         return None
     except Exception as e:
-        print(f"Ошибка при получении VRF '{name}': {e}")
+        logger.error(f"Ошибка при получении VRF '{name}': {e}")
         return None
 
-def get_vm_interfaces(vm_id):
-    """Получение интерфейсов VM."""
-    url = f"{NETBOX_API_URL}/virtualization/interfaces/"
-    params = {"virtual_machine_id": vm_id}
-    try:
-        response = netbox_api_request("GET", url, params=params)
-        if response:
-            return response["results"]
-        return []
-    except Exception as e:
-        print(f"Ошибка при получении интерфейсов VM ID {vm_id}: {e}")
-        return []
-
-def create_vm_interface(vm_id, interface_name="eth0"):
-    """Создание интерфейса для VM."""
-    url = f"{NETBOX_API_URL}/virtualization/interfaces/"
-    payload = {
-        "virtual_machine": {"id": vm_id},
-        "name": interface_name,
-        "type": {"value": "virtual"},
-    }
-    return netbox_api_request("POST", url, json=payload)
-
-def assign_ip_to_interface(interface_id, ip_address_id):
-    """Назначение IP адреса интерфейсу."""
-    url = f"{NETBOX_API_URL}/ipam/ip-addresses/{ip_address_id}/"
-    payload = {
-        "assigned_object_type": "virtualization.vminterface",
-        "assigned_object_id": interface_id,
-    }
-    return netbox_api_request("PATCH", url, json=payload)
-
 def get_device_role_by_name(name):
     """Получение роли устройства по имени."""
     url = f"{NETBOX_API_URL}/dcim/device-roles/"
@@ -152,23 +110,25 @@ def get_device_role_by_name(name):
             return response["results"][0]
         return None
     except Exception as e:
-        print(f"Ошибка при получении роли '{name}': {e}")
+        logger.error(f"Ошибка при получении роли '{name}': {e}")
         return None
 
-def create_device_role(name, slug=None, color="9e9e9e"):
-    """Создание роли устройства."""
+def device_role_payload(name, slug=None, color="9e9e9e"):
+    """Данные новой роли устройства."""
     if not slug:
         slug = name.lower().replace(" ", "-")
-    
-    url = f"{NETBOX_API_URL}/dcim/device-roles/"
-    payload = {
+    return {
         "name": name,
         "slug": slug,
         "color": color,
         "description": f"Автоматически созданная роль {name}",
     }
-    print(f"Создание роли устройства '{name}'...")
-    return netbox_api_request("POST", url, json=payload)
+
+def create_device_role(name, slug=None, color="9e9e9e"):
+    """Создание роли устройства."""
+    url = f"{NETBOX_API_URL}/dcim/device-roles/"
+    logger.debug(f"Создание роли устройства '{name}'...")
+    return netbox_api_request("POST", url, json=device_role_payload(name, slug, color))
 
 def get_cluster_by_name(name):
     """Получение кластера по имени."""
@@ -180,7 +140,7 @@ def get_cluster_by_name(name):
             return response["results"][0]
         return None
     except Exception as e:
-        print(f"Ошибка при получении кластера '{name}': {e}")
+        logger.error(f"Ошибка при получении кластера '{name}': {e}")
         return None
 
 def get_cluster_type_by_name(name="VMware"):
@@ -193,282 +153,1147 @@ def get_cluster_type_by_name(name="VMware"):
             return response["results"][0]
         return None
     except Exception as e:
-        print(f"Ошибка при получении типа кластера '{name}': {e}")
+        logger.error(f"Ошибка при получении типа кластера '{name}': {e}")
         return None
 
-def create_cluster(name, site_id=2):
-    """Создание кластера."""
+def cluster_payload(name, site_id=2, cluster_type=None):
+    """Данные нового кластера."""
     # Сначала получаем или создаем тип кластера
-    cluster_type = get_cluster_type_by_name("VMware")
+    if not cluster_type:
+        cluster_type = get_cluster_type_by_name("VMware")
     if not cluster_type:
         # Если нет типа кластера, используем ID = 1 (обычно VMware)
         cluster_type = {"id": 1}
-    
-    url = f"{NETBOX_API_URL}/virtualization/clusters/"
-    payload = {
+    return {
         "name": name,
         "type": {"id": cluster_type["id"]},
         "site": {"id": site_id},
         "description": f"Автоматически созданный кластер {name}",
     }
-    print(f"Создание кластера '{name}'...")
-    return netbox_api_request("POST", url, json=payload)
-
-def create_ip_address(address, description=""):
-    """Создание IP адреса."""
-    # Определяем подсеть для IP адреса
-    if '/' in address:
-        ip_with_mask = address
-    else:
-        # Если маска не указана, добавляем /24 по умолчанию
-        ip_with_mask = f"{address}/24"
-    
-    url = f"{NETBOX_API_URL}/ipam/ip-addresses/"
+
+def create_cluster(name, site_id=2, cluster_type=None):
+    """Создание кластера."""
+    url = f"{NETBOX_API_URL}/virtualization/clusters/"
+    logger.debug(f"Создание кластера '{name}'...")
+    return netbox_api_request("POST", url, json=cluster_payload(name, site_id, cluster_type))
+
+# --- Одновременные запросы асинхронного клиента ---
+
+def run_concurrently(calls):
+    """Одновременное выполнение операций AsyncNetBoxAPI [(операция, аргументы)] асинхронным клиентом (--async).
+
+    Возвращает результаты в порядке calls; None, если клиент синхронный.
+    """
+    client = netbox_client.get_client()
+    if not hasattr(client, "run_all"):
+        return None
+    api = client.api(NETBOX_API_URL)
+    return client.run_all([getattr(api, operation)(*arguments) for operation, arguments in calls])
+
+def get_virtual_machines_by_name(names):
+    """Одновременный поиск VM по именам асинхронным клиентом; VM (или None) в порядке names."""
+    return run_concurrently([("get_virtual_machine_by_name", (name,)) for name in names])
+
+# --- Кэш справочников Netbox ---
+
+# Справочники, загружаемые целиком перед обработкой строк: вид -> (endpoint, функция поиска по имени)
+REFERENCE_ENDPOINTS = {
+    "role": ("dcim/device-roles", get_device_role_by_name),
+    "cluster": ("virtualization/clusters", get_cluster_by_name),
+    "cluster_type": ("virtualization/cluster-types", get_cluster_type_by_name),
+    "vrf": ("ipam/vrfs", get_vrf_by_name),
+    "tenant": ("tenancy/tenants", None),
+}
+
+class ReferenceCache:
+    """Кэш справочников Netbox с индексами по имени и slug."""
+
+    def __init__(self):
+        self.by_name = {kind: {} for kind in REFERENCE_ENDPOINTS}
+        self.by_slug = {kind: {} for kind in REFERENCE_ENDPOINTS}
+        self.loaded = set()
+        self._create_lock = threading.Lock()
+
+    def load(self):
+        """Загрузка всех справочников за один проход."""
+        for kind, (endpoint, _) in REFERENCE_ENDPOINTS.items():
+            objects = netbox_client.list_all(f"{NETBOX_API_URL}/{endpoint}/")
+            if objects is None:
+                logger.warning(f"Не удалось загрузить справочник '{endpoint}', поиск будет выполняться через API.")
+                continue
+            for obj in objects:
+                self.add(kind, obj)
+            self.loaded.add(kind)
+        logger.info("Справочники загружены: " + ", ".join(
+            f"{kind}={len(self.by_name[kind])}" for kind in REFERENCE_ENDPOINTS))
+
+    def add(self, kind, obj):
+        """Добавление объекта в кэш (в том числе только что созданного)."""
+        if not obj:
+            return obj
+        if obj.get("name") is not None:
+            self.by_name[kind][obj["name"]] = obj
+        if obj.get("slug"):
+            self.by_slug[kind][obj["slug"]] = obj
+        return obj
+
+    def get(self, kind, name):
+        """Поиск объекта по имени или slug."""
+        if name is None or pd.isna(name):
+            return None
+        name = str(name)
+        obj = self.by_name[kind].get(name) or self.by_slug[kind].get(name)
+        if obj or kind in self.loaded:
+            return obj
+        # Справочник не удалось загрузить целиком - ищем через API и запоминаем результат
+        lookup = REFERENCE_ENDPOINTS[kind][1]
+        return self.add(kind, lookup(name)) if lookup else None
+
+    def get_or_create(self, kind, name, create):
+        """Поиск объекта с созданием при отсутствии; создание сериализовано между потоками."""
+        obj = self.get(kind, name)
+        if obj:
+            return obj
+        with self._create_lock:
+            # Повторная проверка: объект мог создать другой поток, пока мы ждали блокировку
+            obj = self.get(kind, name)
+            if not obj:
+                obj = self.add(kind, create())
+        return obj
+
+class ImportStats:
+    """Потокобезопасная статистика обработки листа."""
+
+    def __init__(self, total_records):
+        self.total_records = total_records
+        self.processed_count = 0
+        self.skipped_count = 0
+        self.skipped_records = []
+        self.unchanged_count = 0
+        self.resumed_count = 0
+        self.deleted_count = None
+        self._lock = threading.Lock()
+
+    def processed(self):
+        with self._lock:
+            self.processed_count += 1
+
+    def skip(self, row, name, role, reason):
+        with self._lock:
+            self.skipped_count += 1
+            self.skipped_records.append({
+                'row': row,
+                'name': name,
+                'role': role,
+                'reason': reason
+            })
+
+@dataclass
+class ImportOptions:
+    """Параметры импорта листа (import_vms_from_excel).
+
+    scope_cluster, scope_tenant, scope_tag - область снимка VM и удаления
+    отсутствующих в таблице VM (prune). journal_file=None - журнал операций
+    рядом с таблицей, False - журнал не ведется. read_backend="graphql" -
+    снимок VM и их интерфейсы читаются через GraphQL.
+    """
+    workers: int = 1
+    batch_size: int = DEFAULT_BATCH_SIZE
+    scope_cluster: str = None
+    scope_tenant: str = None
+    scope_tag: str = None
+    incremental: bool = False
+    full: bool = False
+    state_file: str = None
+    stream: bool = False
+    chunk_size: int = STREAM_CHUNK_ROWS
+    journal_file: str = None
+    resume: bool = False
+    read_backend: str = "rest"
+    prune: bool = False
+    prune_max_percent: float = DEFAULT_PRUNE_MAX_PERCENT
+
+    @classmethod
+    def from_args(cls, args):
+        """Параметры из аргументов командной строки; аргументы, которых нет у скрипта, - по умолчанию."""
+        return cls(workers=args.workers, batch_size=args.batch_size,
+                   scope_cluster=getattr(args, "cluster", None), scope_tenant=getattr(args, "tenant", None),
+                   scope_tag=getattr(args, "tag", None), incremental=args.incremental or args.full,
+                   full=args.full, state_file=getattr(args, "state_file", None), stream=args.stream,
+                   chunk_size=args.chunk_size,
+                   journal_file=False if args.no_journal else getattr(args, "journal_file", None),
+                   resume=args.resume, read_backend=args.read_backend, prune=getattr(args, "prune", False),
+                   prune_max_percent=getattr(args, "prune_max_percent", DEFAULT_PRUNE_MAX_PERCENT))
+
+class SharedCaches:
+    """Справочники, снимок VM, префиксы, IP-адреса и интерфейсы, общие для нескольких листов.
+
+    Загружаются один раз на запуск (sync_sheets) и используются всеми листами
+    параллельно; состояние инкрементального режима - одно на файл. С mirror
+    (netbox_mirror) все загружается из локального зеркала.
+    """
+
+    def __init__(self, read_backend="rest", mirror=None):
+        self.cache = ReferenceCache()
+        self.prefixes = PrefixIndex(NETBOX_API_URL)
+        self.inventory = IPInventory(NETBOX_API_URL, self.prefixes, get_ip_by_address)
+        self.interfaces = InterfaceCache(NETBOX_API_URL)
+        self.mirror = mirror
+        self.snapshot = open_vm_snapshot(self.interfaces, read_backend, mirror)
+        self.states = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Загрузка справочников, снимка всех VM и префиксов."""
+        with metrics.phase("prefetch"):
+            if self.mirror:
+                self.mirror.warm(self.cache, self.prefixes, self.inventory, self.interfaces)
+                self.snapshot.load()
+                return
+            self.cache.load()
+            if not self.snapshot.load():
+                logger.warning("Не удалось загрузить снимок VM, поиск VM будет выполняться через API.")
+            if not self.prefixes.load():
+                logger.warning("Не удалось загрузить префиксы, будут созданы только IP-адреса с маской в таблице.")
+
+    def state(self, path):
+        """Состояние инкрементального режима для файла (одно на все листы файла)."""
+        with self._lock:
+            if path not in self.states:
+                self.states[path] = SyncState(path)
+            return self.states[path]
+
+# --- Обработка строк ---
+
+def prepare_vm_row(record, cache, snapshot):
+    """Подготовка строки таблицы: роль, кластер, поиск VM и IP-адреса, payload VM.
+
+    Строка уже проверена и нормализована при чтении таблицы (sheet_reader).
+    Недостающие роли и кластеры только отмечаются в work["missing"], их
+    создает create_missing_references.
+    """
+    vm_name = record.name
+    vm_role_name = record.role
+    vm_site_id = record.site_id or 2        # По умолчанию site_id = 2
+    vm_cluster_name = record.cluster        # Получаем имя кластера из файла
+    vm_primary_ip4 = record.ip_primary
+    vm_tenant_name = record.tenant_name
+    vm_vrf_name = record.vrf_name # Новое поле для VRF
+
+    existing_vm = snapshot.get(vm_name)
+
+    # Недостающие роли и кластеры создаются после сверки IP, только для строк без конфликтов
+    role_obj = cache.get("role", vm_role_name)
+    cluster_obj = cache.get("cluster", vm_cluster_name) if vm_cluster_name else None
+    missing = []
+    if not role_obj:
+        missing.append(("role", vm_role_name))
+    if vm_cluster_name and not cluster_obj:
+        missing.append(("cluster", vm_cluster_name))
+
+    # Формирование базового payload
     payload = {
-        "address": ip_with_mask,
-        "description": description,
+        "name": vm_name,
+        # Используем ID роли для избежания дублирования (у роли, которая только планируется, ID нет)
+        "role": {"id": role_obj["id"]} if role_obj and "id" in role_obj else {"name": vm_role_name},
+        "description": record.description or "",
+        "serial": record.serial or "",
+        "vcpus": record.vcpus,
+        "memory": record.memory,
+        "disk": record.disk,
     }
-    print(f"Создание IP адреса '{ip_with_mask}'...")
-    return netbox_api_request("POST", url, json=payload)
+    
+    # Добавляем кластер, если он найден или создан
+    if cluster_obj and "id" in cluster_obj:
+        payload["cluster"] = {"id": cluster_obj["id"]}
+    elif vm_cluster_name:
+        payload["cluster"] = {"name": vm_cluster_name}
 
-# --- Основная функция импорта ---
+    # Пропускаем status, так как он может быть неправильным
+    # if vm_status:
+    #     payload["status"] = record.status
 
-def import_vms_from_excel(excel_path, sheet_name):
-    """Импорт или обновление VM из Excel файла."""
-    try:
-        df = pd.read_excel(excel_path, sheet_name=sheet_name)
-    except FileNotFoundError:
-        print(f"Ошибка: Excel файл '{excel_path}' не найден.")
+    if vm_tenant_name:
+        tenant = cache.get("tenant", vm_tenant_name)
+        payload["tenant"] = {"id": tenant["id"]} if tenant else {"name": vm_tenant_name}
+    
+    # VRF относится к IP-адресу VM, а не к самой VM
+    vrf = None
+    if vm_vrf_name: # Добавляем VRF, если указан
+        vrf = cache.get("vrf", vm_vrf_name)
+        if not vrf:
+            logger.warning(f"Строка {record.row}: VRF '{vm_vrf_name}' не найден в Netbox. IP-адрес не будет привязан к VRF.")
+
+    work = {
+        "row": record.row,
+        "name": vm_name,
+        "role": vm_role_name,
+        "payload": payload,
+        "existing_vm": existing_vm,
+        "ip_address": None,
+        "ip_id": None,
+        "ip_needs_assign": False,
+        "vrf_id": vrf["id"] if vrf else None,
+        "site_id": vm_site_id,
+        "missing": missing,
+    }
+
+    # primary_ip4 сверяется с IPAM и создается/назначается пакетно на следующих этапах
+    if vm_primary_ip4:
+        work["ip_address"] = vm_primary_ip4
+        work["ip_description"] = record.ip_primary_description or ""
+
+    return work
+
+def create_reference(kind, name, site_id, cache, changes=None):
+    """Создание роли или кластера; в режиме плана (changes) - запись в план."""
+    if changes is not None:
+        return changes.planned(kind, name, site_id=site_id) if kind == "cluster" else changes.planned(kind, name)
+    if kind == "cluster":
+        return create_cluster(name, site_id, cache.get("cluster_type", "VMware"))
+    return create_device_role(name)
+
+def create_missing_references(works, cache, stats, changes=None):
+    """Создание недостающих ролей и кластеров для строк, прошедших сверку IP.
+
+    С асинхронным клиентом роли и кластеры создаются одновременно. Строки,
+    для которых создать роль или кластер не удалось, пропускаются.
+    """
+    missing = {}
+    for work in works:
+        for kind, name in work["missing"]:
+            if not cache.get(kind, name):
+                missing.setdefault((kind, name), work["site_id"])
+    for kind, name in missing:
+        logger.info(f"{'Роль' if kind == 'role' else 'Кластер'} '{name}' не найден, создаем...")
+    failed = set()
+    created = None
+    if missing and changes is None:
+        created = run_concurrently([
+            ("create_cluster", (cluster_payload(name, site_id, cache.get("cluster_type", "VMware")),))
+            if kind == "cluster" else ("create_device_role", (device_role_payload(name),))
+            for (kind, name), site_id in missing.items()])
+    if created is not None:
+        for (kind, name), obj in zip(missing, created):
+            if not cache.add(kind, obj):
+                failed.add((kind, name))
+
+    kept = []
+    for work in works:
+        for kind, name in work["missing"]:
+            title = "роли" if kind == "role" else "кластера"
+            obj = None if (kind, name) in failed else cache.get_or_create(
+                kind, name, lambda: create_reference(kind, name, work["site_id"], cache, changes))
+            if not obj:
+                logger.error(f"Ошибка создания {title} '{name}', пропускаем VM '{work['name']}'")
+                stats.skip(work["row"], work["name"], work["role"], f"Ошибка создания {title} '{name}'")
+                break
+            # У роли или кластера, которые только планируются, ID нет
+            if "id" in obj:
+                work["payload"][kind] = {"id": obj["id"]}
+        else:
+            kept.append(work)
+    return kept
+
+def reconcile_ips(works, prefixes, inventory, stats):
+    """Сверка IP-адресов строк с IPAM до любых изменений в Netbox.
+
+    Определяет маску и VRF по префиксам, находит существующие IP-адреса в
+    инвентаре и отбрасывает строки, IP которых уже назначен другой VM, интерфейсу
+    устройства или указан в таблице для другой VM. Возвращает оставшиеся строки.
+    """
+    with_ip = [work for work in works if work["ip_address"]]
+    if not with_ip:
+        return works
+    with metrics.phase("prefetch"):
+        if not prefixes.loaded and not prefixes.load():
+            logger.warning("Не удалось загрузить префиксы, будут созданы только IP-адреса с маской в таблице.")
+        if not inventory.load(work["ip_address"] for work in with_ip):
+            logger.warning("Не удалось загрузить IP-адреса, поиск IP-адресов будет выполняться через API.")
+
+    claims = {}
+    conflicts = set()
+    for work in with_ip:
+        ip_address_str = work["ip_address"]
+        vm_name = work["name"]
+        existing_vm = work["existing_vm"]
+        work["ip_with_mask"], work["vrf_id"] = prefixes.interface_address(ip_address_str, work["vrf_id"])
+
+        key = inventory.key(ip_address_str, work["vrf_id"])
+        owner_name = claims.setdefault(key, vm_name)
+        if owner_name != vm_name:
+            conflicts.add(work["row"])
+            stats.skip(work["row"], vm_name, work["role"],
+                       f"Конфликт IP: '{ip_address_str}' указан в таблице для VM '{owner_name}'")
+            continue
+
+        existing_ip = inventory.get(ip_address_str, work["vrf_id"])
+        if not existing_ip:
+            # IP адрес не найден, будет создан; для существующей VM его нужно назначить интерфейсу
+            logger.debug(f"IP адрес '{ip_address_str}' не найден в Netbox, создаем...")
+            work["ip_needs_assign"] = True
+            continue
+
+        ip_id = existing_ip["id"]
+        work["ip_id"] = ip_id
+        if existing_ip.get("assigned_object_id"):
+            owner = assigned_vm(existing_ip)
+            if not owner:
+                conflicts.add(work["row"])
+                stats.skip(work["row"], vm_name, work["role"],
+                           f"Конфликт IP: '{ip_address_str}' назначен интерфейсу устройства")
+            elif not existing_vm or owner["id"] != existing_vm["id"]:
+                conflicts.add(work["row"])
+                stats.skip(work["row"], vm_name, work["role"],
+                           f"Конфликт IP: '{ip_address_str}' назначен VM '{owner.get('name', owner['id'])}'")
+            elif existing_vm.get("primary_ip4") and existing_vm["primary_ip4"]["id"] == ip_id:
+                logger.debug(f"IP '{ip_address_str}' уже является primary_ip4 для VM '{vm_name}'")
+            else:
+                # Устанавливаем как primary_ip4
+                work["payload"]["primary_ip4"] = {"id": ip_id}
+        else:
+            # IP не назначен, его нужно назначить интерфейсу VM после записи VM
+            work["ip_needs_assign"] = True
+
+    if conflicts:
+        logger.warning(f"Найдено конфликтов IP-адресов: {len(conflicts)}, строки пропущены.")
+    return [work for work in works if work["row"] not in conflicts]
+
+def create_missing_ips(works, inventory, batch_size, workers, journal=None):
+    """Пакетное создание IP-адресов, не найденных в Netbox при сверке."""
+    missing = [work for work in works if work["ip_address"] and not work["ip_id"]]
+    writer = BulkWriter(f"{NETBOX_API_URL}/ipam/ip-addresses/", "POST", batch_size, workers, journal)
+    for work in missing:
+        address = work["ip_address"]
+        ip_with_mask = work["ip_with_mask"]
+        if not ip_with_mask:
+            logger.warning(f"Строка {work['row']}: не найден префикс, содержащий IP адрес '{address}'. "
+                           f"IP адрес не будет создан.")
+            # Строка не попадает в состояние и повторится, когда префикс появится в Netbox
+            work["error"] = f"Не найден префикс, содержащий IP адрес '{address}'"
+            continue
+        ip_payload = {
+            "address": ip_with_mask,
+            "description": work["ip_description"],
+        }
+        if work["vrf_id"]:
+            ip_payload["vrf"] = {"id": work["vrf_id"]}
+        writer.add(address, ip_payload)
+    created = writer.flush()
+    for work in missing:
+        new_ip = created.get(work["ip_address"])
+        if not new_ip:
+            if work["ip_address"] in writer.errors:
+                logger.error(f"Ошибка создания IP адреса '{work['ip_address']}'")
+                work["error"] = f"Ошибка создания IP адреса '{work['ip_address']}'"
+            work["ip_needs_assign"] = False
+            continue
+        work["ip_id"] = new_ip["id"]
+        inventory.add(new_ip)
+
+def write_vms(works, snapshot, batch_size, workers, journal=None):
+    """Построение плана по снимку VM и пакетное создание/обновление VM.
+
+    Возвращает ID VM для успешно записанных строк: {номер строки: ID VM}.
+    Ошибки Netbox сохраняются в строке (work["error"]).
+    """
+    plan = SyncPlan()
+    for work in works:
+        plan.add(work["row"], work["name"], work["payload"], work["existing_vm"])
+    logger.info(f"План синхронизации VM: {plan.summary()}")
+    results, errors = plan.apply(NETBOX_API_URL, batch_size, workers, journal)
+
+    # Результаты пакетов сопоставляются со строками таблицы по номеру строки
+    by_row = {work["row"]: work for work in works}
+    synced = {}
+    for item in plan.items:
+        if item.action == NOOP:
+            logger.debug(f"VM '{item.name}' уже актуальна. Изменения не требуются.")
+            synced[item.ref] = item.vm_id
+        elif item.ref in results:
+            synced[item.ref] = results[item.ref]["id"]
+            snapshot.add(results[item.ref])
+        elif item.ref in errors:
+            by_row[item.ref]["error"] = f"Ошибка Netbox: {errors[item.ref]}"
+    return synced
+
+def provision_interfaces(works, synced, interfaces, inventory, snapshot, batch_size, workers, journal=None):
+    """Пакетное создание интерфейсов, назначение IP-адресов и установка primary_ip4.
+
+    Выполняется после записи VM, поэтому новые VM получают primary IP в том же
+    запуске. Порядок для каждой VM: интерфейс -> назначение IP -> primary_ip4.
+    """
+    works = [work for work in works
+             if work["ip_needs_assign"] and work["ip_id"] and work["row"] in synced]
+    if not works:
         return
-    except Exception as e:
-        print(f"Ошибка при чтении Excel файла: {e}")
+    for work in works:
+        work["vm_id"] = synced[work["row"]]
+        if not work["existing_vm"]:
+            interfaces.add_vm(work["vm_id"])
+    with metrics.phase("prefetch"):
+        loaded = interfaces.load(work["vm_id"] for work in works)
+    if not loaded:
+        for work in works:
+            work["error"] = "Ошибка загрузки интерфейсов VM"
         return
 
-    # Статистика
-    total_records = len(df)
-    processed_count = 0
-    skipped_count = 0
-    skipped_records = []
-
-    for index, row in df.iterrows():
-        vm_name = row["name"]
-        vm_role_name = row["role"]
-        vm_description = row.get("description")
-        vm_serial = row.get("serial")
-        vm_platform_id = row.get("platform_id", 1)  # По умолчанию platform_id = 1
-        vm_site_id = row.get("site_id", 2)        # По умолчанию site_id = 2
-        vm_cluster_name = row.get("cluster")        # Получаем имя кластера из файла
-        vm_vcpus = row.get("vcpus")
-        vm_memory = row.get("memory")
-        vm_disk = row.get("disk")
-        vm_primary_ip4 = row.get("ip_primary")
-        vm_primary_ip4_description = row.get("ip_primary_description", "")
-        vm_status = row.get("status")
-        vm_tenant_name = row.get("tenant_name")
-        vm_vrf_name = row.get("vrf_name") # Новое поле для VRF
-
-        # Проверка обязательных полей
-        if pd.isna(vm_name) or pd.isna(vm_role_name):
-            skipped_count += 1
-            skipped_records.append({
-                'row': index + 2,
-                'name': vm_name,
-                'role': vm_role_name,
-                'reason': 'Отсутствуют обязательные поля name или role'
+    # Если у VM нет интерфейсов, создаем eth0
+    interface_writer = BulkWriter(f"{NETBOX_API_URL}/virtualization/interfaces/", "POST",
+                                  batch_size, workers, journal)
+    for vm_id in {work["vm_id"] for work in works}:
+        if not interfaces.primary(vm_id):
+            interface_writer.add(vm_id, {
+                "virtual_machine": {"id": vm_id},
+                "name": DEFAULT_INTERFACE_NAME,
+                "type": {"value": "virtual"},
             })
+    for interface in interface_writer.flush().values():
+        interfaces.add(interface)
+
+    assign_writer = BulkWriter(f"{NETBOX_API_URL}/ipam/ip-addresses/", "PATCH", batch_size, workers, journal)
+    for work in works:
+        interface = interfaces.primary(work["vm_id"])
+        if not interface:
+            logger.error(f"Ошибка создания интерфейса для VM '{work['name']}'")
+            work["error"] = "Ошибка создания интерфейса"
             continue
+        assign_writer.add(work["ip_id"], {
+            "id": work["ip_id"],
+            "assigned_object_type": "virtualization.vminterface",
+            "assigned_object_id": interface["id"],
+        })
+    assigned = assign_writer.flush()
 
-        existing_vm = get_virtual_machine_by_name(vm_name)
+    primary_writer = BulkWriter(f"{NETBOX_API_URL}/virtualization/virtual-machines/", "PATCH",
+                                batch_size, workers, journal)
+    for work in works:
+        if work.get("error"):
+            continue
+        if work["ip_id"] not in assigned:
+            logger.error(f"Ошибка назначения IP адреса интерфейсу для VM '{work['name']}'")
+            work["error"] = "Ошибка назначения IP адреса интерфейсу"
+            continue
+        inventory.add(assigned[work["ip_id"]])
+        # Отдельный ключ, чтобы в журнале операция не совпала с обновлением VM по номеру строки
+        primary_writer.add(f"primary_ip4:{work['row']}", {"id": work["vm_id"], "primary_ip4": {"id": work["ip_id"]}})
+    updated = primary_writer.flush()
+    for work in works:
+        ref = f"primary_ip4:{work['row']}"
+        if ref in updated:
+            snapshot.add(updated[ref])
+        elif ref in primary_writer.errors:
+            work["error"] = f"Ошибка установки primary_ip4: {primary_writer.errors[ref]}"
 
-        # Проверяем и создаем роль, если она не существует
-        role_obj = get_device_role_by_name(vm_role_name)
-        if not role_obj:
-            print(f"Роль '{vm_role_name}' не найдена, создаем...")
-            role_obj = create_device_role(vm_role_name)
-            if not role_obj:
-                print(f"Ошибка создания роли '{vm_role_name}', пропускаем VM '{vm_name}'")
-                continue
+# --- Возобновление прерванного запуска ---
 
-        # Проверяем и создаем кластер, если он не существует
-        cluster_obj = get_cluster_by_name(vm_cluster_name) if not pd.isna(vm_cluster_name) else None
-        if not cluster_obj and not pd.isna(vm_cluster_name):
-            print(f"Кластер '{vm_cluster_name}' не найден, создаем...")
-            cluster_obj = create_cluster(vm_cluster_name, vm_site_id)
-            if not cluster_obj:
-                print(f"Ошибка создания кластера '{vm_cluster_name}', пропускаем VM '{vm_name}'")
-                continue
-        
-        # Формирование базового payload
-        payload = {
-            "name": str(vm_name),
-            "role": {"id": role_obj["id"]},  # Используем ID роли для избежания дублирования
-            "description": str(vm_description) if not pd.isna(vm_description) else "",
-            "serial": str(vm_serial) if not pd.isna(vm_serial) else "",
-            "vcpus": int(vm_vcpus) if pd.notna(vm_vcpus) else None,
-            "memory": int(vm_memory) if pd.notna(vm_memory) else None,
-            "disk": int(vm_disk) if pd.notna(vm_disk) else None,
-        }
-        
-        # Добавляем кластер, если он найден или создан
-        if cluster_obj:
-            payload["cluster"] = {"id": cluster_obj["id"]}
-        elif not pd.isna(vm_cluster_name):
-            payload["cluster"] = {"name": str(vm_cluster_name)}
-
-        # Пропускаем status, так как он может быть неправильным
-        # if vm_status:
-        #     payload["status"] = str(vm_status)
-
-        if vm_tenant_name:
-            payload["tenant"] = {"name": str(vm_tenant_name)}
-        
-        if vm_vrf_name: # Добавляем VRF, если указан
-            vrf = get_vrf_by_name(vm_vrf_name)
-            if vrf:
-                payload["vrf"] = {"id": vrf["id"]}
-            else:
-                print(f"Строка {index + 2}: VRF '{vm_vrf_name}' не найден в Netbox. VM не будет привязана к VRF.")
-
-        # Обработка primary_ip4
-        if not pd.isna(vm_primary_ip4) and vm_primary_ip4:
-            ip_address_str = str(vm_primary_ip4)
-            # Оставляем маску подсети как есть, если она указана в файле
-            existing_ip = get_ip_by_address(ip_address_str)
-
-            if existing_ip:
-                ip_id = existing_ip["id"]
-                
-                # Проверяем, назначен ли уже IP адрес
-                if existing_ip.get("assigned_object_id") and existing_ip.get("assigned_object_type") == "virtualization.vminterface":
-                    # IP уже назначен, проверяем, является ли он primary для VM
-                    if existing_vm and existing_vm.get("primary_ip4") and existing_vm["primary_ip4"]["id"] == ip_id:
-                        print(f"IP '{ip_address_str}' уже является primary_ip4 для VM '{vm_name}'")
-                    else:
-                        # Устанавливаем как primary_ip4
-                        payload["primary_ip4"] = {"id": ip_id}
-                else:
-                    # IP не назначен, нужно создать интерфейс и назначить IP
-                    if existing_vm:
-                        vm_id = existing_vm["id"]
-                        
-                        # Получаем интерфейсы VM
-                        interfaces = get_vm_interfaces(vm_id)
-                        
-                        # Если нет интерфейсов, создаем
-                        if not interfaces:
-                            interface = create_vm_interface(vm_id, "eth0")
-                            if interface:
-                                interface_id = interface["id"]
-                            else:
-                                print(f"Ошибка создания интерфейса для VM '{vm_name}'")
-                                continue
-                        else:
-                            interface_id = interfaces[0]["id"]
-                        
-                        # Назначаем IP адрес интерфейсу
-                        if assign_ip_to_interface(interface_id, ip_id):
-                            payload["primary_ip4"] = {"id": ip_id}
-                        else:
-                            print(f"Ошибка назначения IP адреса интерфейсу для VM '{vm_name}'")
+# Поиск объектов, которые POST прерванного запуска мог уже создать:
+# эндпоинт -> (многозначный фильтр, значение фильтра по payload, ключ объекта для сопоставления с payload)
+CREATED_LOOKUPS = {
+    "ipam/ip-addresses": ("address", lambda obj: host(obj["address"]),
+                          lambda obj: IPInventory.key(obj["address"], (obj.get("vrf") or {}).get("id"))),
+    "virtualization/virtual-machines": ("name", lambda obj: obj["name"], lambda obj: obj["name"]),
+    "virtualization/interfaces": ("virtual_machine_id", lambda obj: obj["virtual_machine"]["id"],
+                                  lambda obj: (obj["virtual_machine"]["id"], obj["name"])),
+}
+
+def find_applied(endpoint, method, operations):
+    """Операции журнала [(ref, payload)], уже выполненные в Netbox: {ref: объект}; None при ошибке.
+
+    Объект, созданный POST, ищется по имени, адресу или интерфейсу VM; DELETE
+    выполнен, если объекта больше нет. PATCH повторяется всегда.
+    """
+    url = f"{NETBOX_API_URL}/{endpoint}/"
+    if method == "DELETE":
+        existing = netbox_client.list_all_by(url, "id", [payload["id"] for _, payload in operations],
+                                             {"fields": "id"})
+        if existing is None:
+            return None
+        existing = {obj["id"] for obj in existing}
+        return {ref: payload for ref, payload in operations if payload["id"] not in existing}
+    if method != "POST" or endpoint not in CREATED_LOOKUPS:
+        return {}
+    key, value, identity = CREATED_LOOKUPS[endpoint]
+    found = netbox_client.list_all_by(url, key, [value(payload) for _, payload in operations])
+    if found is None:
+        return None
+    by_identity = {identity(obj): obj for obj in found}
+    return {ref: by_identity[identity(payload)] for ref, payload in operations if identity(payload) in by_identity}
+
+def resume_operations(journal, snapshot, inventory, interfaces, batch_size, workers):
+    """Повтор операций прерванного запуска, не отмеченных в журнале выполненными (pending и failed).
+
+    Операции повторяются в порядке выполнения, подряд идущие операции одного
+    эндпоинта и метода - пакетно; выполненные до прерывания (find_applied)
+    только отмечаются в журнале. Объекты попадают в кэши запуска, поэтому
+    строки таблицы затем сверяются с уже исправленным состоянием Netbox.
+    """
+    operations = journal.unfinished_operations()
+    if not operations:
+        return
+    logger.info(f"Повтор невыполненных операций прерванного запуска: {len(operations)}")
+    for (endpoint, method), group in itertools.groupby(operations, key=lambda operation: operation[:2]):
+        group = [(ref, payload) for _, _, ref, payload in group]
+        applied = find_applied(endpoint, method, group)
+        if applied is None:
+            logger.error(f"Не удалось проверить операции {method} {endpoint} прерванного запуска, "
+                         f"они будут выполнены при сверке строк.")
+            continue
+        if applied:
+            journal.done(endpoint, method, [(ref, obj.get("id")) for ref, obj in applied.items()])
+        writer = BulkWriter(f"{NETBOX_API_URL}/{endpoint}/", method, batch_size, workers, journal)
+        for ref, payload in group:
+            if ref not in applied:
+                writer.add(ref, payload)
+        results = writer.flush()
+        logger.info(f"{method} {endpoint}: выполнено до прерывания {len(applied)}, "
+                    f"повторено {len(group) - len(applied)}, ошибок {len(writer.errors)}")
+        if method == "DELETE":
+            continue
+        for obj in [*applied.values(), *results.values()]:
+            if endpoint == "virtualization/virtual-machines" and snapshot is not None:
+                snapshot.add(obj)
+            elif endpoint == "ipam/ip-addresses":
+                inventory.add(obj)
+            elif endpoint == "virtualization/interfaces" and interfaces.get(obj["virtual_machine"]["id"]) is not None:
+                interfaces.add(obj)
+
+def plan_records(works, snapshot, interfaces, changes):
+    """План изменений блока строк без записи в Netbox: IP-адреса, VM, интерфейсы и назначения.
+
+    Повторяет решения этапов create_missing_ips, write_vms и provision_interfaces;
+    интерфейсы существующих VM загружаются одним списочным запросом.
+    """
+    for work in works:
+        if work["ip_address"] and not work["ip_id"]:
+            if work["ip_with_mask"]:
+                changes.add("ip_address", "create", work["ip_with_mask"], work["row"],
+                            vrf_id=work["vrf_id"], description=work["ip_description"] or None)
             else:
-                # IP адрес не найден, создаем его
-                print(f"IP адрес '{ip_address_str}' не найден в Netbox, создаем...")
-                new_ip = create_ip_address(ip_address_str, vm_primary_ip4_description)
-                if new_ip:
-                    ip_id = new_ip["id"]
-                    
-                    # Если VM уже существует, создаем интерфейс и назначаем IP
-                    if existing_vm:
-                        vm_id = existing_vm["id"]
-                        
-                        # Получаем интерфейсы VM
-                        interfaces = get_vm_interfaces(vm_id)
-                        
-                        # Если нет интерфейсов, создаем
-                        if not interfaces:
-                            interface = create_vm_interface(vm_id, "eth0")
-                            if interface:
-                                interface_id = interface["id"]
-                            else:
-                                print(f"Ошибка создания интерфейса для VM '{vm_name}'")
-                                continue
-                        else:
-                            interface_id = interfaces[0]["id"]
-                        
-                        # Назначаем IP адрес интерфейсу
-                        if assign_ip_to_interface(interface_id, ip_id):
-                            payload["primary_ip4"] = {"id": ip_id}
-                        else:
-                            print(f"Ошибка назначения IP адреса интерфейсу для VM '{vm_name}'")
-                    else:
-                        # VM еще не создана, просто добавляем IP в payload
-                        payload["primary_ip4"] = {"id": ip_id}
-                else:
-                    print(f"Ошибка создания IP адреса '{ip_address_str}'")
-
-        # Импорт или обновление VM
-        processed_count += 1
-        if existing_vm:
-            vm_id = existing_vm["id"]
-            # Сравнение полей для определения, нужно ли обновление
-            update_needed = False
-            for key, value in payload.items():
-                # Специальная обработка для вложенных словарей (site, cluster, role, platform, tenant, vrf)
-                if isinstance(value, dict) and key in existing_vm and isinstance(existing_vm[key], dict):
-                    if value.get("id") != existing_vm[key].get("id") and value.get("name") != existing_vm[key].get("name"):
-                        update_needed = True
-                        break
-                elif key == "primary_ip4":
-                    # Сравниваем ID IP-адреса
-                    if isinstance(value, dict) and isinstance(existing_vm.get(key), dict):
-                        if value.get("id") != existing_vm[key].get("id"):
-                            update_needed = True
-                            break
-                    elif isinstance(value, dict) and existing_vm.get(key) is None:
-                        update_needed = True
-                        break
-                    elif value is None and existing_vm.get(key) is not None:
-                         update_needed = True
-                         break
-                elif value != existing_vm.get(key):
-                    # Проверяем, что значение не является пустым, если в Netbox оно тоже пустое
-                    if not (pd.isna(value) and existing_vm.get(key) is None or existing_vm.get(key) == ""):
-                        update_needed = True
-                        break
-            
-            if update_needed:
-                update_virtual_machine(vm_id, payload)
+                changes.add("ip_address", "skip", work["ip_address"], work["row"],
+                            reason="не найден префикс, содержащий адрес")
+
+    plan = SyncPlan()
+    vm_changes = {}
+    for work in works:
+        item = plan.add(work["row"], work["name"], work["payload"], work["existing_vm"])
+        vm_changes[work["row"]] = changes.add("vm", item.action, item.name, item.ref, id=item.vm_id, fields={
+            key: {"old": old, "new": new} for key, (old, new) in item.changes.items()})
+
+    assign = [work for work in works if work["ip_needs_assign"] and (work["ip_id"] or work["ip_with_mask"])]
+    with metrics.phase("prefetch"):
+        interfaces.load(work["existing_vm"]["id"] for work in assign if work["existing_vm"])
+    planned_interfaces = set()
+    for work in assign:
+        vm_id = work["existing_vm"]["id"] if work["existing_vm"] else None
+        interface = interfaces.primary(vm_id) if vm_id else None
+        if not interface and work["name"] not in planned_interfaces:
+            planned_interfaces.add(work["name"])
+            changes.add("interface", "create", f"{work['name']}/{DEFAULT_INTERFACE_NAME}", work["row"])
+        interface_name = interface["name"] if interface else DEFAULT_INTERFACE_NAME
+        changes.add("ip_address", "assign", work["ip_with_mask"] or work["ip_address"], work["row"],
+                    interface=f"{work['name']}/{interface_name}")
+        # primary_ip4 устанавливается после назначения IP интерфейсу
+        vm_change = vm_changes[work["row"]]
+        old_primary = (work["existing_vm"] or {}).get("primary_ip4")
+        vm_change["fields"]["primary_ip4"] = {"old": old_primary,
+                                              "new": work["ip_with_mask"] or work["ip_address"]}
+        if vm_change["action"] == NOOP:
+            vm_change["action"] = UPDATE
+
+def open_vm_snapshot(interfaces, read_backend="rest", mirror=None):
+    """Снимок VM: из зеркала или через выбранный способ чтения (rest, graphql)."""
+    if mirror:
+        return mirror.snapshot()
+    # С асинхронным клиентом VM, которых нет в снимке, ищутся одновременно (VMSnapshot.prefetch)
+    lookup_many = get_virtual_machines_by_name if hasattr(netbox_client.get_client(), "run_all") else None
+    return make_snapshot(NETBOX_API_URL, get_virtual_machine_by_name, interfaces, read_backend, lookup_many)
+
+def open_snapshot(cache, interfaces, read_backend="rest", scope_cluster=None, scope_tenant=None, scope_tag=None,
+                  mirror=None):
+    """Справочники (если cache не передан) и снимок VM с фильтром области.
+
+    Возвращает (cache, snapshot, scope) или None, если кластер или арендатор
+    области не найден.
+    """
+    # Справочники загружаются один раз, дальше все поиски идут из памяти
+    if cache is None:
+        cache = ReferenceCache()
+        with metrics.phase("prefetch"):
+            cache.load()
+    snapshot = open_vm_snapshot(interfaces, read_backend, mirror)
+    scope = {}
+    for kind, name in (("cluster", scope_cluster), ("tenant", scope_tenant)):
+        if name:
+            obj = cache.get(kind, name)
+            if not obj:
+                logger.error(f"Ошибка: {kind} '{name}' для выбора VM не найден в Netbox.")
+                return None
+            scope[f"{kind}_id"] = obj["id"]
+    if scope_tag:
+        scope["tag"] = scope_tag
+    return cache, snapshot, scope
+
+def finish_rows(works, synced, stats):
+    """Учет результата строк: ошибка любого этапа - строка пропущена и не считается синхронизированной."""
+    for work in works:
+        if work.get("error"):
+            stats.skip(work["row"], work["name"], work["role"], work["error"])
+            synced.pop(work["row"], None)
+        elif work["row"] in synced:
+            stats.processed()
+
+# --- Основная функция импорта ---
+
+def open_journal(excel_path, sheet_name, options, snapshot, inventory, interfaces):
+    """Журнал операций листа; возвращает (журнал или None, строки, завершенные в прерванном запуске).
+
+    С options.resume невыполненные операции прерванного запуска повторяются сразу.
+    """
+    if options.journal_file is False:
+        return None, {}
+    journal = SyncJournal(options.journal_file or default_journal_path(excel_path, sheet_name))
+    if not journal.start(excel_path, sheet_name, options.resume):
+        if options.resume:
+            logger.info("Незавершенный запуск не найден, синхронизация начинается заново.")
+        return journal, {}
+    completed = journal.completed_rows()
+    logger.info(f"Возобновление запуска {journal.run_id}: завершено строк {len(completed)}, "
+                f"операции {journal.operation_counts()}")
+    with metrics.phase("apply"):
+        resume_operations(journal, snapshot, inventory, interfaces, options.batch_size, options.workers)
+    return journal, completed
+
+def select_records(records, sheet_name, stats, state, completed, full, hashes):
+    """Строки блока, которые нужно синхронизировать.
+
+    В инкрементальном режиме (state) отбрасываются строки без изменений с
+    прошлой синхронизации (с full - все строки обрабатываются заново), при
+    возобновлении - строки, завершенные в прерванном запуске.
+    """
+    if state:
+        changed, _ = state.diff(sheet_name, {record.name: hashes[record.row] for record in records})
+        if full:
+            changed = {record.name for record in records}
+        stats.unchanged_count += sum(1 for record in records if record.name not in changed)
+        records = [record for record in records if record.name in changed]
+
+    # Возобновление: строки, завершенные в прерванном запуске, повторно не отправляются
+    if completed:
+        remaining = []
+        for record in records:
+            done = completed.get(record.name)
+            if done and done[0] == hashes[record.row]:
+                stats.resumed_count += 1
+                if state:
+                    state.record(sheet_name, record.name, done[0], vm_id=done[1], ip_id=done[2])
             else:
-                print(f"VM '{vm_name}' уже актуальна. Изменения не требуются.")
-        else:
-            create_virtual_machine(payload)
+                remaining.append(record)
+        records = remaining
+    return records
+
+def forget_deleted_rows(state, sheet_name, seen_names, stats):
+    """Инкрементальный режим: строки, удаленные из таблицы, удаляются из состояния."""
+    deleted = set(state.rows(sheet_name)) - seen_names
+    logger.info(f"Инкрементальный режим: без изменений {stats.unchanged_count}, "
+                f"удалено из таблицы {len(deleted)}")
+    for name in sorted(deleted):
+        logger.info(f"VM '{name}' удалена из таблицы с прошлой синхронизации.")
+        state.forget(sheet_name, name)
+
+def import_vms_from_excel(excel_path, sheet_name, options=None, cache=None, changes=None, shared=None, exclude=None,
+                          mirror=None, sheet_data=None):
+    """Импорт или обновление VM из Excel файла (также CSV или Parquet).
+
+    options (ImportOptions) - параметры импорта. В потоковом режиме таблица
+    читается и синхронизируется блоками по options.chunk_size строк, поэтому
+    расход памяти не зависит от размера таблицы.
+
+    Операции записи фиксируются в журнале (SQLite); с options.resume
+    прерванный запуск продолжается: его невыполненные операции повторяются,
+    строки, завершенные в нем и не изменившиеся в таблице, пропускаются.
+
+    shared (SharedCaches) - кэши, общие с другими листами; exclude - строки,
+    которые нужно пропустить: {имя VM: причина}. mirror
+    (netbox_mirror.NetBoxMirror) - обновленное локальное зеркало: справочники,
+    снимок VM, префиксы, IP-адреса и интерфейсы берутся из него. changes
+    (ChangeSet) передает plan_vms_from_excel. sheet_data (SheetData) - лист,
+    уже прочитанный вызывающим кодом; таблица тогда не читается. Возвращает
+    ImportStats.
+    """
+    options = options or ImportOptions()
+    if sheet_data is not None:
+        chunks = iter([sheet_data])
+    elif options.stream:
+        chunks = iter_vm_records(excel_path, sheet_name, options.chunk_size)
+    else:
+        chunks = (read_vm_records(excel_path, sheet_name) for _ in range(1))
+
+    stats = ImportStats(0)
+    state = None
+    if options.incremental:
+        state_path = options.state_file or default_state_path(excel_path)
+        state = shared.state(state_path) if shared else SyncState(state_path)
+    seen_names = set()
+    read_failed = False
+    exclude = exclude or {}
+    if shared:
+        cache, snapshot = shared.cache, shared.snapshot
+        prefixes, inventory, interfaces = shared.prefixes, shared.inventory, shared.interfaces
+        scope = {}
+    else:
+        snapshot = None
+        # Префиксы и IP-адреса загружаются при первой строке с IP-адресом
+        prefixes = PrefixIndex(NETBOX_API_URL)
+        inventory = IPInventory(NETBOX_API_URL, prefixes, get_ip_by_address)
+        interfaces = InterfaceCache(NETBOX_API_URL)
+        if mirror:
+            # Все справочники, префиксы, IP-адреса и интерфейсы - из локального зеркала, без запросов
+            cache = cache or ReferenceCache()
+            with metrics.phase("prefetch"):
+                mirror.warm(cache, prefixes, inventory, interfaces)
+    pending_rows = 0
+
+    journal, completed = open_journal(excel_path, sheet_name, options, snapshot, inventory, interfaces)
+    try:
+        while True:
+            try:
+                with metrics.phase("read"):
+                    sheet = next(chunks, None)
+            except FileNotFoundError:
+                logger.error(f"Ошибка: Excel файл '{excel_path}' не найден.")
+                return
+            except Exception as e:
+                logger.error(f"Ошибка при чтении Excel файла: {e}")
+                if not stats.total_records:
+                    return
+                read_failed = True
+                break
+            if sheet is None:
+                break
+            records = sheet.records
+
+            # Строки, не прошедшие проверку при чтении, сразу попадают в пропущенные
+            stats.total_records += sheet.total
+            for reject in sheet.rejects.itertuples(index=False):
+                stats.skip(reject.row, reject.name, reject.role, reject.reason)
+
+            # Строки, исключенные вызывающим кодом (например, VM, указанные на нескольких листах)
+            if exclude:
+                for record in records:
+                    if record.name in exclude:
+                        stats.skip(record.row, record.name, record.role, exclude[record.name])
+                        seen_names.add(record.name)
+                records = [record for record in records if record.name not in exclude]
+
+            hashes = {}
+            if state or journal:
+                hashes = {record.row: row_hash(record.values()) for record in records}
+            if state or options.prune:
+                # Строка с ошибкой в таблице не считается удалённой
+                seen_names.update(record.name for record in records)
+                seen_names.update(sheet.rejects["name"].dropna())
+            records = select_records(records, sheet_name, stats, state, completed, options.full, hashes)
+            if not records:
+                continue
+
+            if snapshot is None:
+                opened = open_snapshot(cache, interfaces, options.read_backend, options.scope_cluster,
+                                       options.scope_tenant, options.scope_tag, mirror)
+                if opened is None:
+                    return
+                cache, snapshot, scope = opened
+
+            # Снимок существующих VM загружается один раз; пока изменений мало (инкрементальный режим),
+            # дешевле найти несколько VM по имени, чем загружать все VM. При ошибке VM ищутся по одной.
+            pending_rows += len(records)
+            lazy = options.incremental and changes is None and pending_rows <= LAZY_SNAPSHOT_ROWS
+            if not snapshot.loaded and not lazy and not shared:
+                with metrics.phase("prefetch"):
+                    loaded = snapshot.load(**scope)
+                if not loaded:
+                    logger.warning("Не удалось загрузить снимок VM, поиск VM будет выполняться через API.")
+                    snapshot.scoped = True
+
+            if options.stream:
+                logger.info(f"Обработка строк {records[0].row}-{records[-1].row}...")
+            synced, works = sync_records(records, cache, snapshot, prefixes, inventory, interfaces, stats,
+                                         options.batch_size, options.workers, changes, journal)
+
+            # В состояние попадают только успешно синхронизированные строки, остальные повторятся в следующий раз
+            if state and changes is None:
+                for work in works:
+                    if work["row"] in synced:
+                        state.record(sheet_name, work["name"], hashes[work["row"]],
+                                     vm_id=synced[work["row"]], ip_id=work["ip_id"])
+            if journal:
+                journal.complete_rows([(work["name"], work["row"], hashes[work["row"]], synced[work["row"]],
+                                        work["ip_id"]) for work in works if work["row"] in synced])
+
+        if options.prune:
+            # Снимок общих кэшей загружен без области и для удаления не подходит
+            stats.deleted_count = prune_sheet_orphans(cache, None if shared else snapshot, interfaces, seen_names,
+                                                      options, read_failed, journal, changes, mirror)
+
+        if state and not read_failed:
+            forget_deleted_rows(state, sheet_name, seen_names, stats)
+            if changes is None:
+                state.save()
+
+        if journal:
+            journal.finish(COMPLETED)
+    finally:
+        if journal:
+            journal.close()
 
-    # Вывод итоговой статистики
+    return stats
+
+def plan_vms_from_excel(excel_path, sheet_name, options=None, mirror=None):
+    """Только план импорта: изменения записываются в ChangeSet без записи в Netbox.
+
+    Используются списочные запросы на чтение; журнал операций не ведется.
+    Возвращает (ImportStats или None, ChangeSet).
+    """
+    changes = ChangeSet()
+    options = replace(options or ImportOptions(), journal_file=False, resume=False)
+    stats = import_vms_from_excel(excel_path, sheet_name, options, changes=changes, mirror=mirror)
+    if stats:
+        for record in stats.skipped_records:
+            changes.add("vm", "skip", record["name"], record["row"], reason=record["reason"])
+    return stats, changes
+
+def prune_sheet_orphans(cache, snapshot, interfaces, names, options, read_failed=False, journal=None, changes=None,
+                        mirror=None):
+    """Удаление VM области, отсутствующих в таблице; число удаленных VM или None.
+
+    Снимок синхронизации используется, если он уже загружен для той же
+    области, иначе загружается снимок VM области. Если таблица прочитана не
+    полностью (read_failed), удаление не выполняется.
+    """
+    if read_failed:
+        logger.error("Таблица прочитана не полностью, удаление VM пропущено.")
+        return None
+    if not (options.scope_cluster or options.scope_tenant or options.scope_tag):
+        logger.error("Удаление VM выполняется только для области: укажите кластер, арендатора или тег.")
+        return None
+    with metrics.phase("prune"):
+        if snapshot is None or not (snapshot.loaded and snapshot.scoped):
+            opened = open_snapshot(cache, interfaces, options.read_backend, options.scope_cluster,
+                                   options.scope_tenant, options.scope_tag, mirror)
+            if opened is None:
+                return None
+            _, snapshot, scope = opened
+            with metrics.phase("prefetch"):
+                if not snapshot.load(**scope):
+                    logger.error("Не удалось загрузить снимок VM области, удаление VM пропущено.")
+                    return None
+        return prune_orphans(NETBOX_API_URL, snapshot, names, options.prune_max_percent, options.batch_size,
+                             options.workers, journal, changes)
+
+def sync_records(records, cache, snapshot, prefixes, inventory, interfaces, stats, batch_size, workers,
+                 changes=None, journal=None):
+    """Синхронизация блока строк; возвращает ({номер строки: ID VM}, подготовленные строки).
+
+    В режиме плана (changes) изменения только записываются в план.
+    """
+    # VM, которых нет в снимке, асинхронный клиент ищет одновременно, а не по одной при подготовке строк
+    with metrics.phase("prefetch"):
+        snapshot.prefetch(record.name for record in records)
+
+    # Этап 1: подготовка строк (параллельно, если задано несколько потоков)
+    with metrics.phase("plan"):
+        works = prepare_rows(records, cache, snapshot, stats, workers)
+
+        # Этап 2: сверка IP-адресов с IPAM, конфликты отбрасываются до любых изменений
+        works = reconcile_ips(works, prefixes, inventory, stats)
+        works = create_missing_references(works, cache, stats, changes)
+
+        if changes is not None:
+            plan_records(works, snapshot, interfaces, changes)
+            for _ in works:
+                stats.processed()
+            return {}, works
+
+    # Этапы 3-5 сохраняют порядок операций для каждой VM: IP -> VM -> интерфейс -> назначение -> primary_ip4
+    with metrics.phase("apply"):
+        create_missing_ips(works, inventory, batch_size, workers, journal)
+        synced = write_vms(works, snapshot, batch_size, workers, journal)
+        provision_interfaces(works, synced, interfaces, inventory, snapshot, batch_size, workers, journal)
+    finish_rows(works, synced, stats)
+    return synced, works
+
+def prepare_rows(records, cache, snapshot, stats, workers):
+    """Подготовка строк блока; строки с ошибками учитываются как пропущенные."""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(prepare_vm_row, record, cache, snapshot) for record in records]
+    works = []
+    for record, future in zip(records, futures):
+        try:
+            work = future.result()
+        except Exception as e:
+            logger.error(f"Строка {record.row}: ошибка обработки: {e}")
+            stats.skip(record.row, record.name, record.role, f"Ошибка обработки: {e}")
+            continue
+        if work:
+            works.append(work)
+    return works
+
+def print_import_summary(sheet_name, stats):
+    """Вывод итоговой статистики."""
     print(f"\n{'='*60}")
     print(f"ИТОГОВАЯ СТАТИСТИКА ОБРАБОТКИ ЛИСТА '{sheet_name}':")
     print(f"{'='*60}")
-    print(f"Всего записей в файле: {total_records}")
-    print(f"Успешно обработано: {processed_count}")
-    print(f"Пропущено: {skipped_count}")
+    print(f"Всего записей в файле: {stats.total_records}")
+    if stats.unchanged_count:
+        print(f"Без изменений с прошлой синхронизации: {stats.unchanged_count}")
+    if stats.resumed_count:
+        print(f"Завершено в прерванном запуске: {stats.resumed_count}")
+    print(f"Успешно обработано: {stats.processed_count}")
+    print(f"Пропущено: {stats.skipped_count}")
+    if stats.deleted_count is not None:
+        print(f"Удалено VM, отсутствующих в таблице: {stats.deleted_count}")
+    limiter = getattr(netbox_client.get_client(), "limiter", None)
+    if limiter:
+        summary = limiter.summary()
+        print(f"Запросов одновременно (--adaptive): сейчас {summary['limit']}, наибольший {summary['peak']}, "
+              f"увеличений {summary['increases']}, уменьшений {summary['decreases']}")
     
-    if skipped_records:
+    if stats.skipped_records:
         print(f"\nПРОПУЩЕННЫЕ ЗАПИСИ:")
         print(f"{'Строка':<6} {'Имя VM':<25} {'Роль':<10} {'Причина'}")
         print("-" * 70)
-        for record in skipped_records:
+        for record in sorted(stats.skipped_records, key=lambda record: record['row']):
             print(f"{record['row']:<6} {str(record['name'])[:24]:<25} {str(record['role'])[:9]:<10} {record['reason']}")
     
     print(f"{'='*60}")
 
+def watch_excel(excel_path, sheet_name, options=None, mirror=None, debounce=DEFAULT_DEBOUNCE,
+                poll_interval=DEFAULT_POLL_INTERVAL, cache_ttl=DEFAULT_CACHE_TTL):
+    """Режим наблюдения: синхронизация изменившихся строк после каждого сохранения таблицы.
+
+    Процесс, пул соединений и кэши Netbox (SharedCaches) сохраняются между
+    синхронизациями; кэши загружаются заново не чаще раза в cache_ttl секунд
+    (с зеркалом - после обновления зеркала). Изменившиеся строки определяются
+    как в инкрементальном режиме. options - параметры импорта (ImportOptions).
+    """
+    options = replace(options or ImportOptions(), incremental=True)
+    shared = None
+    loaded = 0
+
+    def sync(changed):
+        nonlocal shared, loaded
+        if shared is None or time.monotonic() - loaded > cache_ttl:
+            if mirror and shared is not None:
+                with metrics.phase("prefetch"):
+                    mirror.refresh()
+            shared = SharedCaches(options.read_backend, mirror)
+            shared.load()
+            loaded = time.monotonic()
+        started = time.perf_counter()
+        stats = import_vms_from_excel(excel_path, sheet_name, options, shared=shared)
+        if stats:
+            print_import_summary(sheet_name, stats)
+            logger.info(f"Синхронизация выполнена за {time.perf_counter() - started:.1f} с, ожидание изменений...")
+
+    watch([excel_path], sync, debounce, poll_interval)
+
 # --- Update run ---
 if __name__ == "__main__":
-    # Проверка доступности URL, наличия файла и токена. Check: URL, File and Token exist
-    if NETBOX_URL == "http://netbox-instance.com":
-        print("Ошибка: Пожалуйста, обновите NETBOX_URL в скрипте.")
-    elif NETBOX_TOKEN == "api_token":
-        print("Ошибка: Пожалуйста, обновите NETBOX_TOKEN в скрипте.")
-    elif not os.path.exists(EXCEL_FILE_PATH):
-        print(f"Ошибка: Excel файл '{EXCEL_FILE_PATH}' не найден.")
-    else:
-        import_vms_from_excel(EXCEL_FILE_PATH, SHEET_NAME)
-        print("\nИмпорт завершен.")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Импорт и обновление VM в Netbox из Excel файла.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Количество строк, обрабатываемых параллельно (по умолчанию 1)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Количество объектов в одном пакетном запросе (по умолчанию {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--cluster", help="Загружать снимок только VM указанного кластера")
+    parser.add_argument("--tenant", help="Загружать снимок только VM указанного арендатора")
+    parser.add_argument("--tag", help="Загружать снимок только VM с указанным тегом (slug)")
+    parser.add_argument("--prune", action="store_true",
+                        help="Удалить VM области (--cluster, --tenant, --tag), отсутствующие в таблице, "
+                             "вместе с их IP-адресами")
+    parser.add_argument("--prune-max-percent", type=float, default=DEFAULT_PRUNE_MAX_PERCENT,
+                        help=f"Не удалять, если отсутствующих в таблице VM больше указанной доли VM области, %% "
+                             f"(по умолчанию {DEFAULT_PRUNE_MAX_PERCENT})")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Обрабатывать только строки, изменившиеся с прошлой успешной синхронизации")
+    parser.add_argument("--full", action="store_true",
+                        help="В инкрементальном режиме обработать все строки и перезаписать состояние")
+    parser.add_argument("--stream", action="store_true",
+                        help="Читать таблицу потоково блоками строк (для очень больших таблиц)")
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_ROWS,
+                        help=f"Количество строк в блоке потокового чтения (по умолчанию {STREAM_CHUNK_ROWS})")
+    parser.add_argument("--state-file",
+                        help="Файл состояния инкрементального режима (по умолчанию рядом с Excel файлом)")
+    parser.add_argument("--plan", nargs="?", const="-", metavar="JSON_FILE",
+                        help="Только показать план изменений без записи в Netbox; "
+                             "с именем файла план также записывается в JSON")
+    parser.add_argument("--resume", action="store_true",
+                        help="Продолжить прерванный запуск: повторить его невыполненные операции и "
+                             "пропустить строки, уже завершенные в нем")
+    parser.add_argument("--journal-file",
+                        help="Файл журнала операций (по умолчанию рядом с Excel файлом)")
+    parser.add_argument("--no-journal", action="store_true", help="Не вести журнал операций")
+    parser.add_argument("--read-backend", choices=("rest", "graphql"), default="rest",
+                        help="Чтение снимка VM и интерфейсов: REST API или один постраничный запрос GraphQL")
+    parser.add_argument("--mirror", nargs="?", const="", metavar="SQLITE_FILE",
+                        help="Читать объекты Netbox из локального зеркала, обновляемого по журналу изменений "
+                             "(по умолчанию файл netbox_mirror_<сервер>.sqlite)")
+    parser.add_argument("--watch", action="store_true",
+                        help="Не завершаться: синхронизировать изменившиеся строки после каждого сохранения таблицы")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE,
+                        help=f"Режим наблюдения: сек без изменений файла до синхронизации (по умолчанию {DEFAULT_DEBOUNCE})")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help=f"Режим наблюдения: период проверки файла, сек (по умолчанию {DEFAULT_POLL_INTERVAL})")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_CACHE_TTL,
+                        help=f"Режим наблюдения: срок жизни кэшей Netbox, сек (по умолчанию {DEFAULT_CACHE_TTL})")
+    netbox_client.add_arguments(parser)
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    if args.prune and not (args.cluster or args.tenant or args.tag):
+        parser.error("--prune требует области: --cluster, --tenant или --tag")
+    if args.watch and args.plan:
+        parser.error("--watch несовместим с --plan")
+    metrics.configure_logging(args)
+    netbox_client.configure_from_args(HEADERS, args)
+    options = ImportOptions.from_args(args)
+
+    try:
+        # Проверка доступности URL, наличия файла и токена. Check: URL, File and Token exist
+        if NETBOX_URL == "http://netbox-instance.com":
+            print("Ошибка: Пожалуйста, обновите NETBOX_URL в скрипте.")
+        elif NETBOX_TOKEN == "api_token":
+            print("Ошибка: Пожалуйста, обновите NETBOX_TOKEN в скрипте.")
+        elif not os.path.exists(EXCEL_FILE_PATH):
+            print(f"Ошибка: Excel файл '{EXCEL_FILE_PATH}' не найден.")
+        elif args.watch:
+            mirror = None
+            if args.mirror is not None:
+                with metrics.phase("prefetch"):
+                    mirror = open_mirror(args.mirror, NETBOX_API_URL)
+            watch_excel(EXCEL_FILE_PATH, SHEET_NAME, options, mirror=mirror, debounce=args.debounce,
+                        poll_interval=args.poll_interval, cache_ttl=args.cache_ttl)
+            if mirror:
+                mirror.close()
+            metrics.finish(args)
+        else:
+            changes = None
+            mirror = None
+            if args.mirror is not None:
+                with metrics.phase("prefetch"):
+                    mirror = open_mirror(args.mirror, NETBOX_API_URL)
+            if args.plan:
+                stats, changes = plan_vms_from_excel(EXCEL_FILE_PATH, SHEET_NAME, options, mirror=mirror)
+            else:
+                stats = import_vms_from_excel(EXCEL_FILE_PATH, SHEET_NAME, options, mirror=mirror)
+            if mirror:
+                mirror.close()
+            if stats:
+                print_import_summary(SHEET_NAME, stats)
+            if changes is not None:
+                changes.print_report()
+                if args.plan != "-":
+                    changes.write_json(args.plan)
+                    print(f"План записан в файл '{args.plan}'.")
+            metrics.finish(args)
+            print("\nПостроение плана завершено." if changes is not None else "\nИмпорт завершен.")
+    finally:
+        netbox_client.close_client()
\ No newline at end of file
@@ -0,0 +1,49 @@
+import netbox_client
+
+# Поля интерфейса, необходимые для назначения IP-адресов
+INTERFACE_FIELDS = ("id", "name", "virtual_machine")
+
+DEFAULT_INTERFACE_NAME = "eth0"
+
+class InterfaceCache:
+    """Интерфейсы VM Netbox, сгруппированные по ID VM.
+
+    Интерфейсы загружаются одним постраничным запросом с многозначным фильтром
+    virtual_machine_id для всех VM, которых еще нет в кэше.
+    """
+
+    def __init__(self, api_url):
+        self.url = f"{api_url}/virtualization/interfaces/"
+        self.by_vm = {}
+
+    def load(self, vm_ids):
+        """Загрузка интерфейсов VM, отсутствующих в кэше; False при ошибке."""
+        missing = sorted({vm_id for vm_id in vm_ids if vm_id not in self.by_vm})
+        if not missing:
+            return True
+        interfaces = netbox_client.list_all_by(self.url, "virtual_machine_id", missing,
+                                               {"fields": ",".join(INTERFACE_FIELDS)})
+        if interfaces is None:
+            return False
+        for vm_id in missing:
+            self.by_vm[vm_id] = []
+        for interface in interfaces:
+            self.add(interface)
+        return True
+
+    def add_vm(self, vm_id):
+        """Регистрация новой VM, у которой еще нет интерфейсов."""
+        self.by_vm.setdefault(vm_id, [])
+
+    def add(self, interface):
+        """Добавление загруженного или созданного интерфейса."""
+        self.by_vm.setdefault(interface["virtual_machine"]["id"], []).append(interface)
+
+    def get(self, vm_id):
+        """Интерфейсы VM; None, если VM нет в кэше."""
+        return self.by_vm.get(vm_id)
+
+    def primary(self, vm_id):
+        """Интерфейс для primary IP: первый интерфейс VM или None."""
+        interfaces = self.by_vm.get(vm_id)
+        return interfaces[0] if interfaces else None
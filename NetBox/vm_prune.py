@@ -0,0 +1,85 @@
+import logging
+
+import netbox_client
+from netbox_bulk import BulkWriter, DEFAULT_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Не удалять, если сирот больше этой доли VM выбранной области, %
+DEFAULT_PRUNE_MAX_PERCENT = 10.0
+
+def find_orphans(snapshot, names):
+    """VM, загруженные снимком области, которых нет в таблице, по имени.
+
+    VM, найденные снимком по имени вне области или созданные в запуске, не учитываются.
+    """
+    return sorted((snapshot.by_name[name] for name in snapshot.loaded_names
+                   if name not in names and snapshot.by_name.get(name)), key=lambda vm: vm["name"])
+
+def orphan_ips(api_url, orphans):
+    """IP-адреса, назначенные интерфейсам VM-сирот; None при ошибке."""
+    return netbox_client.list_all_by(f"{api_url}/ipam/ip-addresses/", "virtual_machine_id",
+                                     [vm["id"] for vm in orphans], {"fields": "id,address,assigned_object"})
+
+def prune_orphans(api_url, snapshot, names, max_percent=DEFAULT_PRUNE_MAX_PERCENT,
+                  batch_size=DEFAULT_BATCH_SIZE, workers=1, journal=None, changes=None):
+    """Удаление VM области снимка, отсутствующих в таблице, вместе с их IP-адресами.
+
+    Интерфейсы удаляются Netbox вместе с VM, IP-адреса удаляются отдельно до
+    VM. Если сирот больше max_percent процентов VM области, ничего не
+    удаляется. В режиме плана (changes) удаления только записываются в план.
+    Возвращает число удаленных VM или None, если удаление не выполнялось.
+    """
+    total = len(snapshot.loaded_names)
+    orphans = find_orphans(snapshot, names)
+    logger.info(f"VM в области: {total}, отсутствуют в таблице: {len(orphans)}")
+    if not orphans:
+        return 0
+    for vm in orphans:
+        logger.info(f"VM '{vm['name']}' (ID {vm['id']}) отсутствует в таблице.")
+    percent = len(orphans) * 100 / total
+    if percent > max_percent:
+        logger.error(f"Удаление отменено: отсутствуют в таблице {len(orphans)} из {total} VM ({percent:.1f}%), "
+                     f"допустимо не более {max_percent}%.")
+        return None
+
+    ips = orphan_ips(api_url, orphans)
+    if ips is None:
+        logger.error("Удаление отменено: не удалось загрузить IP-адреса удаляемых VM.")
+        return None
+
+    if changes is not None:
+        for ip in ips:
+            changes.add("ip_address", "delete", ip["address"], id=ip["id"])
+        for vm in orphans:
+            changes.add("vm", "delete", vm["name"], id=vm["id"])
+        return len(orphans)
+
+    ip_writer = BulkWriter(f"{api_url}/ipam/ip-addresses/", "DELETE", batch_size, workers, journal)
+    for ip in ips:
+        ip_writer.add(ip["id"], {"id": ip["id"]})
+    ip_writer.flush()
+    # VM, у которых не удалось удалить IP-адрес, не удаляются
+    blocked = set(ip_writer.errors)
+    if blocked:
+        logger.error(f"Не удалось удалить IP-адресов: {len(blocked)}; VM с ними не удаляются.")
+        blocked_vms = {vm_id for vm_id, vm_ips in group_by_vm(ips).items() if vm_ips & blocked}
+        orphans = [vm for vm in orphans if vm["id"] not in blocked_vms]
+
+    vm_writer = BulkWriter(f"{api_url}/virtualization/virtual-machines/", "DELETE", batch_size, workers, journal)
+    for vm in orphans:
+        vm_writer.add(vm["name"], {"id": vm["id"]})
+    deleted = vm_writer.flush()
+    for name in deleted:
+        snapshot.by_name.pop(name, None)
+        snapshot.loaded_names.discard(name)
+    logger.info(f"Удалено VM: {len(deleted)}, IP-адресов: {len(ip_writer.results)}")
+    return len(deleted)
+
+def group_by_vm(ips):
+    """ID IP-адресов по ID VM, интерфейсу которой они назначены."""
+    groups = {}
+    for ip in ips:
+        vm = ((ip.get("assigned_object") or {}).get("virtual_machine") or {})
+        groups.setdefault(vm.get("id"), set()).add(ip["id"])
+    return groups
@@ -0,0 +1,169 @@
+import logging
+import math
+from dataclasses import dataclass, field
+
+import netbox_client
+from netbox_bulk import BulkWriter, DEFAULT_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Поля VM, которые сравниваются с таблицей; только они запрашиваются при загрузке снимка
+VM_FIELDS = ("id", "name", "role", "cluster", "tenant", "description", "serial",
+             "vcpus", "memory", "disk", "primary_ip4")
+
+# Действия плана синхронизации
+CREATE = "create"
+UPDATE = "update"
+NOOP = "noop"
+
+# --- Снимок VM из Netbox ---
+
+class VMSnapshot:
+    """Снимок VM Netbox, загруженный одним списочным запросом и проиндексированный по имени.
+
+    Пока снимок не загружен (или загружен только для кластера/арендатора),
+    отсутствующие в нем VM ищутся по имени через lookup. lookup_many (имена ->
+    VM по порядку) ищет сразу несколько VM, например одновременными запросами
+    асинхронного клиента (prefetch).
+    """
+
+    def __init__(self, api_url, lookup=None, lookup_many=None):
+        self.url = f"{api_url}/virtualization/virtual-machines/"
+        self.lookup = lookup
+        self.lookup_many = lookup_many
+        self.by_name = {}
+        # Имена VM, полученных загрузкой снимка (без найденных по имени и созданных в запуске)
+        self.loaded_names = set()
+        self.scoped = False
+        self.loaded = False
+
+    def load(self, cluster_id=None, tenant_id=None, tag=None):
+        """Загрузка всех VM (или VM кластера/арендатора/тега); False при ошибке."""
+        params = {"fields": ",".join(VM_FIELDS)}
+        if cluster_id:
+            params["cluster_id"] = cluster_id
+        if tenant_id:
+            params["tenant_id"] = tenant_id
+        if tag:
+            params["tag"] = tag
+        self.scoped = bool(cluster_id or tenant_id or tag)
+        vms = netbox_client.list_all(self.url, params)
+        if vms is None:
+            return False
+        for vm in vms:
+            self.by_name[vm["name"]] = vm
+        self.loaded_names = {vm["name"] for vm in vms}
+        self.loaded = True
+        logger.info(f"Загружен снимок VM: {len(self.by_name)}")
+        return True
+
+    def add(self, vm):
+        """Добавление созданной или обновлённой VM в снимок."""
+        self.by_name[vm["name"]] = vm
+
+    def prefetch(self, names):
+        """Поиск через lookup_many всех VM из names, которые get искал бы по одной."""
+        if not self.lookup_many or not (self.scoped or not self.loaded):
+            return
+        missing = [name for name in dict.fromkeys(map(str, names)) if name not in self.by_name]
+        if missing:
+            self.by_name.update(zip(missing, self.lookup_many(missing)))
+
+    def get(self, name):
+        """Поиск VM по имени в снимке."""
+        name = str(name)
+        if name in self.by_name:
+            return self.by_name[name]
+        if (self.scoped or not self.loaded) and self.lookup:
+            # VM может существовать вне выбранного кластера/арендатора - проверяем только промахи
+            vm = self.lookup(name)
+            self.by_name[name] = vm
+            return vm
+        return None
+
+# --- Сравнение полей ---
+
+def is_empty(value):
+    """Пустое значение: None, пустая строка или NaN из таблицы."""
+    return value is None or value == "" or (isinstance(value, float) and math.isnan(value))
+
+def values_equal(new, old):
+    """Сравнение значения из таблицы со значением в Netbox."""
+    if isinstance(new, dict):
+        # Ссылка на объект: сравниваем по ID, а если задано только имя - по имени
+        if not isinstance(old, dict):
+            return False
+        if "id" in new:
+            return new["id"] == old.get("id")
+        return all(old.get(key) == value for key, value in new.items())
+    if is_empty(new) or is_empty(old):
+        return is_empty(new) and is_empty(old)
+    if isinstance(new, (int, float)) and isinstance(old, (int, float)):
+        # vcpus в Netbox дробное (6.0), в таблице целое
+        return float(new) == float(old)
+    return new == old
+
+def diff_vm(payload, existing_vm):
+    """Изменившиеся поля VM: {поле: (значение в Netbox, значение из таблицы)}."""
+    changes = {}
+    for key, value in payload.items():
+        if key not in VM_FIELDS:
+            continue
+        if not values_equal(value, existing_vm.get(key)):
+            changes[key] = (existing_vm.get(key), value)
+    return changes
+
+# --- План синхронизации ---
+
+@dataclass
+class PlanItem:
+    """Действие над одной VM."""
+    action: str
+    name: str
+    ref: object
+    payload: dict
+    vm_id: int = None
+    changes: dict = field(default_factory=dict)
+
+class SyncPlan:
+    """План синхронизации VM: создание, обновление изменившихся полей или отсутствие изменений."""
+
+    def __init__(self):
+        self.items = []
+
+    def add(self, ref, name, payload, existing_vm):
+        """Добавление VM в план по результату сравнения с Netbox."""
+        if not existing_vm:
+            item = PlanItem(CREATE, name, ref, payload)
+        else:
+            changes = diff_vm(payload, existing_vm)
+            item = PlanItem(UPDATE if changes else NOOP, name, ref, payload, existing_vm["id"], changes)
+        self.items.append(item)
+        return item
+
+    def count(self, action):
+        return sum(1 for item in self.items if item.action == action)
+
+    def summary(self):
+        return (f"создать {self.count(CREATE)}, обновить {self.count(UPDATE)}, "
+                f"без изменений {self.count(NOOP)}")
+
+    def apply(self, api_url, batch_size=DEFAULT_BATCH_SIZE, workers=1, journal=None):
+        """Выполнение плана пакетными запросами; возвращает (результаты, ошибки) по ref."""
+        url = f"{api_url}/virtualization/virtual-machines/"
+        create_writer = BulkWriter(url, "POST", batch_size, workers, journal)
+        update_writer = BulkWriter(url, "PATCH", batch_size, workers, journal)
+        for item in self.items:
+            if item.action == CREATE:
+                logger.debug(f"Создание VM '{item.name}'...")
+                create_writer.add(item.ref, item.payload)
+            elif item.action == UPDATE:
+                # Отправляются только изменившиеся поля
+                logger.debug(f"Обновление VM '{item.name}' (ID: {item.vm_id}): {', '.join(item.changes)}")
+                update_writer.add(item.ref, {"id": item.vm_id, **{
+                    key: new for key, (_, new) in item.changes.items()}})
+        create_writer.flush()
+        update_writer.flush()
+        results = {**create_writer.results, **update_writer.results}
+        errors = {**create_writer.errors, **update_writer.errors}
+        return results, errors